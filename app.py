@@ -1,14 +1,37 @@
 import streamlit as st
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
-import json
 import urllib.parse
-import requests
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import tracing
+from core import (
+    get_reviewer_index, fetch_article_details, verify_article_integrity,
+    search_reviewers, get_response_cache, get_write_queue, add_reviewers,
+    flag_known_reviewers, drop_known_reviewers, get_hedge_policy, start_warmup, drop_conflicting_matches
+)
+
+_script_started = time.perf_counter()
 
 # --- CONFIGURATION & SECRETS ---
 st.set_page_config(page_title="Academic Reviewer Matcher", layout="wide")
 
+# Panels are fragments: interacting inside one reruns only that panel, not the whole script.
+# UI_FRAGMENTS = false renders them inline (whole-script reruns), to compare render times.
+use_fragments = str(st.secrets.get("UI_FRAGMENTS", True)).lower() not in ("0", "false", "no", "off")
+
+def panel(name):
+    """Makes the function a fragment (if enabled) whose every run is traced as ui.<name>."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def traced(*args, **kwargs):
+            with tracing.span(f"ui.{name}", fragment=use_fragments):
+                return fn(*args, **kwargs)
+        return st.fragment(traced) if use_fragments else traced
+    return decorate
+
 # Function to get verification links
 def get_verification_links(name, institution):
     query_scholar = urllib.parse.quote(f"{name} {institution}")
@@ -20,296 +43,259 @@ def get_verification_links(name, institution):
     
     return link_scholar, link_orcid, link_linkedin
 
-# --- CONNECTIVITY FUNCTIONS ---
+# --- BACKGROUND EXECUTION ---
 
-import traceback
+MAX_BACKGROUND_TASKS = 12
 
-# --- CONNECTIVITY FUNCTIONS ---
+@st.cache_resource
+def get_executor():
+    """Shared pool for Sheets/Gemini calls that can run side by side."""
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="matcher")
 
-def get_google_sheet_client():
-    try:
-        # Load credentials from secrets or local file
-        if "GOOGLE_SHEETS_CREDENTIALS" in st.secrets:
-            creds_dict = json.loads(st.secrets["GOOGLE_SHEETS_CREDENTIALS"])
+def submit_task(key, fn, *args):
+    """
+    Runs fn(*args) on the shared pool once per `key` for this session.
+    Futures live in session state, so a rerun (e.g. pressing "Buscar Revisores")
+    picks up the in-flight or finished result instead of starting a new call.
+    """
+    tasks = st.session_state.setdefault("background_tasks", {})
+    future = tasks.get(key)
+    if future is None or (future.done() and (future.exception() or future.result() is None)):
+        ctx = get_script_run_ctx()
+        def run():
+            add_script_run_ctx(threading.current_thread(), ctx) # Lets st.* messages reach this session
+            return fn(*args)
+        future = get_executor().submit(run)
+        tasks[key] = future
+        while len(tasks) > MAX_BACKGROUND_TASKS:
+            tasks.pop(next(iter(tasks)))
+    return future
+
+@panel("article")
+def render_article_panel(context_title, author_name, keywords, abstract):
+    if author_name:
+        st.info(f"**Analizando:** {context_title} | Autor: {author_name}")
+    else:
+        st.info(f"**Analizando:** {context_title}")
+    
+    # Show details
+    if keywords:
+        with st.expander("Ver Palabras Clave"):
+            st.write(keywords)
+    if abstract and abstract != keywords:
+         with st.expander("Ver Resumen"):
+            st.write(abstract)
+
+def render_author_profile(profile, author_name):
+    """Links, recent publications and affiliation of one author (a profile from `verify_article_integrity`)."""
+    cols = st.columns(3)
+
+    # Col 1: Links (Precision Search)
+    with cols[0]:
+        # Precision Scholar Link (Search Authors)
+        s_search = f"https://scholar.google.com/citations?view_op=search_authors&hl=es&mauthors={urllib.parse.quote(author_name)}"
+        # Precision ORCID Link
+        o_search = f"https://orcid.org/orcid-search/search?searchQuery={urllib.parse.quote(author_name)}"
+
+        st.markdown("**Búsqueda Inteligente:**")
+        st.markdown(f"🔎 [Buscar en Scholar]({s_search})")
+        st.markdown(f"🆔 [Buscar en ORCID]({o_search})")
+
+    # Col 2: Recent Pubs
+    with cols[1]:
+        pubs = profile.get("recent_publications_list", [])
+        st.markdown("**Publicaciones Recientes:**")
+        if pubs and len(pubs) > 0:
+            for p in pubs[:2]: # Show top 2
+                if isinstance(p, dict):
+                    title = p.get("title", "Sin título")
+                    year = p.get("year", "")
+                    # Simple Pub Link: Title + Author
+                    query = f"{title} {author_name}"
+                    search_url = f"https://scholar.google.com/scholar?q={urllib.parse.quote(query)}"
+                    st.markdown(f"📄 [{title} ({year})]({search_url})")
+                else:
+                    # Fallback if string
+                    query = f"{str(p)} {author_name}"
+                    search_url = f"https://scholar.google.com/scholar?q={urllib.parse.quote(query)}"
+                    st.markdown(f"📄 [{p}]({search_url})")
         else:
-            # Fallback for local dev
-            with open("credentials.json") as f:
-                creds_dict = json.load(f)
-        
-        scope = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-        creds = Credentials.from_service_account_info(creds_dict, scopes=scope)
-        client = gspread.authorize(creds)
-        return client
-    except Exception as e:
-        st.error(f"Error connecting to Google Sheets: {e}")
-        st.code(traceback.format_exc())
-        return None
-
-import time
-
-def call_gemini_api(api_key, system_instruction, user_prompt, model_name="gemini-1.5-flash"):
-    max_retries = 3
-    base_delay = 4 # Increased delay
+            st.warning("⚠️ No se listaron publicaciones recientes.")
+
+    # Col 3: Affiliation
+    with cols[2]:
+        role = profile.get("role_and_institution", "No identificado")
+        st.markdown("**Afiliación (Inferida):**")
+        if role and "No identificado" not in role:
+            st.success(f"🏛️ {role}")
+            # Precision Affiliation Link (Quoted Name + Institution)
+            google_search = f"https://www.google.com/search?q=\"{urllib.parse.quote(author_name)}\"+{urllib.parse.quote(role)}"
+            st.markdown(f"[🔗 Verificar Afiliación]({google_search})")
+        else:
+            st.error("❌ Cargo/Institución no claros")
+
+    st.info(f"💡 **Evaluación:** {profile.get('author_comment', 'No disponible')}")
+
+@panel("integrity")
+def render_integrity_panel(integrity, author_name, context_title):
+    # --- Check 1: Author Profile (one per author) ---
+    profiles = integrity.get("author_profiles") or [
+        dict(integrity.get("author_checklist", {}), author_comment=integrity.get("author_comment", "No disponible"), name=author_name)
+    ]
+    if len(profiles) > 1:
+        st.markdown("### 👤 Perfil Académico de los Autores")
+        for profile in profiles:
+            with st.expander(f"👤 {profile['name']}", expanded=profile is profiles[0]):
+                render_author_profile(profile, profile["name"])
+    else:
+        st.markdown("### 👤 Perfil Académico del Autor")
+        render_author_profile(profiles[0], author_name)
+
+    # --- Check 3: Methodology ---
+    meth = integrity.get("article_methodology", "No detectado")
+    st.info(f"📊 **Metodología Detectada:** {meth}")
+
+    # --- Check 2: Prior Publication ---
+    if integrity.get("is_previously_published"):
+        st.error(f"🚨 **ALERTA PUBLICACIÓN:** Este artículo podría haber sido publicado previamente.")
+        st.write(f"**Detalle:** {integrity.get('reason_publication')}")
+
+        # Precision Duplicate Link (intitle: context_title)
+        dup_query = f'intitle:"{context_title}"'
+        dup_search = f"https://scholar.google.com/scholar?q={urllib.parse.quote(dup_query)}"
+        st.markdown(f"🔴 [🔗 **VERIFICAR DUPLICADO**]({dup_search})")
+    else:
+        st.markdown("✅ **Originalidad:** No se detectaron publicaciones previas obvias.")
+
+@panel("results")
+def render_results(sheet_id_evaluadores, current_article_id):
+    """Latest search results (kept in session state), with the add-to-DB form for external suggestions."""
+    results = st.session_state.get('search_results')
+    if not results:
+        return
     
-    for attempt in range(max_retries):
-        try:
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={api_key}"
-            headers = {"Content-Type": "application/json"}
-            
-            # Construct payload with system instruction properly
-            full_prompt = f"{system_instruction}\n\n{user_prompt}"
-            
-            data = {
-                "contents": [{
-                    "parts": [{"text": full_prompt}]
-                }],
-                "generationConfig": {
-                    "temperature": 0.2,
-                    "response_mime_type": "application/json"
-                }
-            }
-            
-            response = requests.post(url, headers=headers, json=data)
-            
-            # Handle Rate Limits (429) specifically
-            if response.status_code == 429:
-                sleep_time = base_delay * (2 ** attempt)
-                st.warning(f"⚠️ Tráfico alto (429). Esperando {sleep_time}s... (Intento {attempt + 1}/{max_retries})")
-                if attempt == 1:
-                    st.toast("💡 Consejo: Si esto persiste, prueba cambiar al modelo 'Gemini 1.5 Flash'.")
-                time.sleep(sleep_time)
-                continue # Retry
-                
-            response.raise_for_status()
-            
-            result = response.json()
-            # Extract text
-            return result['candidates'][0]['content']['parts'][0]['text']
+    metrics = st.session_state.get('search_metrics') or {}
+    if metrics.get("total_s") is not None:
+        first = f"primer candidato en {metrics['first_candidate_s']:.1f}s · " if metrics.get("first_candidate_s") is not None else ""
+        prompt_size = f" · {metrics['prompt_rows']} revisores en el prompt (~{metrics['prompt_tokens_est']} tokens)" if metrics.get("prompt_rows") is not None else ""
+        removed = f" · {metrics['conflicts_removed']} sugerencias excluidas por conflicto de interés" if metrics.get("conflicts_removed") else ""
+        st.caption(f"⏱️ {first}respuesta completa en {metrics['total_s']:.1f}s{prompt_size}{removed}")
+    
+    # Removed global methodology display from here (moved to Profile)
+    
+    tab1, tab2 = st.tabs(["🏛️ Coincidencias Internas (BD)", "🌎 Sugerencias Externas (Nuevos)"])
+    
+    with tab1:
+        if results.get("internal_matches"):
+            df_internal = pd.DataFrame(results["internal_matches"])
+            # Reorder columns: Add Methodology
+            desired_order = ["Nombre", "Apellidos", "Institucion", "Temas", "Methodology", "Reason"]
+            # Filter to only columns that actually exist
+            cols = [c for c in desired_order if c in df_internal.columns]
+            # Add remaining
+            remaining = [c for c in df_internal.columns if c not in cols]
             
-        except Exception as e:
-            if attempt == max_retries - 1: # Last attempt
-                st.error(f"🔴 GEMINI FAIL (Final): {e}")
-                return None
-            else:
-                # Check if it was a 429 that somehow slipped through (shouldn't happen with logic above)
-                # or a network error we want to retry
-                st.warning(f"⚠️ API Error (Retrying): {e}")
-                time.sleep(2) # Short sleep for non-429 errors
-                continue
-    return None
-
-# --- DATA HANDLING ---
-
-@st.cache_data(ttl=600)
-def load_evaluadores(sheet_id):
-    try:
-        client = get_google_sheet_client()
-        if not client: return None
-        sh = client.open_by_key(sheet_id)
-        # Try explicit names: UPPERCASE (new), CamelCase (old), or explicit index if needed.
-        for name in ["EVALUADORES", "Evaluadores"]:
-            try:
-                worksheet = sh.worksheet(name)
-                break
-            except:
-                continue
+            st.table(df_internal[cols + remaining])
         else:
-             worksheet = sh.get_worksheet(1) # Fallback to 2nd sheet
-            
-        df = pd.DataFrame(worksheet.get_all_records())
-        return df
-    except Exception as e:
-        st.error(f"Error loading Evaluadores: {e}")
-        return None
-
-@st.cache_data(ttl=600)
-def fetch_article_details(sheet_id, article_id_query):
-    try:
-        client = get_google_sheet_client()
-        if not client: return None
-        sh = client.open_by_key(sheet_id)
-        try:
-            worksheet = sh.worksheet("APUNTES")
-        except:
-            try:
-                worksheet = sh.worksheet("Articulos")
-            except:
-                worksheet = sh.get_worksheet(0)
-            
-        # Use get_all_values for robustness against header issues
-        data = worksheet.get_all_values()
-        if not data: return None
-        
-        headers = [h.strip() for h in data[0]] # Normalize headers
-        rows = data[1:]
-        
-        df = pd.DataFrame(rows, columns=headers)
-        
-        # Check if ID exists
-        if "ID" not in df.columns:
-            st.error(f"Column 'ID' not found in sheet. Available columns: {df.columns.tolist()}")
-            return None
+            st.info("No se encontraron coincidencias internas fuertes.")
             
-        # Ensure ID is string for comparison
-        df['ID'] = df['ID'].astype(str)
-        article_row = df[df['ID'] == str(article_id_query)]
-        
-        if not article_row.empty:
-            row_data = article_row.iloc[0].to_dict()
-            # Normalize keys to simple ones for the app
-            return {
-                "Titulo": row_data.get("Título", ""),
-                "Resumen": row_data.get("Resumen", ""),
-                "Palabras clave": row_data.get("Palabras clave", ""),
-                "Autores": row_data.get("Autores", ""),
-                "Link": row_data.get("Enlace archivo", row_data.get("Link", row_data.get("URL", "")))
-            }
-        return None
-    except Exception as e:
-        st.error(f"Error fetching article: {repr(e)}")
-        st.code(traceback.format_exc())
-        return None
-
-@st.cache_data(ttl=3600)
-def verify_article_integrity(api_key, author_name, title, abstract, keywords, model_name):
-    """
-    Uses Gemini to verify:
-    1. If the author is likely an Undergraduate Student.
-    2. If the article appears to be previously published.
-    """
-    try:
-        system_instruction = """
-        Eres un asistente de integridad académica. Tu tarea es analizar los metadatos de un artículo y su autor para detectar posibles problemas y evaluar la solidez del perfil académico.
-        
-        **Tareas de Verificación:**
-        **Tareas de Verificación:**
-        1.  **Perfil del Autor (Checklist Detallado):**
-            *   **Scholar/ORCID:** NO busques enlaces. Solo evalúa si debería tenerlos.
-            *   **Publicaciones Recientes:** Enumera 2 publicaciones recientes (Título y Año).
-            *   **Publicaciones Recientes:** Enumera 2 publicaciones recientes (Título y Año).
-            *   **Afiliación y Cargo:** Identifica cargo y universidad.
-        2.  **Metodología del Artículo:** Determina si es Cuantitativa, Cualitativa o Mixta basándote en el resumen.
-        3.  **Publicación Previa (Solo Revistas):** Analiza si el trabajo ya ha sido publicado en una **REVISTA ACADÉMICA (Journal)**.
-            *   **IMPORTANTE:** NO consideres como "publicación previa" a: Tesis, Repositorios Institucionales, Working Papers o Preprints. Esto es normal.
-            *   **ALERTA:** Solo marca TRUE si detectas que ya salió en otra revista. Si es una tesis o repositorio, marca FALSE.
-        
-        **Salida JSON**:
-        {
-            "author_checklist": {
-                "recent_publications_list": [
-                    {"title": "Pub 1", "year": "2023"},
-                    {"title": "Pub 2", "year": "2022"}
-                ],
-                "role_and_institution": "Cargo e Institución"
-            },
-            "author_comment": "Evaluación breve del perfil.",
-            "is_previously_published": boolean,
-            "reason_publication": "Explicación (ej. 'Coincide con artículo en Revista X' o 'Es tesis/repositorio, no cuenta')",
-            "article_methodology": "Cuantitativo/Cualitativo/Mixto (Breve justificación)"
-        }
-        """
-        
-        user_prompt = f"""
-        Analizar Autor: "{author_name}"
-        Título Artículo: "{title}"
-        Resumen: "{abstract}"
-        Palabras Clave: "{keywords}"
-        """
-        
-        response_text = call_gemini_api(api_key, system_instruction, user_prompt, model_name)
-        
-        if response_text:
-            cleaned_text = response_text.replace("```json", "").replace("```", "")
-            return json.loads(cleaned_text)
-        return None
-    except Exception as e:
-        print(f"Integrity check failed: {e}")
-        return None
-
-@st.cache_data(ttl=3600)
-def find_reviewers_with_gemini(api_key, target_article_context, prioritize_latam, evaluadores_str, model_name):
-    """
-    Cached function to find reviewers using Gemini.
-    Separating this ensures we don't re-run the expensive API call on every interaction.
-    """
-    try:
-        system_instruction = """
-        Eres un Editor Académico Experto. Tu objetivo es identificar a los mejores revisores pares para un artículo científico.
-        
-        **IMPORTANTE**: Responde SIEMPRE en ESPAÑOL.
-        
-        **Proceso (Chain of Thought):**
-        1.  **Analizar**:
-            *   Extrae los temas centrales.
-            *   **DETERMINA LA METODOLOGÍA**: ¿Es Cuantitativa, Cualitativa o Mixta? (Basado en el Abstract/Keywords).
-            *   Identifica el enfoque regional.
-        2.  **Match Interno**: Busca en 'REGISTERED REVIEWERS' candidatos.
-            *   **Filtro de Metodología**: Prioriza revisores que manejen la metodología detectada.
-            *   Explica en ESPAÑOL por qué encajan (Tema + Metodología).
-        3.  **Búsqueda Externa Simulada**: Sugiere 3 NUEVOS revisores COMPLETOS.
-            *   **REGLA DE ORO (COMPLETITUD)**: Solo sugiere candidatos con DATOS COMPLETOS (Nombre, Email, Afiliación, País).
-            *   **EMAIL**: Debe ser institucional y COINCIDIR con la afiliación (ej. @unam.mx si es de UNAM).
-            *   **FILTRO**: Si falta el correo o no coincide, DESCARTA al candidato y busca otro.
-            *   **PROHIBIDO**: No devuelvas "Search required" ni campos vacíos.
-            *   **Expertise**: Debe encajar con el tema y la metodología.
-        
-        **Formato de Salida (JSON)**:
-        {
-            "internal_matches": [
-                {"Nombre": "...", "Apellidos": "...", "Institucion": "...", "Temas": "...", "Methodology": "Cuanti/Cuali/Mixto", "Reason": "..."}
-            ],
-            "external_suggestions": [
-                 {"Nombre": "...", "Apellidos": "...", "Correo": "user@institution.edu", "Afiliación": "Institution Name", "País": "...", "Scholar": "", "OrcId": "", "Temas": "...", "Methodology": "Cuanti/Cuali/Mixto", "Reason": "..."}
-            ]
-        }
-        """
-        
-        user_prompt = f"""
-        INPUT CONTEXT: "{target_article_context}"
-        PRIORITIZE LATAM: {prioritize_latam}
-        
-        REGISTERED REVIEWERS DATABASE (Sample/Context):
-        {evaluadores_str}
-        """
-        
-        response_text = call_gemini_api(api_key, system_instruction, user_prompt, model_name)
-        
-        if response_text:
-            cleaned_text = response_text.replace("```json", "").replace("```", "")
-            return json.loads(cleaned_text)
-        return None
-    except Exception as e:
-        st.error(f"Reviewer search failed: {e}")
-        return None
-
-def get_active_worksheet(sheet_id):
-    """Get fresh worksheet object for writing, utilizing cached client resource"""
-    try:
-        client = get_google_sheet_client()
-        if not client: return None
-        sh = client.open_by_key(sheet_id)
-        # Try explicit names for writing
-        for name in ["EVALUADORES", "Evaluadores"]:
-            try:
-                worksheet = sh.worksheet(name)
-                break
-            except:
-                continue
+    with tab2:
+        externals = results.get("external_suggestions", [])
+        if externals:
+            st.info("Seleccione candidatos para añadir a la base de datos:")
+            render_add_form(sheet_id_evaluadores, externals, current_article_id)
         else:
-            worksheet = sh.get_worksheet(1)
-        return worksheet
-    except Exception as e:
-        st.error(f"Error connecting to write: {e}")
-        return None
-
-def append_to_sheet(worksheet, new_rows_df):
-    try:
-        values = new_rows_df.values.tolist()
-        worksheet.append_rows(values)
-        return True
-    except Exception as e:
-        st.error(f"Error appending rows: {e}")
-        return False
+            st.warning("La IA no pudo generar sugerencias externas.")
+
+@panel("add_form")
+def render_add_form(sheet_id_evaluadores, externals, current_article_id):
+    """Checkbox per external suggestion; submitting adds the selected ones to EVALUADORES."""
+    df_externals = pd.DataFrame(externals)
+    # People already in EVALUADORES (by e-mail, ORCID or name) can't be added again
+    known_matches = flag_known_reviewers(sheet_id_evaluadores, externals)
+
+    with st.form("add_reviewers_form"):
+        selected_indices = []
+        for i, row in df_externals.iterrows():
+            # Added column for Email (cols[2])
+            cols = st.columns([0.05, 0.2, 0.2, 0.2, 0.15, 0.1, 0.1])
+            with cols[0]:
+                if st.checkbox("", key=f"select_{i}", disabled=known_matches[i] is not None):
+                    selected_indices.append(i)
+            with cols[1]:
+                st.write(f"**{row['Nombre']} {row['Apellidos']}**")
+                if known_matches[i] is not None:
+                    status = "En cola para la BD" if isinstance(known_matches[i].label, tuple) else "Ya registrado"
+                    st.caption(f"⚠️ {status} como {known_matches[i].name} (coincide {known_matches[i].reason})")
+            with cols[2]:
+                st.caption(f"📧 {row.get('Correo', 'N/A')}")
+            with cols[3]:
+                st.write(row['Afiliación'])
+            with cols[4]:
+                st.write(row['Temas'])
+                st.caption(f"🛠 {row.get('Methodology', '')}")
+            with cols[5]:
+                st.write(row['País'])
+            with cols[6]:
+                s_link, o_link, _ = get_verification_links(f"{row['Nombre']} {row['Apellidos']}", row['Afiliación'])
+                st.markdown(f"[🔎 Scholar]({s_link})")
+                st.markdown(f"[🆔 ORCID]({o_link})")
+            st.divider()
+
+        submitted = st.form_submit_button("➕ Añadir Seleccionados a la BD")
+
+        if submitted:
+            if selected_indices:
+                # Filter selected rows
+                rows_to_add = df_externals.iloc[selected_indices].drop(columns=['Reason'], errors='ignore').reset_index(drop=True)
+
+                target_columns = ["ID Artículo", "Nombre", "Apellidos", "Correo electrónico", "Afiliación institucional", "País", "Google Scholar", "OrcId", "Temas"]
+
+                rows_prepared = pd.DataFrame()
+                # Use Article ID if known
+                rows_prepared["ID Artículo"] = [current_article_id] * len(rows_to_add)
+                rows_prepared["Nombre"] = rows_to_add["Nombre"]
+                rows_prepared["Apellidos"] = rows_to_add["Apellidos"]
+                rows_prepared["Correo electrónico"] = rows_to_add["Correo"]
+                rows_prepared["Afiliación institucional"] = rows_to_add["Afiliación"]
+                rows_prepared["País"] = rows_to_add["País"]
+
+                # Generate clickable links for the database
+                scholar_links = []
+                orcid_links = []
+
+                for _, row in rows_to_add.iterrows():
+                    s_link, o_link, _ = get_verification_links(f"{row['Nombre']} {row['Apellidos']}", row['Afiliación'])
+                    scholar_links.append(s_link)
+                    orcid_links.append(o_link)
+
+                rows_prepared["Google Scholar"] = scholar_links
+                rows_prepared["OrcId"] = orcid_links
+                rows_prepared["Temas"] = rows_to_add["Temas"]
+
+                # Sanitize data for JSON (gspread)
+                rows_prepared = rows_prepared.fillna("")
+
+                # Last check against the database (it may have changed since the results were shown)
+                rows_prepared, skipped_names = drop_known_reviewers(sheet_id_evaluadores, rows_prepared)
+                if skipped_names:
+                    st.info(f"Omitidos por estar ya registrados o repetidos: {', '.join(skipped_names)}")
+
+                if rows_prepared.empty:
+                    st.warning("No quedan revisores nuevos para añadir.")
+                else:
+                    added = add_reviewers(sheet_id_evaluadores, rows_prepared)
+                    if added is not None:
+                        count, queued = added
+                        if queued:
+                            # Written in the background (batched, retried); the form returns right away
+                            skipped = len(rows_prepared) - count
+                            st.success(f"✅ {count} revisores en cola para la base de datos." + (f" ({skipped} ya estaban en cola)" if skipped else ""))
+                        else:
+                            st.success(f"✅ ¡Se añadieron {count} revisores a la base de datos!")
+                        st.balloons()
+            else:
+                st.warning("Por favor seleccione al menos un revisor.")
 
 # --- UI & LOGIC ---
 
@@ -365,13 +351,44 @@ model_options = {
 }
 selected_model_label = st.sidebar.selectbox("Modelo de Inteligencia Artificial", list(model_options.keys()))
 selected_model_name = model_options[selected_model_label]
+hedge_policy = get_hedge_policy()
+if hedge_policy and hedge_policy.fallback_for(selected_model_name):
+    st.sidebar.caption(f"Si el modelo tarda más de lo habitual, la consulta se envía también a `{hedge_policy.fallback}` y se usa la primera respuesta válida.")
+
+# Right after login: authorize Sheets, load/index both sheets and pre-run recent integrity checks in the background
+if "warmup" not in st.session_state:
+    st.session_state.warmup = start_warmup(sheet_id_articulos, sheet_id_evaluadores, api_key, selected_model_name)
+warmup = st.session_state.warmup
+if warmup and warmup["running"]:
+    st.sidebar.caption("🔥 Preparando la base de evaluadores y los artículos recientes...")
+elif warmup and warmup["prefetched"]:
+    st.sidebar.caption(f"🔥 Verificación lista para: {', '.join(warmup['prefetched'])}")
 
 mode = st.sidebar.radio("Modo de Búsqueda", ["Por ID de Artículo", "Por Contenido"])
 
+prioritize_latam = st.sidebar.checkbox("Priorizar Expertos de LatAm", value=True)
+# Only the best lexical matches are sent to Gemini (0 = send the whole database)
+top_k = st.sidebar.number_input(
+    "Candidatos enviados a la IA (Top-K)", min_value=0, step=10,
+    value=int(st.secrets.get("RETRIEVAL_TOP_K", 60)),
+    help="Número de revisores preseleccionados localmente por afinidad temática. 0 envía toda la base."
+)
+
 target_article_context = ""
 context_title = ""
+article_authors = "" # `Autores` of the article, for conflict-of-interest exclusion
+pending_tasks = {} # future -> section name, rendered as each one completes
+speculative_future = None # Reviewer search started with the article, checked without waiting
 
 if mode == "Por ID de Artículo":
+    parallel_mode = st.sidebar.toggle(
+        "⚡ Ejecución en paralelo", value=True,
+        help="Verifica la integridad y carga la base de evaluadores al mismo tiempo, mostrando cada sección al terminar."
+    )
+    speculative_search = st.sidebar.checkbox(
+        "Adelantar búsqueda de revisores", value=False, disabled=not parallel_mode,
+        help="Inicia la búsqueda apenas se encuentra el artículo; 'Buscar Revisores' reutiliza el resultado si no cambian los parámetros."
+    )
     article_id_input = st.sidebar.text_input("Ingrese ID del Artículo (ej. 2746)")
     if article_id_input:
         with st.spinner(f"Buscando Artículo {article_id_input}..."):
@@ -382,6 +399,7 @@ if mode == "Por ID de Artículo":
                 abstract = article_data.get('Resumen', '')
                 keywords = article_data.get('Palabras clave', '')
                 author_name = article_data.get('Autores', 'Autor Desconocido')
+                article_authors = article_data.get('Autores', '')
                 link = article_data.get('Link', '')
                 
                 # Context is built from everything available
@@ -390,93 +408,31 @@ if mode == "Por ID de Artículo":
                 if link:
                     st.sidebar.markdown(f"[🔗 **Ver Texto Completo**]({link})")
                 
+                if parallel_mode:
+                    # Start everything that only needs the article right away
+                    pending_tasks[submit_task(("evaluadores", sheet_id_evaluadores), get_reviewer_index, sheet_id_evaluadores)] = "evaluadores"
+                    if speculative_search:
+                        # Runs alongside the integrity check; conflicts from the profiles it stores are applied to the result
+                        search_key = ("search", target_article_context, article_authors, prioritize_latam, top_k, selected_model_name)
+                        search_fn = functools.partial(search_reviewers, authors=article_authors)
+                        speculative_future = submit_task(search_key, search_fn, sheet_id_evaluadores, api_key, target_article_context, prioritize_latam, top_k, selected_model_name)
+                
+                render_article_panel(context_title, author_name, keywords, abstract)
+                
                 # --- INTEGRITY CHECK ---
                 if author_name:
-                    st.info(f"**Analizando:** {context_title} | Autor: {author_name}")
-                    
-                    # Verify Author & Integrity
-                    with st.spinner(f"Verificando integridad y estatus académico..."):
-                        integrity = verify_article_integrity(api_key, author_name, context_title, abstract, keywords, selected_model_name)
-                        
-                    if integrity:
-                        # --- Check 1: Author Profile ---
-                        st.markdown("### 👤 Perfil Académico del Autor")
-                        checklist = integrity.get("author_checklist", {})
-                        
-                        cols = st.columns(3)
-                        
-                        # Col 1: Links (Precision Search)
-                        with cols[0]:
-                            # Precision Scholar Link (Search Authors)
-                            s_search = f"https://scholar.google.com/citations?view_op=search_authors&hl=es&mauthors={urllib.parse.quote(author_name)}"
-                            # Precision ORCID Link
-                            o_search = f"https://orcid.org/orcid-search/search?searchQuery={urllib.parse.quote(author_name)}"
-                            
-                            st.markdown("**Búsqueda Inteligente:**")
-                            st.markdown(f"🔎 [Buscar en Scholar]({s_search})")
-                            st.markdown(f"🆔 [Buscar en ORCID]({o_search})")
-
-                        # Col 2: Recent Pubs
-                        with cols[1]:
-                            pubs = checklist.get("recent_publications_list", [])
-                            st.markdown("**Publicaciones Recientes:**")
-                            if pubs and len(pubs) > 0:
-                                for p in pubs[:2]: # Show top 2
-                                    if isinstance(p, dict):
-                                        title = p.get("title", "Sin título")
-                                        year = p.get("year", "")
-                                        # Simple Pub Link: Title + Author
-                                        query = f"{title} {author_name}"
-                                        search_url = f"https://scholar.google.com/scholar?q={urllib.parse.quote(query)}"
-                                        st.markdown(f"📄 [{title} ({year})]({search_url})")
-                                    else:
-                                        # Fallback if string
-                                        query = f"{str(p)} {author_name}"
-                                        search_url = f"https://scholar.google.com/scholar?q={urllib.parse.quote(query)}"
-                                        st.markdown(f"📄 [{p}]({search_url})")
-                            else:
-                                st.warning("⚠️ No se listaron publicaciones recientes.")
-
-                        # Col 3: Affiliation
-                        with cols[2]:
-                            role = checklist.get("role_and_institution", "No identificado")
-                            st.markdown("**Afiliación (Inferida):**")
-                            if role and "No identificado" not in role:
-                                st.success(f"🏛️ {role}")
-                                # Precision Affiliation Link (Quoted Name + Institution)
-                                google_search = f"https://www.google.com/search?q=\"{urllib.parse.quote(author_name)}\"+{urllib.parse.quote(role)}"
-                                st.markdown(f"[🔗 Verificar Afiliación]({google_search})")
-                            else:
-                                st.error("❌ Cargo/Institución no claros")
-
-                        st.info(f"💡 **Evaluación:** {integrity.get('author_comment', 'No disponible')}")
-                        
-                        # --- Check 3: Methodology ---
-                        meth = integrity.get("article_methodology", "No detectado")
-                        st.info(f"📊 **Metodología Detectada:** {meth}")
-                        
-                        # --- Check 2: Prior Publication ---
-                        if integrity.get("is_previously_published"):
-                            st.error(f"🚨 **ALERTA PUBLICACIÓN:** Este artículo podría haber sido publicado previamente.")
-                            st.write(f"**Detalle:** {integrity.get('reason_publication')}")
-                            
-                            # Precision Duplicate Link (intitle: context_title)
-                            dup_query = f'intitle:"{context_title}"'
-                            dup_search = f"https://scholar.google.com/scholar?q={urllib.parse.quote(dup_query)}"
-                            st.markdown(f"🔴 [🔗 **VERIFICAR DUPLICADO**]({dup_search})")
-                        else:
-                            st.markdown("✅ **Originalidad:** No se detectaron publicaciones previas obvias.")
+                    if parallel_mode:
+                        integrity_key = ("integrity", author_name, context_title, abstract, keywords, selected_model_name)
+                        integrity_future = submit_task(integrity_key, verify_article_integrity, api_key, author_name, context_title, abstract, keywords, selected_model_name)
+                        pending_tasks[integrity_future] = "integrity"
+                        integrity_slot = st.container() # Filled in when the future completes
+                    else:
+                        # Verify Author & Integrity
+                        with st.spinner(f"Verificando integridad y estatus académico..."):
+                            integrity = verify_article_integrity(api_key, author_name, context_title, abstract, keywords, selected_model_name)
                             
-                else:
-                    st.info(f"**Analizando:** {context_title}")
-                
-                # Show details
-                if keywords:
-                    with st.expander("Ver Palabras Clave"):
-                        st.write(keywords)
-                if abstract and abstract != keywords:
-                     with st.expander("Ver Resumen"):
-                        st.write(abstract)
+                        if integrity:
+                            render_integrity_panel(integrity, author_name, context_title)
                         
             else:
                 st.sidebar.error("ID de artículo no encontrado.")
@@ -493,12 +449,76 @@ else:
     
     target_article_context = "\n\n".join(components)
 
-prioritize_latam = st.sidebar.checkbox("Priorizar Expertos de LatAm", value=True)
+stream_results = st.sidebar.toggle("Mostrar candidatos en vivo", value=True, help="Muestra cada revisor apenas la IA lo propone, sin esperar la respuesta completa.")
 run_btn = st.sidebar.button("🔍 Buscar Revisores")
+task_status = st.sidebar.container()
+
+response_cache = get_response_cache()
+if response_cache:
+    with st.sidebar.expander("💾 Caché de respuestas IA"):
+        cache_stats = response_cache.stats()
+        st.caption(
+            f"Aciertos: {cache_stats['hits']} · Fallos: {cache_stats['misses']} "
+            f"({cache_stats['hit_rate']:.0%})  \n"
+            f"Entradas: {cache_stats['entries']} · {cache_stats['size_bytes'] / 1024 / 1024:.1f} MB"
+        )
+        if hedge_policy:
+            st.caption(f"Llamadas extra al modelo de respaldo: {hedge_policy.extra_calls()}")
+
+write_queue = get_write_queue()
+if write_queue:
+    queue_stats = write_queue.stats()
+    if queue_stats["pending"] or queue_stats["failed"]:
+        with st.sidebar.expander("📤 Escrituras a Sheets", expanded=bool(queue_stats["failed"])):
+            st.caption(f"Pendientes: {queue_stats['pending']} · Fallidas: {queue_stats['failed']}")
+            if queue_stats["last_error"]:
+                st.caption(f"Último error: {queue_stats['last_error']}")
+            if queue_stats["failed"] and st.button("🔁 Reintentar fallidas"):
+                write_queue.retry_failed()
+                st.rerun()
+
+# Operator panel, only with ?admin=1 in the URL
+if st.query_params.get("admin") == "1":
+    with st.sidebar.expander("🛠️ Rendimiento por etapa"):
+        stage_summary = tracing.get_tracer().summary()
+        if stage_summary:
+            df_stages = pd.DataFrame.from_dict(stage_summary, orient="index")
+            df_stages.index.name = "etapa"
+            st.dataframe(df_stages.round(1))
+            st.caption("Tiempos en ms (p50/p95 de las últimas ejecuciones de este proceso).")
+        else:
+            st.caption("Aún no hay trazas en este proceso.")
+        hedge_stats = hedge_policy.stats() if hedge_policy else {}
+        if hedge_stats:
+            df_hedge = pd.DataFrame.from_dict(hedge_stats, orient="index")
+            df_hedge.index.name = "modelo"
+            st.dataframe(df_hedge.round(2))
+            st.caption("Cobertura entre modelos: llamadas como modelo elegido, cuántas (y qué fracción) se cubrieron con el de respaldo, y victorias por ejecución.")
 
 st.sidebar.divider()
 st.sidebar.markdown(f"[📂 Abrir Base de Datos Google Sheets](https://docs.google.com/spreadsheets/d/{sheet_id_evaluadores})")
 
+# Render each background section as soon as its future completes
+if pending_tasks:
+    with task_status:
+        st.caption("⏳ Verificación y carga de datos en curso...")
+    for future in as_completed(pending_tasks):
+        section = pending_tasks[future]
+        result = future.result() if not future.exception() else None
+        if section == "integrity" and result:
+            with integrity_slot:
+                render_integrity_panel(result, author_name, context_title)
+        elif section == "evaluadores" and result is not None:
+            with task_status:
+                st.caption(f"📚 Base de evaluadores lista ({len(result)} registros).")
+# The speculative search takes a full model call: report it without holding up the page
+if speculative_future is not None:
+    with task_status:
+        if not speculative_future.done():
+            st.caption("🤖 Búsqueda adelantada en curso...")
+        elif not speculative_future.exception() and speculative_future.result():
+            st.caption("🤖 Búsqueda adelantada lista: pulse 'Buscar Revisores' para verla.")
+
 # Main Logic
 # Initialize Session State
 if 'search_results' not in st.session_state:
@@ -507,118 +527,41 @@ if 'search_results' not in st.session_state:
 # If button pressed, run search
 if run_btn and target_article_context:
     
-    with st.spinner("Loading reviewer database..."):
-        df_evaluadores = load_evaluadores(sheet_id_evaluadores)
-        
-        if df_evaluadores is not None:
-            evaluadores_str = df_evaluadores.to_string(index=False)
-            
-            with st.spinner("🤖 Gemini is analyzing matches and finding experts..."):
-                json_results = find_reviewers_with_gemini(api_key, target_article_context, prioritize_latam, evaluadores_str, selected_model_name)
-            
-            if json_results:
-                st.session_state['search_results'] = json_results
-                st.success("¡Análisis Completo!")
-
-# Display Results (Persistent)
-if st.session_state['search_results']:
-    results = st.session_state['search_results']
-    
-    # Removed global methodology display from here (moved to Profile)
+    search_key = ("search", target_article_context, article_authors, prioritize_latam, top_k, selected_model_name)
+    speculative = st.session_state.get("background_tasks", {}).get(search_key)
+    metrics = {}
+    started = time.monotonic()
     
-    tab1, tab2 = st.tabs(["🏛️ Coincidencias Internas (BD)", "🌎 Sugerencias Externas (Nuevos)"])
+    with st.spinner("🤖 Gemini is analyzing matches and finding experts..."):
+        json_results = None
+        if speculative is not None and not speculative.exception():
+            # Reuse the search started when the article was found (waits if still running)
+            json_results = speculative.result()
+            metrics["total_s"] = time.monotonic() - started
+        if json_results is None and stream_results:
+            # Show each candidate in its tab as soon as Gemini finishes writing it
+            live_tabs = dict(zip(["internal_matches", "external_suggestions"], st.tabs(["🏛️ Coincidencias Internas (BD)", "🌎 Sugerencias Externas (Nuevos)"])))
+            def show_candidate(section, item):
+                if section not in live_tabs or not isinstance(item, dict): return
+                with live_tabs[section]:
+                    place = item.get("Institucion") or item.get("Afiliación", "")
+                    st.markdown(f"**{item.get('Nombre', '')} {item.get('Apellidos', '')}** · {place}  \n{item.get('Reason', '')}")
+            json_results = search_reviewers(sheet_id_evaluadores, api_key, target_article_context, prioritize_latam, top_k, selected_model_name, on_item=show_candidate, metrics=metrics, authors=article_authors)
+        elif json_results is None:
+            json_results = search_reviewers(sheet_id_evaluadores, api_key, target_article_context, prioritize_latam, top_k, selected_model_name, metrics=metrics, authors=article_authors)
     
-    with tab1:
-        if results.get("internal_matches"):
-            df_internal = pd.DataFrame(results["internal_matches"])
-            # Reorder columns: Add Methodology
-            desired_order = ["Nombre", "Apellidos", "Institucion", "Temas", "Methodology", "Reason"]
-            # Filter to only columns that actually exist
-            cols = [c for c in desired_order if c in df_internal.columns]
-            # Add remaining
-            remaining = [c for c in df_internal.columns if c not in cols]
-            
-            st.table(df_internal[cols + remaining])
-        else:
-            st.info("No se encontraron coincidencias internas fuertes.")
-            
-    with tab2:
-        externals = results.get("external_suggestions", [])
-        if externals:
-            st.info("Seleccione candidatos para añadir a la base de datos:")
-            
-            df_externals = pd.DataFrame(externals)
-            
-            with st.form("add_reviewers_form"):
-                selected_indices = []
-                for i, row in df_externals.iterrows():
-                    # Added column for Email (cols[2])
-                    cols = st.columns([0.05, 0.2, 0.2, 0.2, 0.15, 0.1, 0.1])
-                    with cols[0]:
-                        if st.checkbox("", key=f"select_{i}"):
-                            selected_indices.append(i)
-                    with cols[1]:
-                        st.write(f"**{row['Nombre']} {row['Apellidos']}**")
-                    with cols[2]:
-                        st.caption(f"📧 {row.get('Correo', 'N/A')}")
-                    with cols[3]:
-                        st.write(row['Afiliación'])
-                    with cols[4]:
-                        st.write(row['Temas'])
-                        st.caption(f"🛠 {row.get('Methodology', '')}")
-                    with cols[5]:
-                        st.write(row['País'])
-                    with cols[6]:
-                        s_link, o_link, _ = get_verification_links(f"{row['Nombre']} {row['Apellidos']}", row['Afiliación'])
-                        st.markdown(f"[🔎 Scholar]({s_link})")
-                        st.markdown(f"[🆔 ORCID]({o_link})")
-                    st.divider()
-                
-                submitted = st.form_submit_button("➕ Añadir Seleccionados a la BD")
-                
-                if submitted:
-                    if selected_indices:
-                        # Filter selected rows
-                        rows_to_add = df_externals.iloc[selected_indices].drop(columns=['Reason'], errors='ignore')
-                        
-                        target_columns = ["ID Artículo", "Nombre", "Apellidos", "Correo electrónico", "Afiliación institucional", "País", "Google Scholar", "OrcId", "Temas"]
-                        
-                        rows_prepared = pd.DataFrame()
-                         # Use Article ID if known
-                        current_id_val = article_id_input if mode == "Por ID de Artículo" and 'article_id_input' in locals() and article_id_input else ""
-                        
-                        rows_prepared["ID Artículo"] = [current_id_val] * len(rows_to_add)
-                        rows_prepared["Nombre"] = rows_to_add["Nombre"]
-                        rows_prepared["Apellidos"] = rows_to_add["Apellidos"]
-                        rows_prepared["Correo electrónico"] = rows_to_add["Correo"]
-                        rows_prepared["Afiliación institucional"] = rows_to_add["Afiliación"]
-                        rows_prepared["País"] = rows_to_add["País"]
-                        
-                        # Generate clickable links for the database
-                        scholar_links = []
-                        orcid_links = []
-                        
-                        for _, row in rows_to_add.iterrows():
-                            s_link, o_link, _ = get_verification_links(f"{row['Nombre']} {row['Apellidos']}", row['Afiliación'])
-                            scholar_links.append(s_link)
-                            orcid_links.append(o_link)
-                            
-                        rows_prepared["Google Scholar"] = scholar_links
-                        rows_prepared["OrcId"] = orcid_links
-                        rows_prepared["Temas"] = rows_to_add["Temas"]
-                        
-                        # Sanitize data for JSON (gspread)
-                        rows_prepared = rows_prepared.fillna("")
-                        
-                        # Get fresh worksheet object for writing
-                        ws_to_append = get_active_worksheet(sheet_id_evaluadores)
-
-                        # Append
-                        if ws_to_append and append_to_sheet(ws_to_append, rows_prepared):
-                            load_evaluadores.clear()
-                            st.success(f"✅ ¡Se añadieron {len(rows_prepared)} revisores a la base de datos!")
-                            st.balloons()
-                    else:
-                        st.warning("Por favor seleccione al menos un revisor.")
-        else:
-            st.warning("La IA no pudo generar sugerencias externas.")
+    # Profiles stored by the integrity check since the search started may add conflicts
+    json_results, metrics["conflicts_removed"] = drop_conflicting_matches(json_results, article_authors)
+    if json_results:
+        st.session_state['search_results'] = json_results
+        st.session_state['search_metrics'] = metrics
+        st.success("¡Análisis Completo!")
+        if stream_results:
+            st.rerun() # Replace the live preview with the full, interactive results
+
+# Display Results (Persistent)
+current_article_id = article_id_input if mode == "Por ID de Artículo" and article_id_input else ""
+render_results(sheet_id_evaluadores, current_article_id)
+
+# Whole-script render time; fragment reruns are traced on their own as ui.<panel>
+tracing.record_span("ui.script", time.perf_counter() - _script_started, fragments=use_fragments)
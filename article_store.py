@@ -0,0 +1,109 @@
+"""
+In-memory article store for the APUNTES sheet.
+
+The sheet is downloaded once and kept as a list of rows plus an `ID -> row`
+hash index, so lookups don't need a full download and DataFrame scan each time.
+New submissions are picked up incrementally by fetching only the rows past the
+last known row count.
+"""
+import threading
+import time
+
+from gspread.utils import rowcol_to_a1
+
+
+def _column_letter(n_cols):
+    """1 -> 'A', 27 -> 'AA' (the A1 column part of the last header cell)."""
+    return rowcol_to_a1(1, max(n_cols, 1)).rstrip("0123456789")
+
+
+class ArticleStore:
+    """
+    Thread-safe cache of an articles worksheet.
+
+    * `get(article_id)` answers from memory; on a miss it fetches the rows
+      appended since the last sync (at most once every `min_refresh_interval`
+      seconds) and looks again.
+    * Every `full_reload_after` seconds the whole sheet is re-downloaded so
+      edits to existing rows are eventually seen.
+    """
+
+    def __init__(self, worksheet, full_reload_after=600, min_refresh_interval=10):
+        self.worksheet = worksheet
+        self.full_reload_after = full_reload_after
+        self.min_refresh_interval = min_refresh_interval
+        self.headers = []
+        self.rows = []
+        self.index = {}
+        self.loaded_at = 0.0
+        self.refreshed_at = 0.0
+        self._lock = threading.RLock()
+
+    @property
+    def row_count(self):
+        """Number of data rows (excluding the header) known locally."""
+        return len(self.rows)
+
+    def _add_rows(self, raw_rows):
+        width = len(self.headers)
+        for raw in raw_rows:
+            values = (list(raw) + [""] * width)[:width]
+            row = dict(zip(self.headers, values))
+            self.rows.append(row)
+            article_id = str(row.get("ID", "")).strip()
+            # Keep the first occurrence, as the old DataFrame filter did
+            if article_id and article_id not in self.index:
+                self.index[article_id] = row
+
+    def load(self):
+        """Downloads the whole sheet and rebuilds the index."""
+        with self._lock:
+            data = self.worksheet.get_all_values()
+            self.headers = [h.strip() for h in data[0]] if data else []  # Normalize headers
+            if data and "ID" not in self.headers:
+                raise LookupError(f"Column 'ID' not found in sheet. Available columns: {self.headers}")
+            self.rows = []
+            self.index = {}
+            self._add_rows(data[1:])
+            self.loaded_at = self.refreshed_at = time.time()
+            return self.row_count
+
+    def refresh(self):
+        """Fetches only the rows appended after the last known row. Returns how many were added."""
+        with self._lock:
+            if not self.loaded_at:
+                return self.load()
+            # Row 1 is the header, so the first unseen data row is row_count + 2
+            first_row = self.row_count + 2
+            last_col = _column_letter(len(self.headers))
+            new_rows = self.worksheet.get_values(f"A{first_row}:{last_col}")
+            self._add_rows(new_rows)
+            self.refreshed_at = time.time()
+            return len(new_rows)
+
+    def recent_ids(self, n):
+        """IDs of the last `n` distinct articles in sheet order (newest submissions last in the sheet), newest first."""
+        with self._lock:
+            if not self.loaded_at or time.time() - self.loaded_at > self.full_reload_after:
+                self.load()
+            elif time.time() - self.refreshed_at > self.min_refresh_interval:
+                self.refresh()
+            ids = []
+            for row in reversed(self.rows):
+                article_id = str(row.get("ID", "")).strip()
+                if article_id and article_id not in ids:
+                    ids.append(article_id)
+                    if len(ids) >= n:
+                        break
+            return ids
+
+    def get(self, article_id):
+        """Returns the row dict for `article_id` (keys are the normalized headers) or None."""
+        key = str(article_id).strip()
+        with self._lock:
+            now = time.time()
+            if not self.loaded_at or now - self.loaded_at > self.full_reload_after:
+                self.load()
+            elif key not in self.index and now - self.refreshed_at > self.min_refresh_interval:
+                self.refresh()
+            return self.index.get(key)
@@ -0,0 +1,144 @@
+"""
+Long-lived store of author profiles (recent publications, role and institution).
+
+The integrity check asks Gemini for each author's profile separately from the
+per-article checks, so an author who sends several manuscripts, or co-authors
+across an issue, is profiled once. Profiles are kept in SQLite keyed by the
+accent/case-folded name and expire after a long TTL (authors change
+institution slowly). `split_authors` fans an `Autores` cell out into names.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from dedup import normalize_name
+
+DEFAULT_TTL = 90 * 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    name_key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    model TEXT NOT NULL,
+    profile_json TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+AFFILIATION_RE = re.compile(r"\(([^)]*)\)") # 'Ana Pérez (Universidad de Chile)'
+_SEPARATORS_RE = re.compile(r"[;\n&]")
+_CONJUNCTION_RE = re.compile(r",?\s+(?:y|and)\s+", re.IGNORECASE)
+
+
+def _split_if_full_names(text, pattern):
+    """Splits only when every piece looks like a full name (2+ words): keeps 'Pérez, Ana' and 'Ortega y Gasset' whole."""
+    pieces = [p.strip() for p in re.split(pattern, text) if p.strip()]
+    return pieces if len(pieces) > 1 and all(len(p.split()) > 1 for p in pieces) else [text.strip()]
+
+
+def split_authors(authors):
+    """
+    'Ana Pérez; Luis Gómez y María Ruiz' -> ['Ana Pérez', 'Luis Gómez', 'María Ruiz'].
+    Affiliations in parentheses are left out of the names, so an author is
+    the same profile however their institution is written. Repeated names
+    (after accent/case folding) are dropped.
+    """
+    names = []
+    for part in _SEPARATORS_RE.split(AFFILIATION_RE.sub(" ", str(authors or ""))):
+        for piece in _split_if_full_names(part, _CONJUNCTION_RE):
+            names += _split_if_full_names(piece, ",")
+    unique = {}
+    for name in names:
+        unique.setdefault(normalize_name(name), name.strip(" ,"))
+    return [name for key, name in unique.items() if key]
+
+
+class AuthorProfileStore:
+    """SQLite TTL store of profile dicts keyed by folded author name, with hit/miss counters."""
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._fetching = {} # name_key -> [Lock held while that profile is being generated, callers using it]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, conn, name):
+        conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, name, count=True):
+        """Stored profile for this author, or None (counted as a hit or a miss unless `count` is false)."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT profile_json FROM profiles WHERE name_key = ? AND expires_at > ?",
+                (normalize_name(name), time.time()),
+            ).fetchone()
+            if count:
+                self._count(conn, "hits" if row else "misses")
+        return json.loads(row[0]) if row else None
+
+    def put(self, name, model_name, profile):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO profiles (name_key, name, model, profile_json, created_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (normalize_name(name), name, model_name, json.dumps(profile, ensure_ascii=False), now, now + self.ttl),
+            )
+            conn.execute("DELETE FROM profiles WHERE expires_at <= ?", (now,))
+
+    def get_or_fetch(self, name, model_name, fetch):
+        """
+        Stored profile, or `fetch(name)` stored for next time (None results aren't
+        stored). Concurrent calls for the same author wait for a single fetch.
+        """
+        name_key = normalize_name(name)
+        with self._lock:
+            fetching = self._fetching.setdefault(name_key, [threading.Lock(), 0])
+            fetching[1] += 1
+        try:
+            with fetching[0]:
+                profile = self.get(name)
+                if profile is None:
+                    profile = fetch(name)
+                    if profile is not None:
+                        self.put(name, model_name, profile)
+        finally:
+            # The last caller for this author drops the entry, so the dict only holds in-flight names
+            with self._lock:
+                fetching[1] -= 1
+                if not fetching[1]:
+                    del self._fetching[name_key]
+        return profile
+
+    def stats(self):
+        """{'hits', 'misses', 'hit_rate', 'entries'}"""
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM profiles WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0, "entries": entries}
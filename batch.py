@@ -0,0 +1,230 @@
+"""
+Headless batch pipeline: integrity check + reviewer search for many article IDs.
+
+Reuses `fetch_article_details`, `verify_article_integrity` and the reviewer
+search from `core` without the Streamlit UI. Results are appended to a JSONL
+file as each article finishes, so an interrupted run can be resumed without
+repeating the articles that already succeeded.
+
+Usage:
+    python batch.py 2740-2760 2801,2805 @ids.txt --out resultados.jsonl --workers 4 --rpm 20
+    python batch.py 2740-2760 --out resultados.jsonl --parquet resultados.parquet
+
+Sheet IDs, API key and credentials are read from the environment or from
+`.streamlit/secrets.toml`, exactly like the app.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import rate_limit
+from core import (
+    fetch_article_details, get_response_cache, get_secret, prefetch_integrity_checks, search_reviewers,
+    verify_article_integrity,
+)
+
+DEFAULT_MODEL = "gemini-flash-latest"
+# Missing articles are re-checked on resume: it's only a sheet lookup, and a
+# failed Sheets connection looks the same as an unknown ID.
+DONE_STATUSES = ("ok",)
+
+
+def parse_ids(specs):
+    """
+    Expands ID specs into an ordered, de-duplicated list of strings.
+    Accepts single IDs ('2746'), ranges ('2740-2760'), comma lists ('1,2,3')
+    and files with one spec per line ('@ids.txt').
+    """
+    ids = []
+    for spec in specs:
+        if spec.startswith("@"):
+            with open(spec[1:], encoding="utf-8") as f:
+                ids += parse_ids([line.strip() for line in f if line.strip() and not line.startswith("#")])
+            continue
+        for part in spec.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            start, sep, end = part.partition("-")
+            if sep and start.isdigit() and end.isdigit():
+                ids += [str(i) for i in range(int(start), int(end) + 1)]
+            else:
+                ids.append(part)
+    return list(dict.fromkeys(ids))
+
+
+def load_checkpoint(path):
+    """IDs already processed successfully in a previous run."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue # Partial line from a crash mid-write
+            if record.get("status") in DONE_STATUSES:
+                done.add(str(record.get("id")))
+    return done
+
+
+def process_article(article_id, sheet_id_articulos, sheet_id_evaluadores, api_key, model_name,
+                    run_search=True, prioritize_latam=True, top_k=60):
+    """Runs the app's per-article flow for one ID and returns a JSON-serializable record."""
+    started = time.monotonic()
+    record = {"id": article_id, "model": model_name}
+
+    article = fetch_article_details(sheet_id_articulos, article_id)
+    if not article:
+        record["status"] = "not_found"
+        record["elapsed_s"] = round(time.monotonic() - started, 2)
+        return record
+    record["article"] = article
+
+    title = article.get("Titulo", "")
+    abstract = article.get("Resumen", "")
+    keywords = article.get("Palabras clave", "")
+    author_name = article.get("Autores", "")
+    errors = []
+
+    if author_name:
+        record["integrity"] = verify_article_integrity(api_key, author_name, title, abstract, keywords, model_name)
+        if record["integrity"] is None:
+            errors.append("integrity")
+
+    if run_search:
+        context = f"TITLE: {title}\nKEYWORDS: {keywords}\nABSTRACT: {abstract}\nLINK: {article.get('Link', '')}"
+        record["reviewers"] = search_reviewers(sheet_id_evaluadores, api_key, context, prioritize_latam, top_k, model_name, authors=author_name)
+        if record["reviewers"] is None:
+            errors.append("search")
+
+    record["status"] = "error" if errors else "ok"
+    if errors:
+        record["error"] = f"Failed stages: {', '.join(errors)}"
+    record["elapsed_s"] = round(time.monotonic() - started, 2)
+    return record
+
+
+def run_batch(article_ids, out_path, sheet_id_articulos, sheet_id_evaluadores, api_key,
+              model_name=DEFAULT_MODEL, workers=4, per_minute=30, run_search=True,
+              prioritize_latam=True, top_k=60, resume=True, integrity_batch=True, log=print):
+    """
+    Processes `article_ids` with at most `workers` in flight and a shared
+    `per_minute` Gemini call budget, appending one JSON line per article to
+    `out_path`. With `resume`, IDs already finished in `out_path` are skipped.
+    With `integrity_batch`, the integrity stage of all pending articles is
+    first run in batched requests (see `prefetch_integrity_checks`), so the
+    per-article workers mostly read it from the caches.
+    Returns a {status: count} summary.
+    """
+    done = load_checkpoint(out_path) if resume else set()
+    todo = [i for i in article_ids if i not in done]
+    if done:
+        log(f"Resuming: {len(article_ids) - len(todo)} of {len(article_ids)} IDs already in {out_path}")
+
+    # Gemini calls go through the shared per-model limiter in core.call_gemini_api
+    if per_minute:
+        rate_limit.configure(rate_per_min=per_minute, max_queue=max(rate_limit.DEFAULT_MAX_QUEUE, workers * 2))
+    write_lock = threading.Lock()
+    summary = {}
+
+    if integrity_batch and todo:
+        articles = [fetch_article_details(sheet_id_articulos, article_id) for article_id in todo]
+        items = [(a.get("Autores", ""), a.get("Titulo", ""), a.get("Resumen", ""), a.get("Palabras clave", ""))
+                 for a in articles if a and a.get("Autores")]
+        if items:
+            batched = prefetch_integrity_checks(api_key, items, model_name)
+            log(f"Integrity prefetch: {batched['batched_articles']}/{batched['articles']} articles and "
+                f"{batched['batched_authors']}/{batched['authors']} authors answered in batches")
+
+    with open(out_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(process_article, article_id, sheet_id_articulos, sheet_id_evaluadores, api_key,
+                        model_name, run_search, prioritize_latam, top_k): article_id
+            for article_id in todo
+        }
+        for n, future in enumerate(as_completed(futures), start=1):
+            article_id = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {"id": article_id, "model": model_name, "status": "error", "error": repr(e)}
+            record["finished_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+            # Checkpoint: each finished article is durable before moving on
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+
+            summary[record["status"]] = summary.get(record["status"], 0) + 1
+            log(f"[{n}/{len(todo)}] {article_id}: {record['status']} ({record.get('elapsed_s', 0)}s)")
+    return summary
+
+
+def write_parquet(jsonl_path, parquet_path):
+    """Converts the JSONL results (latest record per ID) to Parquet, nested fields as JSON strings."""
+    import pandas as pd
+
+    with open(jsonl_path, encoding="utf-8") as f:
+        records = {}
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[str(record.get("id"))] = record
+    df = pd.DataFrame(list(records.values()))
+    for col in ("article", "integrity", "reviewers"):
+        if col in df.columns:
+            df[col] = df[col].apply(lambda v: json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else None)
+    df.to_parquet(parquet_path, index=False) # Needs pyarrow (installed with streamlit)
+    return len(df)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Procesa varios artículos sin la interfaz de Streamlit.")
+    parser.add_argument("ids", nargs="+", help="IDs, rangos (2740-2760), listas (1,2,3) o @archivo.txt")
+    parser.add_argument("--out", default="batch_results.jsonl", help="Archivo JSONL de resultados / checkpoint")
+    parser.add_argument("--parquet", help="Además, exportar los resultados a este archivo Parquet")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Modelo de Gemini")
+    parser.add_argument("--workers", type=int, default=4, help="Artículos procesados en paralelo")
+    parser.add_argument("--rpm", type=int, default=30, help="Límite compartido de llamadas a Gemini por minuto")
+    parser.add_argument("--top-k", type=int, default=60, help="Candidatos enviados a la IA (0 = toda la base)")
+    parser.add_argument("--no-search", action="store_true", help="Solo verificación de integridad")
+    parser.add_argument("--no-latam", action="store_true", help="No priorizar expertos de LatAm")
+    parser.add_argument("--restart", action="store_true", help="Ignorar el checkpoint y procesar todo de nuevo")
+    parser.add_argument("--no-integrity-batch", action="store_true", help="Verificar la integridad artículo por artículo, sin lotes")
+    args = parser.parse_args(argv)
+
+    sheet_id_articulos = get_secret("SHEET_ID_ARTICULOS")
+    sheet_id_evaluadores = get_secret("SHEET_ID_EVALUADORES")
+    api_key = get_secret("GEMINI_API_KEY")
+    if not sheet_id_articulos or not sheet_id_evaluadores or not api_key:
+        print("Missing SHEET_ID_ARTICULOS, SHEET_ID_EVALUADORES or GEMINI_API_KEY (env or secrets.toml)", file=sys.stderr)
+        return 2
+
+    article_ids = parse_ids(args.ids)
+    summary = run_batch(
+        article_ids, args.out, sheet_id_articulos, sheet_id_evaluadores, api_key,
+        model_name=args.model, workers=args.workers, per_minute=args.rpm,
+        run_search=not args.no_search, prioritize_latam=not args.no_latam,
+        top_k=args.top_k, resume=not args.restart, integrity_batch=not args.no_integrity_batch,
+    )
+    print(f"Done: {summary}")
+    cache = get_response_cache()
+    if cache:
+        stats = cache.stats()
+        print(f"Response cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%})")
+    if args.parquet:
+        print(f"Wrote {write_parquet(args.out, args.parquet)} rows to {args.parquet}")
+    return 1 if summary.get("error") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
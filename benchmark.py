@@ -0,0 +1,190 @@
+"""
+Offline benchmark of the reviewer-search flow.
+
+Runs the real code path (load_evaluadores -> shortlist/prompt build ->
+find_reviewers_with_gemini -> add_reviewers -> incremental reload) headless
+against in-memory Sheets (`fake_sheets`) and the local Gemini stub
+(`gemini_stub`), for several database sizes, and reports latency, memory and
+prompt size for each.
+
+    python benchmark.py
+    python benchmark.py --sizes 100,1000 --searches 10 --latency 0.5 --rate-429 0.1 --json bench.json
+
+No Google credentials or network access are needed.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DEFAULT_SIZES = "100,1000,10000,100000"
+BENCH_MODEL = "gemini-1.5-flash"
+BENCH_API_KEY = "benchmark"
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def run_size(core, stub, n_reviewers, articles, args):
+    from prompt_format import serialize_reviewers
+    from storage import SheetsBackend
+
+    sheet_id = f"eval-{n_reviewers}"
+    storage = core.get_storage()
+    result = {"reviewers": n_reviewers, "backend": storage.name}
+
+    # Cold load: download + DataFrame, then the BM25 index
+    started = time.perf_counter()
+    df = core.load_evaluadores(sheet_id)
+    result["load_ms"] = _ms(time.perf_counter() - started)
+    started = time.perf_counter()
+    core.get_reviewer_index(sheet_id)
+    result["index_ms"] = _ms(time.perf_counter() - started)
+
+    # Prompt size if the whole database were sent (what the app did before shortlisting)
+    result["full_db_prompt_tokens"] = serialize_reviewers(df, token_budget=0).estimated_tokens
+    if not args.skip_legacy:
+        started = time.perf_counter()
+        result["legacy_to_string_chars"] = len(df.to_string())
+        result["legacy_to_string_ms"] = _ms(time.perf_counter() - started)
+
+    calls_before, throttled_before, truncated_before = stub.state.generate_calls, stub.state.throttled_calls, stub.state.truncated_calls
+    search_ms, prompt_tokens, failures = [], [], 0
+    for article_id in articles[:args.searches]:
+        article = core.fetch_article_details("articulos", article_id)
+        context = f"TITLE: {article['Titulo']}\nKEYWORDS: {article['Palabras clave']}\nABSTRACT: {article['Resumen']}\nLINK: {article['Link']}"
+        metrics = {}
+        started = time.perf_counter()
+        found = core.search_reviewers(sheet_id, BENCH_API_KEY, context, True, args.top_k, BENCH_MODEL, metrics=metrics, authors=article["Autores"])
+        search_ms.append(_ms(time.perf_counter() - started))
+        prompt_tokens.append(metrics.get("prompt_tokens_est", 0))
+        failures += found is None
+    # A rerun of the same search (what every Streamlit rerun used to pay): served from the caches
+    started = time.perf_counter()
+    core.search_reviewers(sheet_id, BENCH_API_KEY, context, True, args.top_k, BENCH_MODEL, authors=article["Autores"])
+    result["repeat_search_ms"] = _ms(time.perf_counter() - started)
+    result.update(
+        search_p50_ms=round(statistics.median(search_ms), 1),
+        search_max_ms=max(search_ms),
+        prompt_tokens=statistics.median(prompt_tokens),
+        search_failures=failures,
+        gemini_calls=stub.state.generate_calls - calls_before,
+        gemini_429=stub.state.throttled_calls - throttled_before,
+        gemini_truncated=stub.state.truncated_calls - truncated_before,
+    )
+    # Billed calls per usable answer (429s aren't billed; continuations are)
+    successes = len(search_ms) - failures
+    result["calls_per_success"] = round((result["gemini_calls"] - result["gemini_429"]) / successes, 2) if successes else None
+
+    # Append through the app's function, then the incremental reload that follows it
+    new_rows = df.head(3).copy()
+    new_rows["Correo electrónico"] = [f"nuevo{i}@example.org" for i in range(len(new_rows))]
+    started = time.perf_counter()
+    core.add_reviewers(sheet_id, new_rows.astype(str))
+    result["append_ms"] = _ms(time.perf_counter() - started)
+    if isinstance(storage, SheetsBackend):
+        storage.mirror(sheet_id).probed_at = 0 # Force the modifiedTime probe
+    started = time.perf_counter()
+    core.load_evaluadores(sheet_id)
+    result["reload_after_append_ms"] = _ms(time.perf_counter() - started)
+
+    if not args.skip_memory:
+        # Second cold load + index under tracemalloc (it slows things down, so it isn't timed)
+        if isinstance(storage, SheetsBackend):
+            storage.reset(sheet_id)
+        else:
+            storage._frames.clear()
+        core._build_reviewer_index.clear()
+        tracemalloc.start()
+        core.get_reviewer_index(sheet_id)
+        result["peak_memory_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        tracemalloc.stop()
+    return result
+
+
+def print_table(results):
+    columns = [
+        ("reviewers", "filas"), ("load_ms", "carga ms"), ("index_ms", "índice ms"),
+        ("search_p50_ms", "búsqueda p50"), ("search_max_ms", "máx"), ("repeat_search_ms", "repetida ms"), ("prompt_tokens", "tokens prompt"),
+        ("full_db_prompt_tokens", "tokens BD completa"), ("legacy_to_string_chars", "chars to_string"),
+        ("gemini_calls", "llamadas"), ("gemini_429", "429"), ("gemini_truncated", "cortadas"),
+        ("calls_per_success", "llamadas/éxito"), ("append_ms", "append ms"),
+        ("reload_after_append_ms", "recarga ms"), ("peak_memory_mb", "memoria MB"),
+    ]
+    columns = [(key, label) for key, label in columns if any(key in r for r in results)]
+    widths = [max(len(label), *(len(str(r.get(key, ""))) for r in results)) for key, label in columns]
+    print("  ".join(label.rjust(w) for (_, label), w in zip(columns, widths)))
+    for r in results:
+        print("  ".join(str(r.get(key, "")).rjust(w) for (key, _), w in zip(columns, widths)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sin conexión del flujo de búsqueda de revisores.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Tamaños de la base de evaluadores (por defecto {DEFAULT_SIZES})")
+    parser.add_argument("--searches", type=int, default=5, help="Búsquedas por tamaño")
+    parser.add_argument("--top-k", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.2, help="Latencia simulada de Gemini (s)")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fracción de llamadas a Gemini que reciben 429")
+    parser.add_argument("--truncate", type=float, default=0.0, help="Fracción de respuestas de Gemini cortadas (MAX_TOKENS)")
+    parser.add_argument("--sheets-latency", type=float, default=0.0, help="Latencia simulada por llamada a Sheets (s)")
+    parser.add_argument("--rpm", type=float, default=600, help="Límite de solicitudes por minuto del limitador")
+    parser.add_argument("--skip-memory", action="store_true", help="No medir memoria (tracemalloc)")
+    parser.add_argument("--skip-legacy", action="store_true", help="No medir el prompt to_string() anterior")
+    parser.add_argument("--backend", choices=["sheets", "sqlite"], default="sheets", help="Backend de almacenamiento a medir")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    args = parser.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    from gemini_stub import start_stub_server
+    stub, base_url = start_stub_server(latency=args.latency, jitter=args.jitter, rate_429=args.rate_429, truncate=args.truncate, seed=0)
+    # Must be set before core reads its settings: no disk caches, snapshots or trace log
+    os.environ.update(
+        GEMINI_API_BASE=base_url, GEMINI_CACHE_PATH="", REVIEWER_SNAPSHOT_DIR="",
+        TRACE_LOG_PATH="", SHEETS_WRITE_QUEUE_PATH="", GEMINI_CONTEXT_CACHE="off",
+        STORAGE_BACKEND=args.backend,
+    )
+    if args.backend == "sqlite":
+        # Fresh database each run; the first load per size includes the import from (fake) Sheets
+        sqlite_dir = tempfile.mkdtemp(prefix="bench-storage-")
+        os.environ["STORAGE_SQLITE_PATH"] = os.path.join(sqlite_dir, "storage.sqlite3")
+
+    import clients
+    import core
+    import fake_sheets
+    import rate_limit
+
+    # Silence the "no runtime" / "missing ScriptRunContext" warnings st.cache_* emits when headless
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+    rate_limit.configure(rate_per_min=args.rpm, max_concurrency=8, max_queue=64)
+    print(f"Generating data for {sizes}...", file=sys.stderr)
+    client = fake_sheets.make_client(sizes, n_articles=max(args.searches, 1), latency=args.sheets_latency)
+    clients.set_sheets_client(client)
+    articles = [row[0] for row in client.spreadsheets["articulos"].worksheet("APUNTES").values[1:]]
+
+    results = []
+    for n in sizes:
+        print(f"Benchmarking {n} reviewers...", file=sys.stderr)
+        results.append(run_size(core, stub, n, articles, args))
+    stub.shutdown()
+
+    print(f"Backend: {args.backend}")
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.json}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
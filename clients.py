@@ -0,0 +1,112 @@
+"""
+Process-wide client layer for Google Sheets and Gemini.
+
+* The authorized gspread client is created once and reused.
+* Opened spreadsheets and resolved worksheet handles are cached, so
+  `open_by_key` and the worksheet-name probing happen once per sheet.
+* All Gemini traffic goes through a single keep-alive `requests.Session`
+  with a connection pool, so calls don't pay a new TLS handshake each time.
+"""
+import threading
+
+import gspread
+import requests
+from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
+
+SHEETS_SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+
+# Worksheet names to try, in order: UPPERCASE (new), CamelCase (old). Index used if none exists.
+EVALUADORES_SHEETS = (("EVALUADORES", "Evaluadores"), 1)
+ARTICULOS_SHEETS = (("APUNTES", "Articulos"), 0)
+
+GEMINI_POOL_SIZE = 16
+GEMINI_CONNECT_TIMEOUT = 10  # seconds
+GEMINI_DEFAULT_DEADLINE = 180  # seconds, whole call including retries
+
+_lock = threading.RLock()
+_sheets_client = None
+_spreadsheets = {}
+_worksheets = {}
+_gemini_session = None
+
+
+# --- GOOGLE SHEETS ---
+
+def get_sheets_client(load_credentials):
+    """
+    Returns the shared gspread client, authorizing it on first use.
+    `load_credentials` is a callable returning the service-account info dict.
+    """
+    global _sheets_client
+    with _lock:
+        if _sheets_client is None:
+            creds = Credentials.from_service_account_info(load_credentials(), scopes=SHEETS_SCOPES)
+            _sheets_client = gspread.authorize(creds)
+        return _sheets_client
+
+
+def set_sheets_client(client):
+    """Replaces the shared client (e.g. with an offline stand-in for benchmarks) and drops resolved handles."""
+    global _sheets_client
+    with _lock:
+        _sheets_client = client
+        _spreadsheets.clear()
+        _worksheets.clear()
+
+
+def get_spreadsheet(client, sheet_id):
+    with _lock:
+        sh = _spreadsheets.get(sheet_id)
+        if sh is None:
+            sh = client.open_by_key(sheet_id)
+            _spreadsheets[sheet_id] = sh
+        return sh
+
+
+def get_worksheet(client, sheet_id, names, fallback_index):
+    """Resolves the first existing worksheet in `names` (else `fallback_index`) once per sheet."""
+    key = (sheet_id, tuple(names), fallback_index)
+    with _lock:
+        worksheet = _worksheets.get(key)
+        if worksheet is not None:
+            return worksheet
+        sh = get_spreadsheet(client, sheet_id)
+        for name in names:
+            try:
+                worksheet = sh.worksheet(name)
+                break
+            except gspread.WorksheetNotFound:
+                continue
+        else:
+            worksheet = sh.get_worksheet(fallback_index)
+        _worksheets[key] = worksheet
+        return worksheet
+
+
+def reset_sheets(sheet_id=None):
+    """Drops cached spreadsheet/worksheet handles (all, or for one sheet) so they are re-resolved."""
+    with _lock:
+        if sheet_id is None:
+            _spreadsheets.clear()
+            _worksheets.clear()
+            return
+        _spreadsheets.pop(sheet_id, None)
+        for key in [k for k in _worksheets if k[0] == sheet_id]:
+            del _worksheets[key]
+
+
+# --- GEMINI ---
+
+def get_gemini_session():
+    """Shared keep-alive session for the Gemini REST API."""
+    global _gemini_session
+    with _lock:
+        if _gemini_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=GEMINI_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Content-Type": "application/json"})
+            _gemini_session = session
+        return _gemini_session
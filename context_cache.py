@@ -0,0 +1,126 @@
+"""
+Gemini context caching for the stable part of the reviewer-search prompt.
+
+Every search starts with the same system instruction. When the whole
+Evaluadores database is sent (no BM25 shortlist), the REGISTERED REVIEWERS
+DATABASE block is stable too and is cached with it; a shortlist differs per
+article, so it stays in the request and only the instruction is cached. Each
+prefix is uploaded once as a `cachedContents` entry and later requests only
+send the varying part plus a reference to it.
+
+Entries are kept per model and per kind of prefix (instruction only, or
+instruction plus database), with a fingerprint of the cached text; when the
+data changes, the previous entry of that kind is deleted and a new one is
+created. A prefix below the model's minimum cacheable size is rejected by the
+API; that failure is remembered for NEGATIVE_TTL and the prompt goes inline.
+"""
+import hashlib
+import threading
+import time
+
+DEFAULT_TTL = 3600 # seconds
+# Failed creations (e.g. prefix below the model's minimum cacheable size) aren't retried for this long
+NEGATIVE_TTL = 600
+EXPIRY_MARGIN = 60 # Recreate entries this many seconds before they expire server-side
+
+
+def fingerprint(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class ContextCacheRegistry:
+    """Process-wide map of (model, has database block) -> cachedContents name and fingerprint."""
+
+    def __init__(self, base_url, ttl=DEFAULT_TTL):
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.entries = {} # (model, has prefix text) -> {"fingerprint", "name", "expires_at", "api_key"}
+        self.failures = {} # (model, fingerprint) -> retry_after (monotonic)
+        self._lock = threading.Lock()
+        self._creating = {} # (model, fingerprint) -> Lock held while that entry is being uploaded
+
+    def get_or_create(self, session, api_key, model_name, system_instruction, prefix_text, timeout=30):
+        """
+        Returns the cachedContents name for this prefix, creating it if needed,
+        or None if context caching isn't possible (callers then send the prompt inline).
+        An empty `prefix_text` caches the system instruction alone.
+        """
+        key_fp = fingerprint(model_name, system_instruction, prefix_text)
+        slot = (model_name, bool(prefix_text))
+        cached = self._lookup(slot, key_fp)
+        if cached is not False:
+            return cached
+        # Only requests for this same prefix wait on the upload; other models and lookups don't
+        with self._lock:
+            creating = self._creating.setdefault((model_name, key_fp), threading.Lock())
+        with creating:
+            cached = self._lookup(slot, key_fp) # Another request may have just created it
+            if cached is not False:
+                return cached
+            with self._lock:
+                entry = self.entries.get(slot)
+            stale = entry["name"] if entry else None
+            body = {
+                "model": f"models/{model_name}",
+                "systemInstruction": {"parts": [{"text": system_instruction}]},
+                "ttl": f"{int(self.ttl)}s",
+            }
+            if prefix_text:
+                body["contents"] = [{"role": "user", "parts": [{"text": prefix_text}]}]
+            try:
+                response = session.post(
+                    f"{self.base_url}/cachedContents",
+                    headers={"x-goog-api-key": api_key}, json=body, timeout=timeout,
+                )
+                response.raise_for_status()
+                name = response.json()["name"]
+            except Exception as e:
+                print(f"Context cache unavailable for {model_name}: {e}")
+                with self._lock:
+                    self.failures[(model_name, key_fp)] = time.monotonic() + NEGATIVE_TTL
+                    self._creating.pop((model_name, key_fp), None)
+                return None
+
+            with self._lock:
+                self.entries[slot] = {"fingerprint": key_fp, "name": name, "expires_at": time.monotonic() + self.ttl, "api_key": api_key}
+                self._creating.pop((model_name, key_fp), None)
+        if stale and stale != name:
+            self._delete(session, api_key, stale) # The data changed: drop the old prefix
+        return name
+
+    def _lookup(self, slot, key_fp):
+        """Live entry name for this prefix, None while a recent creation failure is remembered, else False."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entries.get(slot)
+            if entry and entry["fingerprint"] == key_fp and entry["expires_at"] - EXPIRY_MARGIN > now:
+                return entry["name"]
+            if self.failures.get((slot[0], key_fp), 0) > now:
+                return None
+        return False
+
+    def forget(self, name):
+        """Drops a local entry the server no longer recognizes (expired or deleted)."""
+        with self._lock:
+            for slot, entry in list(self.entries.items()):
+                if entry["name"] == name:
+                    del self.entries[slot]
+
+    def invalidate_all(self, session):
+        """Deletes every cached database prefix, e.g. after rows were appended to Evaluadores."""
+        with self._lock:
+            entries = [entry for slot, entry in self.entries.items() if slot[1]]
+            self.entries = {slot: entry for slot, entry in self.entries.items() if not slot[1]}
+            self.failures.clear()
+        for entry in entries:
+            self._delete(session, entry["api_key"], entry["name"])
+
+    def _delete(self, session, api_key, name):
+        try:
+            session.delete(f"{self.base_url}/{name}", headers={"x-goog-api-key": api_key}, timeout=10)
+        except Exception as e:
+            print(f"Could not delete context cache {name}: {e}") # It expires on its own anyway
@@ -0,0 +1,1190 @@
+"""
+Data access and Gemini calls shared by the Streamlit app and the headless
+batch pipeline. Nothing here renders UI beyond `st.error`/`st.warning`
+messages, which are no-ops when running outside Streamlit.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+import clients
+import hedging
+import json_repair
+import rate_limit
+import tracing
+from author_profiles import AuthorProfileStore, split_authors
+from context_cache import ContextCacheRegistry
+from dedup import IdentityIndex, normalize_email, normalize_name, normalize_orcid
+from facets import DEFAULT_LATAM_BOOST, ReviewerFacets, record_conflicts, split_affiliations
+from gemini_cache import ResponseCache, make_key
+from json_stream import ArrayItemStream
+from prompt_format import DEFAULT_TOKEN_BUDGET, estimate_tokens, restore_full_records, serialize_reviewers
+from retrieval import ReviewerIndex
+from storage import SheetsBackend, SQLiteBackend
+from write_queue import WriteQueue
+
+def get_secret(key, default=""):
+    """Reads a setting from the environment or `.streamlit/secrets.toml` (in that order)."""
+    if key in os.environ:
+        return os.environ[key]
+    try:
+        return st.secrets.get(key, default)
+    except FileNotFoundError: # No secrets.toml, e.g. headless runs configured by environment
+        return default
+
+# Per-model limits shared by every session in this process
+rate_limit.configure(
+    rate_per_min=float(get_secret("GEMINI_RPM", rate_limit.DEFAULT_RATE_PER_MIN)),
+    max_concurrency=int(get_secret("GEMINI_MAX_CONCURRENCY", rate_limit.DEFAULT_MAX_CONCURRENCY)),
+    max_queue=int(get_secret("GEMINI_MAX_QUEUE", rate_limit.DEFAULT_MAX_QUEUE)),
+)
+# Per-stage spans go to a JSONL log (empty TRACE_LOG_PATH: memory only, for the admin panel)
+tracing.configure(get_secret("TRACE_LOG_PATH", ".cache/traces.jsonl"))
+
+def is_valid_json(text):
+    """True if `text` parses as JSON once code fences are stripped (only those responses are cached)."""
+    try:
+        json.loads(text.replace("```json", "").replace("```", ""))
+        return True
+    except ValueError:
+        return False
+
+def parse_json_response(text):
+    """
+    Parses a Gemini JSON answer into a `json_repair.ParseResult`, repairing
+    fences, trailing text and truncation if needed; traced as its own stage.
+    """
+    with tracing.span("gemini.parse", response_chars=len(text)) as sp:
+        result = json_repair.parse(text)
+        sp.update(repaired=result.repaired, truncated=result.truncated)
+        return result
+
+# --- CONNECTIVITY FUNCTIONS ---
+
+def load_sheet_credentials():
+    # Load credentials from secrets or local file
+    creds_json = get_secret("GOOGLE_SHEETS_CREDENTIALS")
+    if creds_json:
+        return json.loads(creds_json)
+    # Fallback for local dev
+    with open("credentials.json") as f:
+        return json.load(f)
+
+def get_google_sheet_client():
+    """Shared gspread client; credentials are parsed and authorized only once per process."""
+    try:
+        with tracing.span("sheets.client"):
+            return clients.get_sheets_client(load_sheet_credentials)
+    except Exception as e:
+        st.error(f"Error connecting to Google Sheets: {e}")
+        st.code(traceback.format_exc())
+        return None
+
+GEMINI_API_BASE = get_secret("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+_context_cache = None
+_hedge_policy = None
+
+def get_context_cache():
+    """Process-wide Gemini context-cache registry, or None when GEMINI_CONTEXT_CACHE is off."""
+    global _context_cache
+    if str(get_secret("GEMINI_CONTEXT_CACHE", "1")).lower() in ("0", "false", "no", "off"):
+        return None
+    with _response_cache_lock:
+        if _context_cache is None:
+            _context_cache = ContextCacheRegistry(GEMINI_API_BASE, ttl=int(get_secret("GEMINI_CONTEXT_CACHE_TTL", 3600)))
+        return _context_cache
+
+def get_response_cache():
+    """
+    Process-wide disk cache of Gemini responses, or None when disabled
+    (GEMINI_CACHE_PATH set to an empty string) or unavailable.
+    """
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            path = get_secret("GEMINI_CACHE_PATH", ".cache/gemini_responses.sqlite3")
+            try:
+                _response_cache = ResponseCache(
+                    path,
+                    ttl=float(get_secret("GEMINI_CACHE_TTL", 7 * 24 * 3600)),
+                    max_entries=int(get_secret("GEMINI_CACHE_MAX_ENTRIES", 5000)),
+                    max_bytes=int(float(get_secret("GEMINI_CACHE_MAX_MB", 200)) * 1024 * 1024),
+                ) if path else False
+            except Exception as e:
+                print(f"Response cache disabled: {e}")
+                _response_cache = False # Don't retry on every call
+        return _response_cache or None
+
+def get_hedge_policy():
+    """
+    Process-wide hedging policy (see `hedging`), or None unless
+    GEMINI_FALLBACK_MODEL names a fallback model: every hedge is a second
+    paid call, so it is opt-in.
+    GEMINI_HEDGE_DEADLINES maps model -> seconds (a secrets table or a JSON
+    string); other models use GEMINI_HEDGE_AFTER.
+    """
+    global _hedge_policy
+    with _response_cache_lock:
+        if _hedge_policy is None:
+            fallback = get_secret("GEMINI_FALLBACK_MODEL", "")
+            try:
+                deadlines = get_secret("GEMINI_HEDGE_DEADLINES", {})
+                _hedge_policy = hedging.HedgePolicy(
+                    fallback,
+                    deadlines=json.loads(deadlines) if isinstance(deadlines, str) else deadlines,
+                    default_deadline=float(get_secret("GEMINI_HEDGE_AFTER", hedging.DEFAULT_DEADLINE)),
+                    min_delay=float(get_secret("GEMINI_HEDGE_MIN_DELAY", hedging.DEFAULT_MIN_DELAY)),
+                ) if fallback else False
+            except Exception as e:
+                print(f"Hedged requests disabled: {e}")
+                _hedge_policy = False
+        return _hedge_policy or None
+
+def read_stream_text(response, on_chunk, usage=None):
+    """
+    Reads a streamGenerateContent SSE response, passing each text piece to `on_chunk`.
+    Returns the full text; the last `usageMetadata` and `finishReason` seen are copied into `usage`.
+    """
+    pieces = []
+    response.encoding = "utf-8" # SSE is always UTF-8; without a charset requests would assume Latin-1
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        event = json.loads(line[len("data:"):])
+        if usage is not None and event.get("usageMetadata"):
+            usage.update(event["usageMetadata"])
+        for candidate in event.get("candidates", [])[:1]:
+            if usage is not None and candidate.get("finishReason"):
+                usage["finishReason"] = candidate["finishReason"]
+            for part in candidate.get("content", {}).get("parts", []):
+                if part.get("text"):
+                    pieces.append(part["text"])
+                    on_chunk(part["text"])
+    return "".join(pieces)
+
+def call_gemini_api(api_key, system_instruction, user_prompt, model_name="gemini-1.5-flash", deadline=clients.GEMINI_DEFAULT_DEADLINE, on_chunk=None, cacheable_prefix=None, usage=None, response_schema=None, continue_from=None, cancel=None):
+    """
+    Calls generateContent through the shared keep-alive session.
+    `deadline` bounds the whole call in seconds, retries and waits included.
+    Valid JSON responses are served from / stored in the disk cache, and
+    requests go through the per-model rate limiter shared by all sessions.
+    With `on_chunk`, the response is streamed (streamGenerateContent) and each
+    text piece is passed to it as it arrives; the full text is still returned.
+    `cacheable_prefix` is stable text placed between the system instruction and
+    `user_prompt`; together with the instruction it is sent once as a Gemini
+    cachedContents entry and referenced afterwards ('' caches the instruction alone). `usage` receives the
+    response's usageMetadata (token counts) and finishReason; it stays empty
+    when the answer came from the disk cache.
+    `response_schema` constrains the JSON answer (Gemini responseSchema).
+    `continue_from` is a truncated earlier answer to the same prompt: the
+    model is asked to go on from where it stopped and only the rest is returned.
+    Once `cancel` (a threading.Event) is set, the call gives up quietly before
+    its next attempt, retry or stream chunk and returns None.
+    """
+    usage = {} if usage is None else usage
+    prompt_chars = len(system_instruction) + len(cacheable_prefix or "") + len(user_prompt) + len(continue_from or "")
+    with tracing.span("gemini.call", model=model_name, stream=bool(on_chunk), prompt_chars=prompt_chars, continuation=bool(continue_from)) as sp:
+        text = _call_gemini_api(api_key, system_instruction, user_prompt, model_name, deadline, on_chunk, cacheable_prefix, usage, sp, response_schema, continue_from, cancel)
+        sp.update(
+            ok=text is not None,
+            response_chars=len(text or ""),
+            prompt_tokens=usage.get("promptTokenCount"),
+            output_tokens=usage.get("candidatesTokenCount"),
+            cached_tokens=usage.get("cachedContentTokenCount"),
+            finish_reason=usage.get("finishReason"),
+        )
+        return text
+
+def json_generation_config(response_schema=None):
+    generation_config = {
+        "temperature": 0.2,
+        "response_mime_type": "application/json"
+    }
+    if response_schema:
+        generation_config["response_schema"] = response_schema
+    return generation_config
+
+def response_cache_key(model_name, system_instruction, user_prompt, response_schema=None):
+    """Disk-cache key of a JSON call made without a cacheable prefix, e.g. to store an answer obtained another way."""
+    return make_key(model_name, system_instruction, user_prompt, json_generation_config(response_schema))
+
+CONTINUE_PROMPT = "Tu respuesta anterior se cortó. Continúa el JSON exactamente desde el último carácter, sin repetir nada ni añadir texto fuera del JSON."
+
+def _call_gemini_api(api_key, system_instruction, user_prompt, model_name, deadline, on_chunk, cacheable_prefix, usage, trace, response_schema=None, continue_from=None, cancel=None):
+    """Body of `call_gemini_api`; retry/cache/wait figures are written into the `trace` span."""
+    max_retries = 3
+    max_throttles = 5
+    
+    # Construct payload with system instruction properly
+    if cacheable_prefix:
+        full_prompt = f"{system_instruction}\n\n{cacheable_prefix}\n\n{user_prompt}"
+    else:
+        full_prompt = f"{system_instruction}\n\n{user_prompt}"
+    generation_config = json_generation_config(response_schema)
+    if continue_from:
+        # The rest of a cut-off answer isn't a JSON document on its own
+        generation_config = {"temperature": 0.2}
+    
+    def contents(prompt):
+        turns = [{"role": "user", "parts": [{"text": prompt}]}]
+        if continue_from:
+            turns += [
+                {"role": "model", "parts": [{"text": continue_from}]},
+                {"role": "user", "parts": [{"text": CONTINUE_PROMPT}]},
+            ]
+        return turns
+    
+    cache = get_response_cache() if not continue_from else None
+    cache_key = make_key(model_name, system_instruction, (cacheable_prefix or "") + user_prompt, generation_config)
+    if cache:
+        try:
+            cached = cache.get(cache_key)
+            trace["cache"] = "hit" if cached is not None else "miss"
+            if cached is not None:
+                if on_chunk:
+                    on_chunk(cached)
+                return cached
+        except Exception as e:
+            print(f"Response cache read failed: {e}") # A broken cache must never block the call
+    
+    session = clients.get_gemini_session()
+    limiter = rate_limit.get_limiter(model_name)
+    expires_at = time.monotonic() + deadline
+    attempt = 0 # Failed attempts; 429s don't count, the limiter makes us wait instead
+    throttles = 0
+    streamed = [] # Pieces already handed to on_chunk; a retry would duplicate them
+    context_cache = get_context_cache() if cacheable_prefix is not None else None
+    cached_content = None
+    
+    while True:
+        try:
+            hedging.check(cancel)
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Deadline of {deadline}s exceeded")
+            
+            if on_chunk:
+                url = f"{GEMINI_API_BASE}/models/{model_name}:streamGenerateContent?alt=sse"
+            else:
+                url = f"{GEMINI_API_BASE}/models/{model_name}:generateContent"
+            headers = {"x-goog-api-key": api_key}
+            
+            if context_cache:
+                cached_content = context_cache.get_or_create(session, api_key, model_name, system_instruction, cacheable_prefix)
+                trace["context_cache"] = bool(cached_content)
+            if cached_content:
+                # Instruction (+ reviewer database) already live server-side; send only the rest
+                data = {
+                    "cachedContent": cached_content,
+                    "contents": contents(user_prompt),
+                    "generationConfig": generation_config
+                }
+            else:
+                data = {
+                    "contents": contents(full_prompt),
+                    "generationConfig": generation_config
+                }
+            
+            # Wait for a permit shared with every other session using this model
+            expected_wait = limiter.estimate_wait()
+            if expected_wait >= 1:
+                st.info(f"⏳ En cola para {model_name}: espera estimada ~{expected_wait:.0f}s ({limiter.waiting} solicitudes antes).")
+            with limiter.permit(timeout=remaining) as waited:
+                trace["wait_s"] = round(trace.get("wait_s", 0) + waited, 3)
+                response = session.post(url, headers=headers, json=data, stream=bool(on_chunk), timeout=(clients.GEMINI_CONNECT_TIMEOUT, max(1, expires_at - time.monotonic())))
+                if on_chunk:
+                    # Consume the stream while still holding the permit; an error response
+                    # is closed unread too (its status and headers stay available below)
+                    with response:
+                        if response.status_code == 200:
+                            text = read_stream_text(response, lambda piece: (hedging.check(cancel), streamed.append(piece), on_chunk(piece)), usage)
+            
+            # Handle Rate Limits (429) specifically: pause the model for everyone and queue again
+            if response.status_code == 429:
+                throttles += 1
+                trace["throttles"] = throttles
+                pause = limiter.throttled(rate_limit.parse_retry_after(response))
+                if throttles > max_throttles or pause >= expires_at - time.monotonic():
+                    raise TimeoutError(f"Rate limited (429) {throttles} times within the {deadline}s deadline")
+                st.warning(f"⚠️ Tráfico alto (429). Reintentando en ~{pause:.0f}s... ({throttles}/{max_throttles})")
+                continue # The next permit is only granted after the pause
+            
+            if cached_content and response.status_code in (400, 403, 404):
+                # Cached prefix expired or was deleted server-side: drop it and send inline
+                context_cache.forget(cached_content)
+                context_cache = cached_content = None
+                continue
+                
+            response.raise_for_status()
+            limiter.succeeded()
+            
+            if not on_chunk:
+                result = response.json()
+                if usage is not None:
+                    usage.update(result.get("usageMetadata", {}))
+                    usage["finishReason"] = result['candidates'][0].get('finishReason')
+                # Extract text
+                text = result['candidates'][0]['content']['parts'][0]['text']
+            if cache and is_valid_json(text):
+                try:
+                    cache.put(cache_key, model_name, text)
+                except Exception as e:
+                    print(f"Response cache write failed: {e}")
+            return text
+            
+        except hedging.Cancelled:
+            trace["cancelled"] = True
+            return None
+        except Exception as e:
+            attempt += 1
+            trace["retries"] = attempt
+            if attempt >= max_retries or streamed or isinstance(e, (TimeoutError, rate_limit.QueueFullError)): # Last attempt, partial stream, out of time or queue full
+                st.error(f"🔴 GEMINI FAIL (Final): {e}")
+                return None
+            else:
+                # Network or server error we want to retry
+                st.warning(f"⚠️ API Error (Retrying): {e}")
+                pause = min(rate_limit.backoff_delay(attempt), max(0, expires_at - time.monotonic()))
+                if cancel is not None:
+                    cancel.wait(pause) # Wakes up as soon as the hedged request wins
+                else:
+                    time.sleep(pause)
+                continue
+
+def generate_json(api_key, system_instruction, user_prompt, model_name, response_schema, on_chunk=None, cacheable_prefix=None):
+    """
+    Asks Gemini for a JSON answer constrained by `response_schema` and returns
+    it parsed and checked against the schema, or None if the call failed.
+    Malformed JSON is repaired and incomplete records are dropped instead of
+    throwing the paid answer away; only an answer cut off by the output limit
+    (finishReason MAX_TOKENS) gets a continuation request. Raises ValueError
+    when nothing usable is left. The `gemini.json` span records how many paid
+    calls the result took.
+    If `model_name` is slower than its hedge delay (or fails), the same request
+    goes to the fallback model and the first schema-valid answer wins (see
+    `get_hedge_policy`); only the selected model's answer is streamed to `on_chunk`.
+    """
+    policy = get_hedge_policy()
+    if policy is None or policy.fallback_for(model_name) is None:
+        return _generate_json(api_key, system_instruction, user_prompt, model_name, response_schema, on_chunk, cacheable_prefix)
+
+    ctx = get_script_run_ctx()
+    def leg(leg_model, cancel):
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx) # Lets st.* messages reach this session
+        leg_chunks = on_chunk if leg_model == model_name else None # Two streams would interleave
+        return _generate_json(api_key, system_instruction, user_prompt, leg_model, response_schema, leg_chunks, cacheable_prefix, cancel)
+
+    with tracing.span("gemini.hedge", model=model_name, fallback=policy.fallback, hedge_after_s=round(policy.delay(model_name), 1)) as sp:
+        value, winner, hedged = policy.run(model_name, leg)
+        sp.update(ok=value is not None, hedged=hedged, winner=winner)
+        return value
+
+def _generate_json(api_key, system_instruction, user_prompt, model_name, response_schema, on_chunk=None, cacheable_prefix=None, cancel=None):
+    """Body of `generate_json` for a single model; a cancelled call returns None."""
+    with tracing.span("gemini.json", model=model_name) as sp:
+        usage = {}
+        text = call_gemini_api(api_key, system_instruction, user_prompt, model_name, on_chunk=on_chunk, cacheable_prefix=cacheable_prefix, usage=usage, response_schema=response_schema, cancel=cancel)
+        sp["paid_calls"] = int(bool(usage)) # Disk-cache hits leave `usage` empty
+        if text is None:
+            sp["ok"] = False
+            return None
+        try:
+            result = parse_json_response(text)
+        except ValueError:
+            result = None
+        if (result is None or result.truncated) and usage.get("finishReason") == "MAX_TOKENS":
+            usage = {}
+            rest = call_gemini_api(api_key, system_instruction, user_prompt, model_name, on_chunk=on_chunk, cacheable_prefix=cacheable_prefix, usage=usage, continue_from=text, cancel=cancel)
+            sp["paid_calls"] += int(bool(usage))
+            sp["continued"] = True
+            if rest:
+                try:
+                    result = parse_json_response(text + rest)
+                except ValueError:
+                    pass # Keep whatever the first part salvaged
+        if result is None:
+            sp["ok"] = False
+            raise ValueError(f"Unparseable JSON answer ({len(text)} chars)")
+        value, dropped = json_repair.conform(result.value, response_schema)
+        sp.update(repaired=result.repaired, truncated=result.truncated, dropped_items=dropped + result.dropped)
+        return value
+
+# --- DATA HANDLING ---
+
+_storage = None
+_sheets_backend = None
+_storage_lock = threading.Lock()
+
+def get_sheets_backend():
+    """Process-wide Google Sheets backend (also the sync target when the SQLite backend is active)."""
+    global _sheets_backend
+    with _storage_lock:
+        if _sheets_backend is None:
+            _sheets_backend = SheetsBackend(
+                get_google_sheet_client,
+                snapshot_dir=get_secret("REVIEWER_SNAPSHOT_DIR", ".cache"),
+                probe_interval=int(get_secret("REVIEWER_SYNC_INTERVAL", 60)),
+            )
+        return _sheets_backend
+
+def get_storage():
+    """
+    Backend the app reads from: Google Sheets (default) or a local SQLite copy
+    (STORAGE_BACKEND = "sqlite"), which imports from and syncs back to Sheets
+    unless STORAGE_SYNC_SHEETS is off.
+    """
+    global _storage
+    if get_secret("STORAGE_BACKEND", "sheets").lower() != "sqlite":
+        return get_sheets_backend()
+    sync_sheets = str(get_secret("STORAGE_SYNC_SHEETS", "1")).lower() not in ("0", "false", "off", "")
+    source = get_sheets_backend() if sync_sheets else None
+    with _storage_lock:
+        if _storage is None:
+            _storage = SQLiteBackend(get_secret("STORAGE_SQLITE_PATH", ".cache/storage.sqlite3"), source=source)
+        return _storage
+
+def load_evaluadores(sheet_id):
+    """Reviewer table from the storage backend (for Sheets, the local mirror synced by delta)."""
+    storage = get_storage()
+    try:
+        with tracing.span("storage.evaluadores", backend=storage.name) as sp:
+            df = storage.load_reviewers(sheet_id)
+            sp["rows"] = len(df)
+            return df
+    except Exception as e:
+        if isinstance(storage, SheetsBackend):
+            storage.reset(sheet_id) # Re-resolve handles on the next attempt
+        st.error(f"Error loading Evaluadores: {e}")
+        return None
+
+@st.cache_resource(max_entries=4)
+def _build_reviewer_index(sheet_id, version, _df):
+    index = ReviewerIndex(_df)
+    with tracing.span("search.facets", rows=len(index)):
+        index.facets = ReviewerFacets(index.df) # Country/region/institution/methodology, same row order
+    return index
+
+def get_reviewer_index(sheet_id):
+    """BM25 index over the Evaluadores sheet, rebuilt only when the stored rows change."""
+    df = load_evaluadores(sheet_id)
+    if df is None: return None
+    return _build_reviewer_index(sheet_id, get_storage().reviewers_version(sheet_id), df)
+
+@st.cache_resource(max_entries=4)
+def _build_identity_index(sheet_id, version, _df):
+    return IdentityIndex(_df)
+
+def get_identity_index(sheet_id):
+    """Name/e-mail/ORCID index of registered reviewers, rebuilt only when the stored rows change."""
+    df = load_evaluadores(sheet_id)
+    if df is None: return None
+    return _build_identity_index(sheet_id, get_storage().reviewers_version(sheet_id), df)
+
+def match_known_reviewers(sheet_id, people):
+    """
+    IdentityMatch of an existing row (or None) for each (given, surnames,
+    e-mail, ORCID) tuple: through the SQLite identity indexes when that backend
+    is active (queued rows are already stored there), else through the
+    in-memory IdentityIndex of the loaded sheet plus the queued rows.
+    """
+    storage = get_storage()
+    if isinstance(storage, SQLiteBackend):
+        try:
+            with tracing.span("storage.identity", people=len(people)):
+                return storage.match_reviewers(sheet_id, people)
+        except Exception as e:
+            print(f"Identity lookup in SQLite failed: {e}")
+    identity_index = get_identity_index(sheet_id)
+    if identity_index is None: return [None] * len(people)
+    matches = [identity_index.match(*person) for person in people]
+    queued_index = get_queued_identity_index(sheet_id)
+    if queued_index is not None:
+        matches = [match or queued_index.match(*person) for match, person in zip(matches, people)]
+    return matches
+
+def get_queued_identity_index(sheet_id):
+    """
+    IdentityIndex of the rows still waiting in the write queue (labels
+    ('cola', position)), or None if there are none. The sheet doesn't have
+    them yet, so without this a person added twice before the write lands
+    would pass the known-reviewer check.
+    """
+    write_queue = get_write_queue()
+    df = load_evaluadores(sheet_id) if write_queue else None
+    if df is None: return None
+    queued = [row for row in write_queue.unsent_rows(sheet_id) if len(row) == len(df.columns)]
+    if not queued: return None
+    index = IdentityIndex(df.iloc[0:0])
+    for position, row in enumerate(queued):
+        index.add(("cola", position), *reviewer_person(dict(zip(df.columns, row))))
+    return index
+
+def flag_known_reviewers(sheet_id, suggestions):
+    """For each suggested reviewer dict, the IdentityMatch of an existing or queued row (or None)."""
+    people = [
+        (s.get("Nombre", ""), s.get("Apellidos", ""), s.get("Correo", ""), s.get("OrcId", "")) if isinstance(s, dict) else None
+        for s in suggestions
+    ]
+    found = iter(match_known_reviewers(sheet_id, [p for p in people if p is not None]))
+    return [next(found) if person is not None else None for person in people]
+
+def reviewer_person(row):
+    """(given, surnames, e-mail, ORCID) of a reviewer row keyed by sheet column (Series or dict)."""
+    return row.get("Nombre", ""), row.get("Apellidos", ""), row.get("Correo electrónico", ""), row.get("OrcId", "")
+
+def drop_known_reviewers(sheet_id, new_rows_df):
+    """
+    Removes rows (sheet columns) whose person is already registered (or
+    queued, see `match_known_reviewers`) or repeated within `new_rows_df`.
+    Returns (rows to write, list of skipped names).
+    """
+    people = [reviewer_person(row) for _, row in new_rows_df.iterrows()]
+    known = match_known_reviewers(sheet_id, people)
+    batch_index = IdentityIndex(new_rows_df.iloc[0:0])
+    keep, skipped = [], []
+    for label, person, match in zip(new_rows_df.index, people, known):
+        if match or batch_index.match(*person):
+            skipped.append(f"{person[0]} {person[1]}".strip())
+            continue
+        batch_index.add(label, *person)
+        keep.append(label)
+    return new_rows_df.loc[keep], skipped
+
+def fetch_article_details(sheet_id, article_id_query):
+    try:
+        storage = get_storage()
+        with tracing.span("storage.article", backend=storage.name) as sp:
+            row_data = storage.get_article(sheet_id, article_id_query)
+            sp["found"] = row_data is not None
+        
+        if row_data:
+            # Normalize keys to simple ones for the app
+            return {
+                "Titulo": row_data.get("Título", ""),
+                "Resumen": row_data.get("Resumen", ""),
+                "Palabras clave": row_data.get("Palabras clave", ""),
+                "Autores": row_data.get("Autores", ""),
+                "Link": row_data.get("Enlace archivo", row_data.get("Link", row_data.get("URL", "")))
+            }
+        return None
+    except LookupError as e:
+        st.error(str(e))
+        return None
+    except Exception as e:
+        st.error(f"Error fetching article: {repr(e)}")
+        st.code(traceback.format_exc())
+        return None
+
+STRING = {"type": "STRING"}
+
+AUTHOR_PROFILE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "recent_publications_list": {
+            "type": "ARRAY",
+            "items": {"type": "OBJECT", "properties": {"title": STRING, "year": STRING}, "required": ["title"]},
+        },
+        "role_and_institution": STRING,
+        "author_comment": STRING,
+    },
+    "required": ["recent_publications_list", "role_and_institution", "author_comment"],
+}
+
+ARTICLE_CHECK_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "is_previously_published": {"type": "BOOLEAN"},
+        "reason_publication": STRING,
+        "article_methodology": STRING,
+    },
+    "required": ["is_previously_published", "reason_publication", "article_methodology"],
+}
+
+AUTHOR_PROFILE_INSTRUCTION = """
+        Eres un asistente de integridad académica. Tu tarea es evaluar la solidez del PERFIL ACADÉMICO DE UN AUTOR.
+        
+        **Perfil del Autor (Checklist Detallado):**
+        *   **Scholar/ORCID:** NO busques enlaces. Solo evalúa si debería tenerlos.
+        *   **Publicaciones Recientes:** Enumera 2 publicaciones recientes (Título y Año).
+        *   **Afiliación y Cargo:** Identifica cargo y universidad.
+        
+        **Salida JSON**:
+        {
+            "recent_publications_list": [
+                {"title": "Pub 1", "year": "2023"},
+                {"title": "Pub 2", "year": "2022"}
+            ],
+            "role_and_institution": "Cargo e Institución",
+            "author_comment": "Evaluación breve del perfil."
+        }
+        """
+
+ARTICLE_CHECK_INSTRUCTION = """
+        Eres un asistente de integridad académica. Tu tarea es analizar los metadatos de un artículo para detectar posibles problemas.
+        
+        **Tareas de Verificación:**
+        1.  **Metodología del Artículo:** Determina si es Cuantitativa, Cualitativa o Mixta basándote en el resumen.
+        2.  **Publicación Previa (Solo Revistas):** Analiza si el trabajo ya ha sido publicado en una **REVISTA ACADÉMICA (Journal)**.
+            *   **IMPORTANTE:** NO consideres como "publicación previa" a: Tesis, Repositorios Institucionales, Working Papers o Preprints. Esto es normal.
+            *   **ALERTA:** Solo marca TRUE si detectas que ya salió en otra revista. Si es una tesis o repositorio, marca FALSE.
+        
+        **Salida JSON**:
+        {
+            "is_previously_published": boolean,
+            "reason_publication": "Explicación (ej. 'Coincide con artículo en Revista X' o 'Es tesis/repositorio, no cuenta')",
+            "article_methodology": "Cuantitativo/Cualitativo/Mixto (Breve justificación)"
+        }
+        """
+
+_author_profiles = None
+_author_profiles_lock = threading.Lock()
+
+def get_author_profiles():
+    """
+    Process-wide author-profile store, or None when disabled (AUTHOR_PROFILE_PATH
+    set to an empty string) or unavailable. AUTHOR_PROFILE_TTL_DAYS sets the TTL.
+    """
+    global _author_profiles
+    with _author_profiles_lock:
+        if _author_profiles is None:
+            path = get_secret("AUTHOR_PROFILE_PATH", ".cache/author_profiles.sqlite3")
+            try:
+                ttl = float(get_secret("AUTHOR_PROFILE_TTL_DAYS", 90)) * 24 * 3600
+                _author_profiles = AuthorProfileStore(path, ttl=ttl) if path else False
+            except Exception as e:
+                print(f"Author profile store disabled: {e}")
+                _author_profiles = False
+        return _author_profiles or None
+
+def fetch_author_profile(api_key, author_name, model_name):
+    """One author's profile from Gemini (not stored). None on failure."""
+    try:
+        with tracing.span("integrity.author"):
+            return generate_json(api_key, AUTHOR_PROFILE_INSTRUCTION, f'Analizar Autor: "{author_name}"', model_name, AUTHOR_PROFILE_SCHEMA)
+    except Exception as e:
+        print(f"Author profile failed for {author_name}: {e}")
+        return None
+
+def get_author_profile(api_key, author_name, model_name):
+    """Stored profile of this author (any model), fetched from Gemini only when missing or expired."""
+    store = get_author_profiles()
+    if store is None:
+        return fetch_author_profile(api_key, author_name, model_name)
+    try:
+        return store.get_or_fetch(author_name, model_name, lambda name: fetch_author_profile(api_key, name, model_name))
+    except Exception as e:
+        print(f"Author profile store failed: {e}") # Fall back to asking Gemini directly
+        return fetch_author_profile(api_key, author_name, model_name)
+
+def article_prompt(title, abstract, keywords):
+    return f"""
+        Título Artículo: "{title}"
+        Resumen: "{abstract}"
+        Palabras Clave: "{keywords}"
+        """
+
+def check_article(api_key, title, abstract, keywords, model_name):
+    """Per-article part of the integrity check (methodology, prior publication). None on failure."""
+    user_prompt = article_prompt(title, abstract, keywords)
+    try:
+        with tracing.span("integrity.article"):
+            return generate_json(api_key, ARTICLE_CHECK_INSTRUCTION, user_prompt, model_name, ARTICLE_CHECK_SCHEMA)
+    except Exception as e:
+        print(f"Article check failed: {e}")
+        return None
+
+# --- BATCHED INTEGRITY CHECKS ---
+
+BATCH_NOTE = """
+        **MODO LOTE:** Recibirás VARIOS {what}, cada uno precedido por su ID entre corchetes ([{prefix}1], [{prefix}2], ...).
+        Analiza cada uno por separado y devuelve {{"{key}": [{{"id": "{prefix}1", ...}}, ...]}}: exactamente un objeto por ID,
+        con los mismos campos de la salida anterior más "id".
+        """
+
+def _batch_schema(key, item_schema):
+    item = dict(item_schema, properties={"id": STRING, **item_schema["properties"]}, required=["id", *item_schema["required"]])
+    return {"type": "OBJECT", "properties": {key: {"type": "ARRAY", "items": item}}, "required": [key]}
+
+ARTICLE_BATCH_INSTRUCTION = ARTICLE_CHECK_INSTRUCTION + BATCH_NOTE.format(what="ARTÍCULOS", prefix="A", key="results")
+ARTICLE_BATCH_SCHEMA = _batch_schema("results", ARTICLE_CHECK_SCHEMA)
+AUTHOR_BATCH_INSTRUCTION = AUTHOR_PROFILE_INSTRUCTION + BATCH_NOTE.format(what="AUTORES", prefix="P", key="profiles")
+AUTHOR_BATCH_SCHEMA = _batch_schema("profiles", AUTHOR_PROFILE_SCHEMA)
+DEFAULT_BATCH_TOKENS = 6000 # Input tokens of item text per batched request
+DEFAULT_BATCH_ITEMS = 10 # Bounds the answer size too
+
+def pack_batches(texts, token_budget, max_items):
+    """Greedy consecutive groups of item indexes whose estimated tokens fit the budget (an oversized item goes alone)."""
+    batches, current, used = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (used + tokens > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def _run_batches(api_key, instruction, schema, key, prefix, texts, model_name, token_budget, max_items):
+    """Per-item results (dicts without 'id', None where the batch failed or skipped the item)."""
+    results = [None] * len(texts)
+    for batch in pack_batches(texts, token_budget, max_items):
+        prompt = "\n\n".join(f"[{prefix}{n}]\n{texts[i].strip()}" for n, i in enumerate(batch, start=1))
+        with tracing.span("integrity.batch", kind=key, items=len(batch)) as sp:
+            try:
+                answer = generate_json(api_key, instruction, prompt, model_name, schema)
+            except Exception as e:
+                print(f"Batched {key} request failed: {e}")
+                answer = None
+            by_id = {str(item.pop("id")).strip(): item for item in (answer or {}).get(key, [])}
+            for n, i in enumerate(batch, start=1):
+                results[i] = by_id.get(f"{prefix}{n}")
+            sp["answered"] = sum(results[i] is not None for i in batch)
+    return results
+
+def prefetch_integrity_checks(api_key, articles, model_name, token_budget=None, max_items=None):
+    """
+    Runs the integrity stages for many articles ((author, title, abstract,
+    keywords) tuples) in a few batched requests instead of one per article
+    and author, then stores each result where `verify_article_integrity`
+    looks first: article checks in the response disk cache under the key of
+    the single call, profiles in the author-profile store. Anything a batch
+    doesn't answer is left out, so `verify_article_integrity` makes its usual
+    single call for it. Returns {'articles': n, 'authors': n, 'batched_articles': n, 'batched_authors': n}.
+    """
+    token_budget = token_budget or int(get_secret("INTEGRITY_BATCH_TOKENS", DEFAULT_BATCH_TOKENS))
+    max_items = max_items or int(get_secret("INTEGRITY_BATCH_ITEMS", DEFAULT_BATCH_ITEMS))
+    summary = {"articles": 0, "authors": 0, "batched_articles": 0, "batched_authors": 0}
+
+    store = get_author_profiles()
+    if store is not None:
+        authors = list({normalize_name(name): name for author_name, *_ in articles for name in split_authors(author_name)}.values())
+        missing = [name for name in authors if store.get(name) is None]
+        summary["authors"] = len(missing)
+        profiles = _run_batches(api_key, AUTHOR_BATCH_INSTRUCTION, AUTHOR_BATCH_SCHEMA, "profiles", "P",
+                                [f'Analizar Autor: "{name}"' for name in missing], model_name, token_budget, max_items)
+        for name, profile in zip(missing, profiles):
+            if profile is not None:
+                store.put(name, model_name, profile)
+                summary["batched_authors"] += 1
+
+    cache = get_response_cache()
+    if cache is not None: # Without the disk cache there is nowhere to leave article results for later
+        prompts = list(dict.fromkeys(article_prompt(title, abstract, keywords) for _, title, abstract, keywords in articles))
+        keys = [response_cache_key(model_name, ARTICLE_CHECK_INSTRUCTION, prompt, ARTICLE_CHECK_SCHEMA) for prompt in prompts]
+        missing = [(prompt, key) for prompt, key in zip(prompts, keys) if cache.get(key) is None]
+        summary["articles"] = len(missing)
+        checks = _run_batches(api_key, ARTICLE_BATCH_INSTRUCTION, ARTICLE_BATCH_SCHEMA, "results", "A",
+                              [prompt for prompt, _ in missing], model_name, token_budget, max_items)
+        for (prompt, key), check in zip(missing, checks):
+            if check is not None:
+                cache.put(key, model_name, json.dumps(check, ensure_ascii=False))
+                summary["batched_articles"] += 1
+    return summary
+
+@st.cache_data(ttl=3600)
+def verify_article_integrity(api_key, author_name, title, abstract, keywords, model_name):
+    """
+    Uses Gemini to verify:
+    1. The academic profile of each author (shared across articles, see `get_author_profile`).
+    2. If the article appears to be previously published, and its methodology.
+    The `Autores` string is split into authors and each profile is looked up
+    once, side by side with the article check. The result keeps the original
+    shape, with the first author's profile as `author_checklist` /
+    `author_comment`, plus `author_profiles` with every author's.
+    """
+    authors = split_authors(author_name) or [author_name]
+    with ThreadPoolExecutor(max_workers=min(4, len(authors) + 1)) as pool:
+        article_future = pool.submit(check_article, api_key, title, abstract, keywords, model_name)
+        profiles = list(pool.map(lambda name: get_author_profile(api_key, name, model_name), authors))
+        article = article_future.result()
+    if article is None:
+        return None
+    profiles = [dict(profile or {}, name=name) for name, profile in zip(authors, profiles)]
+    lead = profiles[0]
+    return {
+        "author_checklist": {
+            "recent_publications_list": lead.get("recent_publications_list", []),
+            "role_and_institution": lead.get("role_and_institution", "No identificado"),
+        },
+        "author_comment": lead.get("author_comment", "No disponible"),
+        "author_profiles": profiles,
+        **article,
+    }
+
+REVIEWER_SYSTEM_INSTRUCTION = """
+        Eres un Editor Académico Experto. Tu objetivo es identificar a los mejores revisores pares para un artículo científico.
+        
+        **IMPORTANTE**: Responde SIEMPRE en ESPAÑOL.
+        
+        **Proceso (Chain of Thought):**
+        1.  **Analizar**:
+            *   Extrae los temas centrales.
+            *   **DETERMINA LA METODOLOGÍA**: ¿Es Cuantitativa, Cualitativa o Mixta? (Basado en el Abstract/Keywords).
+            *   Identifica el enfoque regional.
+        2.  **Match Interno**: Busca en 'REGISTERED REVIEWERS' candidatos.
+            *   La lista ya viene preseleccionada: sin conflictos de interés, con metodología compatible y, si se pide, con expertos de LatAm primero. La columna 'Metodologia' es la inferida de sus temas (vacía si no se pudo inferir).
+            *   **Filtro de Metodología**: Prioriza revisores que manejen la metodología detectada.
+            *   Explica en ESPAÑOL por qué encajan (Tema + Metodología).
+            *   Incluye el "ID" de la fila (R1, R2, ...) de cada candidato interno.
+        3.  **Búsqueda Externa Simulada**: Sugiere 3 NUEVOS revisores COMPLETOS.
+            *   **REGLA DE ORO (COMPLETITUD)**: Solo sugiere candidatos con DATOS COMPLETOS (Nombre, Email, Afiliación, País).
+            *   **EMAIL**: Debe ser institucional y COINCIDIR con la afiliación (ej. @unam.mx si es de UNAM).
+            *   **FILTRO**: Si falta el correo o no coincide, DESCARTA al candidato y busca otro.
+            *   **PROHIBIDO**: No devuelvas "Search required" ni campos vacíos.
+            *   **Expertise**: Debe encajar con el tema y la metodología.
+        
+        **Formato de Salida (JSON)**:
+        {
+            "internal_matches": [
+                {"ID": "R...", "Nombre": "...", "Apellidos": "...", "Institucion": "...", "Temas": "...", "Methodology": "Cuanti/Cuali/Mixto", "Reason": "..."}
+            ],
+            "external_suggestions": [
+                 {"Nombre": "...", "Apellidos": "...", "Correo": "user@institution.edu", "Afiliación": "Institution Name", "País": "...", "Scholar": "", "OrcId": "", "Temas": "...", "Methodology": "Cuanti/Cuali/Mixto", "Reason": "..."}
+            ]
+        }
+        """
+
+REVIEWER_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "internal_matches": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {key: STRING for key in ("ID", "Nombre", "Apellidos", "Institucion", "Temas", "Methodology", "Reason")},
+                "required": ["Nombre"],
+            },
+        },
+        "external_suggestions": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {key: STRING for key in ("Nombre", "Apellidos", "Correo", "Afiliación", "País", "Scholar", "OrcId", "Temas", "Methodology", "Reason")},
+                "required": ["Nombre", "Apellidos", "Correo", "Afiliación", "País"],
+            },
+        },
+    },
+    "required": ["internal_matches", "external_suggestions"],
+}
+
+def build_reviewer_prompt(target_article_context, prioritize_latam, evaluadores_str, whole_database=False):
+    """
+    Returns (cacheable_prefix, user_prompt). With `whole_database` the
+    reviewer database goes first as a stable prefix that Gemini can cache and
+    only the article context varies; a per-article shortlist stays in
+    `user_prompt` and the prefix is '' (only the system instruction is cached).
+    """
+    if whole_database:
+        prefix = f"REGISTERED REVIEWERS DATABASE (Sample/Context):\n{evaluadores_str}"
+        return prefix, f'INPUT CONTEXT: "{target_article_context}"\nPRIORITIZE LATAM: {prioritize_latam}'
+    return "", f"""
+        INPUT CONTEXT: "{target_article_context}"
+        PRIORITIZE LATAM: {prioritize_latam}
+        
+        REGISTERED REVIEWERS DATABASE (Sample/Context):
+        {evaluadores_str}
+        """
+
+@st.cache_data(ttl=3600)
+def find_reviewers_with_gemini(api_key, fingerprint, context_digest, prioritize_latam, model_name, top_k, token_budget, whole_database, conflicts, _target_article_context, _evaluadores_str):
+    """
+    Cached function to find reviewers using Gemini.
+    Separating this ensures we don't re-run the expensive API call on every interaction.
+    The cache key is the dataset fingerprint, the article-context digest, the
+    authors' conflict-of-interest key and the search settings; the context and
+    the serialized reviewers (which they determine) are passed by reference, unhashed.
+    """
+    try:
+        prefix, user_prompt = build_reviewer_prompt(_target_article_context, prioritize_latam, _evaluadores_str, whole_database)
+        
+        return generate_json(api_key, REVIEWER_SYSTEM_INSTRUCTION, user_prompt, model_name, REVIEWER_RESPONSE_SCHEMA, cacheable_prefix=prefix)
+    except Exception as e:
+        st.error(f"Reviewer search failed: {e}")
+        return None
+
+def stream_reviewers_with_gemini(api_key, target_article_context, prioritize_latam, evaluadores_str, model_name, on_item, timing=None, whole_database=False):
+    """
+    Streaming variant of `find_reviewers_with_gemini`: calls `on_item(section, candidate)`
+    for each internal match / external suggestion as soon as its JSON object is complete.
+    If given, `timing` is filled with 'first_candidate_s' and 'total_s'.
+    """
+    timing = {} if timing is None else timing
+    started = time.monotonic()
+    parser = ArrayItemStream()
+    
+    def on_chunk(piece):
+        for section, item in parser.feed(piece):
+            if "first_candidate_s" not in timing:
+                timing["first_candidate_s"] = time.monotonic() - started
+            on_item(section, item)
+    
+    try:
+        prefix, user_prompt = build_reviewer_prompt(target_article_context, prioritize_latam, evaluadores_str, whole_database)
+        results = generate_json(api_key, REVIEWER_SYSTEM_INSTRUCTION, user_prompt, model_name, REVIEWER_RESPONSE_SCHEMA, on_chunk=on_chunk, cacheable_prefix=prefix)
+        timing["total_s"] = time.monotonic() - started
+        return results
+    except Exception as e:
+        st.error(f"Reviewer search failed: {e}")
+        return None
+
+def write_reviewer_rows(sheet_id, values):
+    """Appends rows to the Evaluadores sheet in one API call. Raises on failure (the write queue retries)."""
+    get_sheets_backend().append_reviewers(sheet_id, values)
+    if isinstance(get_storage(), SheetsBackend):
+        _reviewers_changed()
+
+def _reviewers_changed():
+    context_cache = get_context_cache()
+    if context_cache:
+        context_cache.invalidate_all(clients.get_gemini_session()) # Cached prompts hold the old database
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+def get_write_queue():
+    """
+    Process-wide write-behind queue for Evaluadores inserts, or None when
+    disabled (SHEETS_WRITE_QUEUE_PATH set to an empty string) or unavailable.
+    """
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None:
+            path = get_secret("SHEETS_WRITE_QUEUE_PATH", ".cache/write_queue.sqlite3")
+            try:
+                _write_queue = WriteQueue(path, write_reviewer_rows) if path else False
+                if _write_queue:
+                    _write_queue.start()
+            except Exception as e:
+                print(f"Write queue disabled: {e}")
+                _write_queue = False
+        return _write_queue or None
+
+def add_reviewers(sheet_id, new_rows_df):
+    """
+    Stores new reviewer rows (sheet column order). Returns (rows, queued) where
+    `queued` means the Sheets write happens in the background, or None on error.
+    * Sheets backend: queued in the write-behind queue, or appended right away without one.
+    * SQLite backend: inserted locally right away; the copy to Sheets (if syncing) is queued.
+    """
+    values = new_rows_df.values.tolist()
+    # A person queued twice (same e-mail or ORCID) is written once
+    identities = [
+        (f"correo:{normalize_email(email)}" if normalize_email(email) else "", f"orcid:{normalize_orcid(orcid)}" if normalize_orcid(orcid) else "")
+        for _, _, email, orcid in (reviewer_person(row) for _, row in new_rows_df.iterrows())
+    ]
+    storage = get_storage()
+    write_queue = get_write_queue()
+    try:
+        if isinstance(storage, SheetsBackend):
+            if write_queue:
+                return write_queue.enqueue(sheet_id, values, identities), True
+            write_reviewer_rows(sheet_id, values)
+            return len(values), False
+
+        storage.append_reviewers(sheet_id, values)
+        _reviewers_changed()
+        if storage.source is not None:
+            if write_queue:
+                write_queue.enqueue(sheet_id, values, identities)
+            else:
+                try:
+                    write_reviewer_rows(sheet_id, values)
+                except Exception as e:
+                    st.warning(f"Guardado localmente, pero no se pudo copiar a Google Sheets: {e}")
+        return len(values), False
+    except Exception as e:
+        st.error(f"Error adding reviewers: {e}")
+        return None
+
+def text_digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=12).hexdigest()
+
+def author_conflicts(authors):
+    """
+    (author names, affiliations) of an `Autores` cell, the conflict-of-interest
+    key of a search: institutions written in parentheses plus the ones in
+    already stored author profiles (a missing profile is not fetched here).
+    """
+    authors, affiliations = split_affiliations(authors)
+    names = split_authors(authors)
+    store = get_author_profiles()
+    if store is not None:
+        for name in names:
+            try:
+                profile = store.get(name, count=False)
+            except Exception as e:
+                print(f"Author profile store failed: {e}")
+                break
+            institution = (profile or {}).get("role_and_institution", "")
+            if institution and institution != "No identificado":
+                affiliations.append(institution)
+    return tuple(sorted(set(names))), tuple(sorted(set(affiliations)))
+
+@st.cache_resource(max_entries=8)
+def _shortlist(fingerprint, context_digest, top_k, token_budget, prioritize_latam, conflicts, _reviewer_index, _target_article_context):
+    """Shortlisted rows and their serialized prompt block, shared by every rerun of the same search (read-only)."""
+    # Shortlist locally so the prompt doesn't grow with the whole database
+    with tracing.span("search.shortlist", top_k=top_k) as sp:
+        facets = _reviewer_index.facets
+        if facets is None:
+            df_candidates = _reviewer_index.top_k(_target_article_context, top_k)
+        else:
+            # Conflicts, methodology and LatAm priority applied to whole columns before ranking
+            masks = facets.ranking_masks(
+                _target_article_context, top_k, prioritize_latam, *conflicts,
+                latam_boost=float(get_secret("LATAM_BOOST", DEFAULT_LATAM_BOOST)),
+            )
+            df_candidates = _reviewer_index.top_k(_target_article_context, top_k, masks.allowed, masks.boost)
+            positions = df_candidates.index.to_numpy()
+            if "Metodología" not in df_candidates.columns:
+                df_candidates = df_candidates.assign(**{"Metodología": facets.table["methodology"].to_numpy()[positions]})
+            sp.update(conflicts=masks.conflicts, methodology=masks.methodology,
+                      methodology_excluded=masks.methodology_excluded, latam_rows=int(facets.latam[positions].sum()))
+        sp["rows"] = len(df_candidates)
+    # Compact, budgeted rows with short IDs instead of a padded to_string() table
+    with tracing.span("search.serialize") as sp:
+        serialized = serialize_reviewers(df_candidates, token_budget)
+        sp.update(rows=serialized.included_rows, prompt_tokens=serialized.estimated_tokens)
+    return df_candidates, serialized
+
+def drop_conflicting_matches(results, authors):
+    """
+    Copy of a search result without the suggestions that are one of the
+    authors or work at one of their institutions, by the conflicts known now:
+    a search started before the authors' profiles were stored only excluded
+    the affiliations written in `authors`. Returns (results, number removed).
+    """
+    conflicts = author_conflicts(authors)
+    if not isinstance(results, dict) or not any(conflicts):
+        return results, 0
+    filtered, removed = dict(results), 0
+    for section in ("internal_matches", "external_suggestions"):
+        items = [item for item in results.get(section) or [] if isinstance(item, dict)]
+        mask = record_conflicts(items, *conflicts)
+        filtered[section] = [item for item, conflict in zip(items, mask) if not conflict]
+        removed += int(mask.sum())
+    return filtered, removed
+
+def search_reviewers(sheet_id, api_key, target_article_context, prioritize_latam, top_k, model_name, on_item=None, metrics=None, token_budget=None, authors=""):
+    """
+    Shortlists candidates locally and asks Gemini for matches. Returns the parsed JSON or None.
+    With `on_item`, results are streamed (see `stream_reviewers_with_gemini`).
+    If given, `metrics` is filled with latency and prompt-size figures.
+    `authors` (the article's `Autores` cell) excludes the authors and their
+    institutions' reviewers from the shortlist.
+    """
+    metrics = {} if metrics is None else metrics
+    if token_budget is None:
+        token_budget = int(get_secret("PROMPT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+    with tracing.span("search", model=model_name, streamed=bool(on_item)) as search_span:
+        reviewer_index = get_reviewer_index(sheet_id)
+        if reviewer_index is None:
+            search_span["ok"] = False
+            return None
+        # Cheap keys for the (possibly multi-MB) reviewer block and the article text
+        fingerprint, context_digest = reviewer_index.fingerprint, text_digest(target_article_context)
+        search_span["dataset"] = fingerprint
+        conflicts = author_conflicts(authors)
+        df_candidates, serialized = _shortlist(fingerprint, context_digest, top_k, token_budget, prioritize_latam, conflicts, reviewer_index, target_article_context)
+        metrics.update(
+            prompt_rows=serialized.included_rows,
+            shortlisted_rows=serialized.total_rows,
+            prompt_tokens_est=serialized.estimated_tokens,
+        )
+        # The database block only joins the cached prefix when it isn't a per-article shortlist
+        whole_database = len(df_candidates) == len(reviewer_index)
+        if on_item:
+            results = stream_reviewers_with_gemini(api_key, target_article_context, prioritize_latam, serialized.text, model_name, on_item, metrics, whole_database)
+        else:
+            started = time.monotonic()
+            results = find_reviewers_with_gemini(api_key, fingerprint, context_digest, prioritize_latam, model_name, top_k, token_budget, whole_database, conflicts, target_article_context, serialized.text)
+            metrics["total_s"] = time.monotonic() - started
+        search_span["ok"] = results is not None
+        return restore_full_records(results, df_candidates, serialized.id_map)
+
+# --- WARM-UP ---
+
+DEFAULT_WARMUP_PREFETCH = 0 # Recent articles without reviewers whose integrity check is pre-run (paid calls: opt-in)
+DEFAULT_WARMUP_INTERVAL = 600 # Seconds before another login may start a new warm-up
+
+_warmup = None
+_warmup_lock = threading.Lock()
+
+def articles_without_reviewers(sheet_id_articulos, sheet_id_evaluadores, n):
+    """The most recent article IDs (newest first, up to `n`) that no row of Evaluadores is linked to via 'ID Artículo'."""
+    df = load_evaluadores(sheet_id_evaluadores)
+    assigned = set(df["ID Artículo"].astype(str).str.strip()) if df is not None and "ID Artículo" in df.columns else set()
+    # Look a bit further back so articles that already have reviewers don't eat the quota
+    recent = get_storage().recent_article_ids(sheet_id_articulos, n * 3)
+    return [article_id for article_id in recent if article_id not in assigned][:n]
+
+def _run_warmup(status, sheet_id_articulos, sheet_id_evaluadores, api_key, model_name, prefetch_n):
+    with tracing.span("warmup", prefetch=prefetch_n) as sp:
+        try:
+            status["stage"] = "sheets"
+            get_google_sheet_client() # Authorize once, off the editor's critical path
+            get_reviewer_index(sheet_id_evaluadores)
+            if not isinstance(get_storage(), SQLiteBackend): # SQLite answers identity lookups from its indexes
+                get_identity_index(sheet_id_evaluadores)
+            status["stage"] = "articles"
+            get_storage().recent_article_ids(sheet_id_articulos, 1) # Loads APUNTES into the article store
+            article_ids = articles_without_reviewers(sheet_id_articulos, sheet_id_evaluadores, prefetch_n) if prefetch_n > 0 else []
+            articles = [(article_id, fetch_article_details(sheet_id_articulos, article_id)) for article_id in article_ids]
+            articles = [(article_id, a) for article_id, a in articles if a and a["Autores"]]
+            status.update(stage="integrity", articles=len(articles))
+            if articles:
+                prefetch_integrity_checks(api_key, [(a["Autores"], a["Titulo"], a["Resumen"], a["Palabras clave"]) for _, a in articles], model_name)
+            for article_id, a in articles:
+                # Same arguments as the app's call, so the editor gets this cached result
+                if verify_article_integrity(api_key, a["Autores"], a["Titulo"], a["Resumen"], a["Palabras clave"], model_name) is not None:
+                    status["prefetched"].append(article_id)
+            status["stage"] = "done"
+        except Exception as e:
+            print(f"Warm-up failed: {e}")
+            status.update(stage="error", error=str(e))
+            sp["ok"] = False
+        finally:
+            status.update(running=False, finished_at=time.time())
+            sp.update(articles=status["articles"], prefetched=len(status["prefetched"]))
+
+def start_warmup(sheet_id_articulos, sheet_id_evaluadores, api_key, model_name, prefetch_n=None):
+    """
+    Starts a background warm-up after login: authorizes the Sheets client,
+    loads and indexes Evaluadores, loads APUNTES and, if `prefetch_n`
+    (WARMUP_PREFETCH_N, 0 by default since it spends Gemini calls) is set,
+    pre-runs the integrity check of that many recent articles without
+    reviewers, leaving the results in the shared caches so opening one of
+    them is instant. At most one warm-up runs per process, and a finished one
+    isn't repeated for WARMUP_INTERVAL seconds. Returns the shared status dict
+    ('stage', 'running', 'articles', 'prefetched' IDs, 'error'), or None
+    when WARMUP is off.
+    """
+    global _warmup
+    if str(get_secret("WARMUP", "1")).lower() in ("0", "false", "no", "off"):
+        return None
+    if prefetch_n is None:
+        prefetch_n = int(get_secret("WARMUP_PREFETCH_N", DEFAULT_WARMUP_PREFETCH))
+    with _warmup_lock:
+        interval = float(get_secret("WARMUP_INTERVAL", DEFAULT_WARMUP_INTERVAL))
+        if _warmup is not None and (_warmup["running"] or time.time() - _warmup["finished_at"] < interval):
+            return _warmup
+        _warmup = status = {"stage": "starting", "running": True, "started_at": time.time(), "finished_at": 0.0,
+                            "articles": 0, "prefetched": [], "error": None}
+    threading.Thread(
+        target=_run_warmup, args=(status, sheet_id_articulos, sheet_id_evaluadores, api_key, model_name, prefetch_n),
+        name="warmup", daemon=True,
+    ).start()
+    return status
@@ -0,0 +1,212 @@
+"""
+Identity index over the EVALUADORES sheet, to catch people who are already registered.
+
+A person matches an existing row by (in order of confidence):
+* e-mail address (case-insensitive),
+* ORCID iD (when the OrcId column holds a real iD, not a search link),
+* name: accent/case-folded, fuzzy-compared with difflib.
+
+Name comparisons are limited to rows sharing a blocking key (initial of the
+first given name + start of a surname), so a lookup only looks at a handful of
+rows instead of the whole sheet.
+
+Run directly for a one-off report of duplicates already in the sheet:
+    python dedup.py [--out duplicados.csv]
+"""
+import argparse
+import re
+import sys
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+
+from retrieval import normalize_text
+
+NAME_THRESHOLD = 0.88
+BLOCK_PREFIX = 4
+ORCID_RE = re.compile(r"(\d{4}-\d{4}-\d{4}-\d{3}[\dX])", re.IGNORECASE)
+EMAIL_COLUMNS = ("Correo electrónico", "Correo")
+ORCID_COLUMNS = ("OrcId", "ORCID")
+
+
+def normalize_name(text):
+    """'  José-Luis  Pérez ' -> 'jose luis perez'"""
+    return " ".join(re.findall(r"[a-z]+", normalize_text(text or "")))
+
+
+def normalize_email(text):
+    text = str(text or "").strip().lower()
+    return text if "@" in text else ""
+
+
+def normalize_orcid(text):
+    match = ORCID_RE.search(str(text or ""))
+    return match.group(1).upper() if match else ""
+
+
+def blocking_keys(given, surnames):
+    """Initial of the first given name paired with the first letters of each surname token."""
+    given, surnames = normalize_name(given).split(), normalize_name(surnames).split()
+    if not surnames and len(given) > 1: # Whole name in one field
+        given, surnames = given[:1], given[1:]
+    if not given or not surnames:
+        return set()
+    # A short surname prefix keeps spelling variants (Gómez/Gomes) in the same block
+    return {f"{given[0][0]}|{token[:BLOCK_PREFIX]}" for token in surnames if len(token) > 1}
+
+
+def name_similarity(a_given, a_surnames, b_given, b_surnames):
+    """
+    1.0 when one full name is the other plus extra surnames (e.g. a second
+    surname missing), else the difflib ratio of the full folded names. First
+    names must agree (exactly, or nearly for long ones) so María/Mario don't merge.
+    """
+    a_first, b_first = normalize_name(a_given).split()[:1], normalize_name(b_given).split()[:1]
+    if not a_first or not b_first:
+        return 0.0
+    if a_first != b_first and (min(len(a_first[0]), len(b_first[0])) < 6
+                               or SequenceMatcher(None, a_first[0], b_first[0]).ratio() < 0.85):
+        return 0.0
+    a_last, b_last = set(normalize_name(a_surnames).split()), set(normalize_name(b_surnames).split())
+    if a_first == b_first and a_last and b_last and (a_last <= b_last or b_last <= a_last):
+        return 1.0
+    a = normalize_name(f"{a_given} {a_surnames}")
+    b = normalize_name(f"{b_given} {b_surnames}")
+    return SequenceMatcher(None, a, b).ratio() if a and b else 0.0
+
+
+def identity_keys(given, surnames, email="", orcid=""):
+    """(normalized e-mail, ORCID, folded full name, blocking keys) of one person."""
+    return (normalize_email(email), normalize_orcid(orcid),
+            normalize_name(f"{given or ''} {surnames or ''}"), blocking_keys(given, surnames))
+
+
+def best_name_match(given, surnames, candidates, threshold=NAME_THRESHOLD):
+    """Best IdentityMatch by name among (label, given, surnames) candidates, or None."""
+    best = None
+    for label, b_given, b_surnames in candidates:
+        score = name_similarity(given, surnames, b_given, b_surnames)
+        if score >= threshold and (best is None or score > best.score):
+            display = " ".join(part for part in (b_given, b_surnames) if part).strip()
+            best = IdentityMatch(label, "nombre", score, display)
+    return best
+
+
+def _first_column(df, candidates):
+    return next((c for c in candidates if c in df.columns), None)
+
+
+@dataclass
+class IdentityMatch:
+    label: object # Index label of the existing row
+    reason: str # "correo", "orcid" or "nombre"
+    score: float
+    name: str
+
+
+class IdentityIndex:
+    """Lookup structures over a reviewer DataFrame (see module docstring)."""
+
+    def __init__(self, df, threshold=NAME_THRESHOLD):
+        self.threshold = threshold
+        self.by_email = {}
+        self.by_orcid = {}
+        self.blocks = {}
+        self.names = {}
+        email_col = _first_column(df, EMAIL_COLUMNS)
+        orcid_col = _first_column(df, ORCID_COLUMNS)
+        given_col = df["Nombre"].tolist() if "Nombre" in df.columns else [""] * len(df)
+        surname_col = df["Apellidos"].tolist() if "Apellidos" in df.columns else [""] * len(df)
+        emails = df[email_col].tolist() if email_col else [""] * len(df)
+        orcids = df[orcid_col].tolist() if orcid_col else [""] * len(df)
+        for label, given, surnames, email, orcid in zip(df.index, given_col, surname_col, emails, orcids):
+            self.add(label, given, surnames, email, orcid)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, label, given, surnames, email="", orcid=""):
+        self.names[label] = (str(given or ""), str(surnames or ""))
+        # First occurrence wins, so matches point at the original row
+        if normalize_email(email):
+            self.by_email.setdefault(normalize_email(email), label)
+        if normalize_orcid(orcid):
+            self.by_orcid.setdefault(normalize_orcid(orcid), label)
+        for key in blocking_keys(given, surnames):
+            self.blocks.setdefault(key, []).append(label)
+
+    def _display(self, label):
+        return " ".join(part for part in self.names[label] if part).strip()
+
+    def match(self, given, surnames, email="", orcid="", exclude=None):
+        """Best existing row for this person as an IdentityMatch, or None. `exclude` skips one label (itself)."""
+        for value, table, reason in ((normalize_email(email), self.by_email, "correo"),
+                                     (normalize_orcid(orcid), self.by_orcid, "orcid")):
+            label = table.get(value) if value else None
+            if label is not None and label != exclude:
+                return IdentityMatch(label, reason, 1.0, self._display(label))
+
+        candidates = {label for key in blocking_keys(given, surnames) for label in self.blocks.get(key, ())}
+        return best_name_match(
+            given, surnames, ((label, *self.names[label]) for label in candidates if label != exclude), self.threshold
+        )
+
+
+def find_duplicate_groups(df, threshold=NAME_THRESHOLD):
+    """Groups of index labels that look like the same person, for the one-off sheet cleanup."""
+    index = IdentityIndex(df, threshold)
+    parent = {label: label for label in df.index}
+
+    def root(label):
+        while parent[label] != label:
+            parent[label] = parent[parent[label]]
+            label = parent[label]
+        return label
+
+    email_col = _first_column(df, EMAIL_COLUMNS)
+    orcid_col = _first_column(df, ORCID_COLUMNS)
+    for label, row in df.iterrows():
+        found = index.match(
+            row.get("Nombre", ""), row.get("Apellidos", ""),
+            row.get(email_col, "") if email_col else "", row.get(orcid_col, "") if orcid_col else "",
+            exclude=label,
+        )
+        if found is not None:
+            parent[root(label)] = root(found.label)
+
+    groups = {}
+    for label in df.index:
+        groups.setdefault(root(label), []).append(label)
+    return [sorted(labels) for labels in groups.values() if len(labels) > 1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Informe de revisores duplicados en EVALUADORES.")
+    parser.add_argument("--out", help="Guardar el informe en este CSV")
+    parser.add_argument("--threshold", type=float, default=NAME_THRESHOLD, help="Similitud mínima de nombres (0-1)")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    from core import get_secret, load_evaluadores
+
+    df = load_evaluadores(get_secret("SHEET_ID_EVALUADORES"))
+    if df is None:
+        print("Could not load EVALUADORES", file=sys.stderr)
+        return 1
+    groups = find_duplicate_groups(df, args.threshold)
+    rows = []
+    for group_number, labels in enumerate(groups, start=1):
+        for label in labels:
+            # Sheet row = position + 2 (header is row 1)
+            rows.append({"Grupo": group_number, "Fila": df.index.get_loc(label) + 2, **df.loc[label].to_dict()})
+    report = pd.DataFrame(rows)
+    print(f"{len(groups)} groups of possible duplicates ({len(rows)} rows) out of {len(df)} reviewers")
+    if args.out:
+        report.to_csv(args.out, index=False)
+        print(f"Wrote {args.out}")
+    elif rows:
+        print(report[[c for c in ("Grupo", "Fila", "Nombre", "Apellidos", "Correo electrónico") if c in report.columns]].to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
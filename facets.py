@@ -0,0 +1,278 @@
+"""
+Precomputed reviewer facets: country, region, institution and methodology.
+
+LatAm priority and methodology matching used to live only in the prompt, so
+the model had to read every row to apply rules that are deterministic over
+`País` and `Temas`. `ReviewerFacets` derives them once per reviewer load, as
+a compact table of categoricals (folded country and its region, folded
+institution, a Cuanti/Cuali/Mixto tag inferred from `Temas`) plus boolean
+masks. For an article, `ranking_masks` gives the rows that may be sent
+(conflicts of interest and incompatible methodologies removed) and a score
+multiplier (LatAm boost), which the BM25 shortlist applies as vectorized
+operations before anything reaches Gemini.
+"""
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from author_profiles import AFFILIATION_RE
+from retrieval import normalize_text
+
+COUNTRY_COLUMNS = ("País", "Pais")
+INSTITUTION_COLUMNS = ("Afiliación institucional", "Afiliación", "Institucion")
+METHODOLOGIES = ("Cuanti", "Cuali", "Mixto")
+LATAM = "LatAm"
+DEFAULT_LATAM_BOOST = 1.5 # BM25 score multiplier for LatAm reviewers when prioritized
+
+# Canonical country -> (region, other spellings). Matching is accent/case-insensitive.
+COUNTRIES = {
+    "Argentina": (LATAM, ()),
+    "Bolivia": (LATAM, ()),
+    "Brasil": (LATAM, ("Brazil",)),
+    "Chile": (LATAM, ()),
+    "Colombia": (LATAM, ()),
+    "Costa Rica": (LATAM, ()),
+    "Cuba": (LATAM, ()),
+    "Ecuador": (LATAM, ()),
+    "El Salvador": (LATAM, ()),
+    "Guatemala": (LATAM, ()),
+    "Honduras": (LATAM, ()),
+    "México": (LATAM, ("Mejico",)),
+    "Nicaragua": (LATAM, ()),
+    "Panamá": (LATAM, ()),
+    "Paraguay": (LATAM, ()),
+    "Perú": (LATAM, ()),
+    "Puerto Rico": (LATAM, ()),
+    "República Dominicana": (LATAM, ("Dominican Republic",)),
+    "Uruguay": (LATAM, ()),
+    "Venezuela": (LATAM, ()),
+    "Estados Unidos": ("Norteamérica", ("EEUU", "EE UU", "USA", "US", "United States", "United States of America")),
+    "Canadá": ("Norteamérica", ("Canada",)),
+    "España": ("Europa", ("Spain",)),
+    "Portugal": ("Europa", ()),
+    "Reino Unido": ("Europa", ("UK", "United Kingdom", "Inglaterra", "England", "Escocia", "Scotland")),
+    "Francia": ("Europa", ("France",)),
+    "Alemania": ("Europa", ("Germany",)),
+    "Italia": ("Europa", ("Italy",)),
+    "Países Bajos": ("Europa", ("Holanda", "Netherlands")),
+    "Bélgica": ("Europa", ("Belgium",)),
+    "Suiza": ("Europa", ("Switzerland",)),
+    "Suecia": ("Europa", ("Sweden",)),
+    "Noruega": ("Europa", ("Norway",)),
+    "Dinamarca": ("Europa", ("Denmark",)),
+    "Finlandia": ("Europa", ("Finland",)),
+    "Irlanda": ("Europa", ("Ireland",)),
+    "Austria": ("Europa", ()),
+    "Polonia": ("Europa", ("Poland",)),
+    "Grecia": ("Europa", ("Greece",)),
+}
+_COUNTRY_ALIASES = {
+    normalize_text(alias): (country, region)
+    for country, (region, aliases) in COUNTRIES.items()
+    for alias in (country, *aliases)
+}
+
+_QUANT_RE = re.compile(
+    r"cuantitativ|quantitativ|econometr|estadistic|statistic|regresion|regression|datos de panel|panel data"
+    r"|experiment|encuesta|survey|series de tiempo|time series|machine learning|aprendizaje automatico"
+    r"|modelos? de ecuaciones|big data|analisis de datos|data analysis"
+)
+_QUAL_RE = re.compile(
+    r"cualitativ|qualitativ|etnograf|ethnograph|entrevista|interview|estudio de caso|case stud|hermeneut"
+    r"|fenomenolog|phenomenolog|discurso|discourse|grupo focal|focus group|teoria fundamentada|grounded theory"
+)
+_MIXED_RE = re.compile(r"metodos? mixtos?|mixed method")
+
+_STOPWORDS = frozenset("de del la las los el y e en of the and for at".split())
+# Words that don't identify an institution on their own ('Universidad', 'Profesor Asociado')
+_GENERIC_WORDS = _STOPWORDS | frozenset(
+    "universidad universidade university instituto institute facultad faculty departamento department escuela school"
+    " centro center centre colegio college laboratorio laboratory programa program nacional national"
+    " profesor profesora professor investigador investigadora researcher docente asociado asociada associate"
+    " titular adjunto adjunta assistant".split()
+)
+_AFFILIATION_SPLIT_RE = re.compile(r"[,;/|()]|\s-\s")
+
+
+def fold(text):
+    """'Universidad del Pacífico, Lima' -> 'universidad del pacifico lima'"""
+    return " ".join(re.findall(r"[a-z0-9]+", normalize_text(text or "")))
+
+
+def canonical_country(text):
+    """(canonical country, region); unknown countries keep their spelling with region 'Otra', blanks give ('', '')."""
+    text = " ".join(str(text or "").split())
+    if not text or text.lower() in ("nan", "none"):
+        return "", ""
+    return _COUNTRY_ALIASES.get(normalize_text(text).replace(".", ""), (text, "Otra"))
+
+
+def _methodology_flags(text):
+    text = fold(text)
+    return bool(_QUANT_RE.search(text)), bool(_QUAL_RE.search(text)), bool(_MIXED_RE.search(text))
+
+
+def _methodology_tag(quant, qual, mixed):
+    return "Mixto" if mixed or (quant and qual) else "Cuanti" if quant else "Cuali" if qual else ""
+
+
+def infer_methodology(text):
+    """'Cuanti', 'Cuali', 'Mixto' or '' from the terms in `text` (topics, or an article's title/keywords/abstract)."""
+    return _methodology_tag(*_methodology_flags(text))
+
+
+def _methodology_column(topics):
+    """
+    Methodology tag per row of a `Temas` column. Cells are split into single
+    topics, which repeat across reviewers, so the patterns run once per
+    distinct topic and the flags are OR-ed back per row.
+    """
+    exploded = topics.reset_index(drop=True).str.split(r"[,;\n]").explode().str.strip()
+    distinct = pd.Categorical(exploded.fillna(""))
+    flags = np.array([_methodology_flags(t) for t in distinct.categories], dtype=bool).reshape(-1, 3)
+    per_row = pd.DataFrame(flags[distinct.codes], index=exploded.index).groupby(level=0).any()
+    quant, qual, mixed = (per_row[i].to_numpy() for i in range(3))
+    tags = np.select([mixed | (quant & qual), quant, qual], ["Mixto", "Cuanti", "Cuali"], "")
+    return pd.Categorical(tags, categories=("", *METHODOLOGIES))
+
+
+def split_affiliations(authors):
+    """'Ana Pérez (UNAM); Luis Gómez' -> ('Ana Pérez ; Luis Gómez', ['UNAM']): institutions written in parentheses."""
+    authors = str(authors or "")
+    return AFFILIATION_RE.sub(" ", authors), [a.strip() for a in AFFILIATION_RE.findall(authors) if a.strip()]
+
+
+def record_conflicts(records, author_names=(), affiliations=()):
+    """Conflict mask (see `ReviewerFacets.conflicts`) for result dicts with Nombre, Apellidos and Institucion/Afiliación."""
+    if not records:
+        return np.zeros(0, dtype=bool)
+    df = pd.DataFrame([
+        {
+            "Nombre": r.get("Nombre", ""),
+            "Apellidos": r.get("Apellidos", ""),
+            "Afiliación institucional": r.get("Institucion") or r.get("Afiliación", ""),
+        }
+        for r in records
+    ])
+    return ReviewerFacets(df).conflicts(author_names, affiliations)
+
+
+def institution_names(text):
+    """
+    Folded institution names in an affiliation text: its comma/semicolon
+    separated parts, without generic ones. 'Profesor Asociado, Universidad de
+    Chile; UNAM' -> {'universidad de chile', 'unam'}
+    """
+    parts = (fold(part) for part in _AFFILIATION_SPLIT_RE.split(str(text or "")))
+    return {part for part in parts if len(part) > 1 and not set(part.split()) <= _GENERIC_WORDS}
+
+
+def acronym(name):
+    """'universidad nacional autonoma de mexico' -> 'unam'; '' for names of fewer than 3 significant words."""
+    words = [w for w in name.split() if w not in _STOPWORDS]
+    return "".join(w[0] for w in words) if len(words) >= 3 else ""
+
+
+def institutions_match(names, other_names):
+    """Same institution: a shared whole name, or an acronym on one side spelled out on the other."""
+    if names & other_names:
+        return True
+    acronyms = {acronym(n) for n in names} - {""}
+    other_acronyms = {acronym(n) for n in other_names} - {""}
+    singles = {n for n in names if " " not in n}
+    other_singles = {n for n in other_names if " " not in n}
+    return bool(acronyms & other_singles or other_acronyms & singles)
+
+
+def _column(df, names):
+    for name in names:
+        if name in df.columns:
+            return df[name].fillna("").astype(str)
+    return pd.Series([""] * len(df), index=df.index)
+
+
+def _categorical(values, fn):
+    """Categorical of fn(value), computing `fn` once per distinct value."""
+    raw = pd.Categorical(values)
+    mapped = pd.Index([fn(v) for v in raw.categories], dtype=object)
+    return pd.Categorical(mapped[raw.codes] if len(raw) else [])
+
+
+@dataclass
+class RankingMasks:
+    allowed: np.ndarray # Rows that may be shortlisted
+    boost: np.ndarray # Multiplier applied to each row's BM25 score
+    conflicts: int = 0 # Rows removed as conflicts of interest
+    methodology: str = "" # Article methodology used to pre-filter ('' = no filter)
+    methodology_excluded: int = 0
+
+
+class ReviewerFacets:
+    """
+    Normalized facets of the reviewer rows, positionally aligned with the
+    frame they were built from (`table` has one row per reviewer).
+    """
+
+    def __init__(self, df):
+        df = df.reset_index(drop=True)
+        countries = _column(df, COUNTRY_COLUMNS)
+        institutions = _column(df, INSTITUTION_COLUMNS)
+        self.table = pd.DataFrame({
+            "country": _categorical(countries, lambda c: canonical_country(c)[0]),
+            "region": _categorical(countries, lambda c: canonical_country(c)[1]),
+            "institution": _categorical(institutions, fold),
+            "methodology": _methodology_column(_column(df, ("Temas",))),
+            "name_key": _categorical(_column(df, ("Nombre",)) + " " + _column(df, ("Apellidos",)), fold),
+        })
+        self.latam = (self.table["region"] == LATAM).to_numpy()
+        # Parsed institution names per distinct raw value, for conflict checks
+        self._institutions = pd.Categorical(institutions)
+        self._institution_names = [institution_names(value) for value in self._institutions.categories]
+        self.by_methodology = {m: (self.table["methodology"] == m).to_numpy() for m in ("", *METHODOLOGIES)}
+
+    def __len__(self):
+        return len(self.table)
+
+    def conflicts(self, author_names=(), affiliations=()):
+        """
+        Rows that are one of the authors (same folded name) or work at one of
+        their institutions: a whole institution name (see `institution_names`)
+        shared with an author's affiliation, or its acronym ('UNAM' for
+        'Universidad Nacional Autónoma de México'). Generic names such as
+        'Universidad' never match.
+        """
+        author_institutions = set().union(*(institution_names(a) for a in affiliations))
+        hits = [code for code, names in enumerate(self._institution_names)
+                if author_institutions and names and institutions_match(names, author_institutions)]
+        mask = np.isin(self._institutions.codes, hits)
+        names = {fold(n) for n in author_names} - {""}
+        if names:
+            mask |= self.table["name_key"].isin(names).to_numpy()
+        return mask
+
+    def methodology_compatible(self, methodology):
+        """Rows whose tag fits an article of this methodology (mixed and untagged rows always fit)."""
+        if methodology not in ("Cuanti", "Cuali"):
+            return np.ones(len(self), dtype=bool)
+        return self.by_methodology[methodology] | self.by_methodology["Mixto"] | self.by_methodology[""]
+
+    def ranking_masks(self, article_text, k, prioritize_latam=True, author_names=(), affiliations=(), latam_boost=DEFAULT_LATAM_BOOST):
+        """
+        RankingMasks for one article: conflicts are always removed; rows of an
+        incompatible methodology only when shortlisting (`k` > 0) and at least
+        `k` compatible rows remain, so the whole-database prompt stays the same
+        across articles (and cacheable) unless there is a conflict.
+        """
+        conflicts = self.conflicts(author_names, affiliations)
+        allowed = ~conflicts
+        methodology = infer_methodology(article_text)
+        compatible = allowed & self.methodology_compatible(methodology)
+        excluded = int(allowed.sum() - compatible.sum())
+        if excluded and k and k > 0 and compatible.sum() >= k:
+            allowed = compatible
+        else:
+            methodology, excluded = "", 0
+        boost = np.where(self.latam, latam_boost, 1.0) if prioritize_latam else np.ones(len(self))
+        return RankingMasks(allowed, boost, int(conflicts.sum()), methodology, excluded)
@@ -0,0 +1,181 @@
+"""
+In-memory stand-ins for the gspread client, spreadsheet and worksheet, with
+generated EVALUADORES/APUNTES data, for benchmarks and offline runs.
+
+Only the calls the app makes are implemented (open_by_key, worksheet,
+get_worksheet, get_all_values, get_all_records, get_values, append_rows,
+get_lastUpdateTime). `latency` adds a fixed delay per API call to mimic the
+round trip to Google.
+"""
+import random
+import re
+import threading
+import time
+
+import gspread
+from gspread.utils import a1_to_rowcol
+
+REVIEWER_HEADERS = ["ID Artículo", "Nombre", "Apellidos", "Correo electrónico", "Afiliación institucional", "País", "Google Scholar", "OrcId", "Temas"]
+ARTICLE_HEADERS = ["ID", "Título", "Resumen", "Palabras clave", "Autores", "Enlace archivo"]
+
+GIVEN_NAMES = ["Ana", "Luis", "María", "José", "Carmen", "Jorge", "Lucía", "Pedro", "Sofía", "Diego", "Valeria", "Andrés",
+               "Camila", "Javier", "Paula", "Ricardo", "Elena", "Tomás", "Isabel", "Martín", "John", "Emma", "Chen", "Priya"]
+SURNAMES = ["Pérez", "Gómez", "Rodríguez", "López", "Martínez", "García", "Sánchez", "Ramírez", "Torres", "Flores",
+            "Rivera", "Vargas", "Castillo", "Rojas", "Morales", "Ortiz", "Silva", "Mendoza", "Herrera", "Chávez",
+            "Smith", "Müller", "Wang", "Patel"]
+INSTITUTIONS = [
+    ("Universidad Nacional Autónoma de México", "México", "unam.mx"),
+    ("Pontificia Universidad Católica del Perú", "Perú", "pucp.edu.pe"),
+    ("Universidad del Pacífico", "Perú", "up.edu.pe"),
+    ("Universidad de Buenos Aires", "Argentina", "uba.ar"),
+    ("Universidad de Chile", "Chile", "uchile.cl"),
+    ("Universidad de los Andes", "Colombia", "uniandes.edu.co"),
+    ("Universidade de São Paulo", "Brasil", "usp.br"),
+    ("Universidad Complutense de Madrid", "España", "ucm.es"),
+    ("London School of Economics", "Reino Unido", "lse.ac.uk"),
+    ("University of Michigan", "Estados Unidos", "umich.edu"),
+]
+TOPICS = ["economía laboral", "pobreza", "desigualdad", "finanzas corporativas", "gobierno corporativo", "marketing digital",
+          "comportamiento del consumidor", "políticas públicas", "educación superior", "microfinanzas", "comercio internacional",
+          "econometría aplicada", "sostenibilidad", "responsabilidad social", "emprendimiento", "innovación",
+          "mercados laborales informales", "migración", "salud pública", "gestión de recursos humanos", "contabilidad",
+          "auditoría", "banca", "política monetaria", "desarrollo regional", "agricultura", "minería", "turismo",
+          "transformación digital", "cadenas de suministro", "métodos cualitativos", "análisis de redes"]
+
+
+def generate_reviewers(n, seed=0):
+    """`n` reviewer rows (strings, sheet order) with realistic-looking names, affiliations and topics."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        given, surname1, surname2 = rng.choice(GIVEN_NAMES), rng.choice(SURNAMES), rng.choice(SURNAMES)
+        institution, country, domain = rng.choice(INSTITUTIONS)
+        user = re.sub(r"[^a-z]", "", f"{given[0]}{surname1}".lower()) + str(i)
+        rows.append([
+            str(rng.randint(2000, 2800)) if rng.random() < 0.3 else "",
+            given, f"{surname1} {surname2}", f"{user}@{domain}", institution, country,
+            "", f"0000-000{rng.randint(1, 9)}-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}" if rng.random() < 0.4 else "",
+            ", ".join(rng.sample(TOPICS, rng.randint(2, 5))),
+        ])
+    return rows
+
+
+def generate_articles(n, seed=0, first_id=2700):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        topics = rng.sample(TOPICS, 3)
+        rows.append([
+            str(first_id + i),
+            f"Un estudio sobre {topics[0]} y {topics[1]} en América Latina",
+            f"Este artículo analiza {topics[0]} con evidencia de {rng.choice(INSTITUTIONS)[1]}, "
+            f"discutiendo su relación con {topics[1]} y {topics[2]}. Se emplean datos de panel y entrevistas.",
+            "; ".join(topics),
+            f"{rng.choice(GIVEN_NAMES)} {rng.choice(SURNAMES)}",
+            f"https://example.org/articulos/{first_id + i}.pdf",
+        ])
+    return rows
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, values, latency=0.0):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.values = [list(row) for row in values]
+        self.latency = latency
+        self.api_calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self):
+        self.api_calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_all_values(self, **kwargs):
+        with self._lock:
+            self._call()
+            return [list(row) for row in self.values]
+
+    def get_all_records(self, **kwargs):
+        values = self.get_all_values()
+        if not values:
+            return []
+        return [dict(zip(values[0], gspread.utils.numericise_all(row))) for row in values[1:]]
+
+    def get_values(self, range_name=None, **kwargs):
+        """Supports 'A{row}:{col}' style ranges (rows from `row` to the end)."""
+        with self._lock:
+            self._call()
+            if not range_name:
+                return [list(row) for row in self.values]
+            start = range_name.split("!")[-1].split(":")[0]
+            first_row = a1_to_rowcol(start)[0] if re.search(r"\d", start) else 1
+            return [list(row) for row in self.values[first_row - 1:]]
+
+    def append_rows(self, values, **kwargs):
+        with self._lock:
+            self._call()
+            first_row = len(self.values) + 1
+            self.values.extend([str(v) for v in row] for row in values)
+            self.spreadsheet.touch()
+            return {"updates": {"updatedRange": f"{self.title}!A{first_row}:I{len(self.values)}", "updatedRows": len(values)}}
+
+
+class FakeSpreadsheet:
+    def __init__(self, sheet_id, latency=0.0):
+        self.id = sheet_id
+        self.latency = latency
+        self.worksheets = {}
+        self.modified_time = time.time()
+
+    def add_worksheet_values(self, title, values):
+        self.worksheets[title] = FakeWorksheet(self, title, values, self.latency)
+        return self.worksheets[title]
+
+    def touch(self):
+        self.modified_time = time.time()
+
+    def worksheet(self, title):
+        if title not in self.worksheets:
+            raise gspread.WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def get_worksheet(self, index):
+        worksheets = list(self.worksheets.values())
+        return worksheets[index] if index < len(worksheets) else None
+
+    def get_lastUpdateTime(self):
+        if self.latency:
+            time.sleep(self.latency)
+        return f"{self.modified_time:.6f}"
+
+
+class FakeClient:
+    """Spreadsheets by key; register them with `add_spreadsheet`."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.spreadsheets = {}
+
+    def add_spreadsheet(self, sheet_id):
+        self.spreadsheets[sheet_id] = FakeSpreadsheet(sheet_id, self.latency)
+        return self.spreadsheets[sheet_id]
+
+    def open_by_key(self, key):
+        if key not in self.spreadsheets:
+            raise gspread.SpreadsheetNotFound(key)
+        if self.latency:
+            time.sleep(self.latency)
+        return self.spreadsheets[key]
+
+
+def make_client(reviewer_sizes, n_articles=50, latency=0.0, seed=0):
+    """
+    A FakeClient with one EVALUADORES spreadsheet per size (keyed 'eval-<n>')
+    and one APUNTES spreadsheet ('articulos').
+    """
+    client = FakeClient(latency)
+    for n in reviewer_sizes:
+        client.add_spreadsheet(f"eval-{n}").add_worksheet_values("EVALUADORES", [REVIEWER_HEADERS] + generate_reviewers(n, seed))
+    client.add_spreadsheet("articulos").add_worksheet_values("APUNTES", [ARTICLE_HEADERS] + generate_articles(n_articles, seed))
+    return client
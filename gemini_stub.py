@@ -0,0 +1,302 @@
+"""
+Local stand-in for the Gemini REST API, for exercising the app offline.
+
+Implements the endpoints the app uses:
+    POST   /v1beta/models/{model}:generateContent
+    POST   /v1beta/models/{model}:streamGenerateContent?alt=sse
+    POST   /v1beta/cachedContents
+    GET    /v1beta/cachedContents/{id}
+    DELETE /v1beta/cachedContents/{id}
+
+Responses are canned JSON in the shapes the app expects (integrity check or
+reviewer search); reviewer matches are taken from the `R1|...` rows found in
+the prompt. Token counts are estimated at ~4 characters per token. For
+benchmarks, generate calls can be slowed down (`latency`, `jitter`, or
+per model with `model_latency`, e.g. to make a Pro model stall) and a
+fraction of them answered with 429 + Retry-After (`rate_429`) or cut in half
+with finishReason MAX_TOKENS (`truncate`); a continuation request (the cut
+answer sent back as a model turn) gets the rest of the text.
+
+Point the app at it with GEMINI_API_BASE=http://127.0.0.1:8765/v1beta
+    python gemini_stub.py --port 8765
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+DEFAULT_MIN_CACHE_TOKENS = 1024 # The real API rejects smaller cachedContents
+BATCH_ID_RE = re.compile(r"^\[([A-Z]\d+)\]$", re.MULTILINE) # Item headers of batched prompts
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / 4)
+
+
+def _prompt_text(body, cached=None):
+    texts = []
+    if cached:
+        texts += [p.get("text", "") for p in cached["systemInstruction"].get("parts", [])]
+        texts += [p.get("text", "") for c in cached.get("contents", []) for p in c.get("parts", [])]
+    texts += [p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", [])]
+    return "\n".join(texts)
+
+
+def canned_response(prompt):
+    """A plausible answer for the prompt: author profile, article check (single or batched) or reviewer-search shape."""
+    if "PERFIL ACADÉMICO DE UN AUTOR" in prompt:
+        profile = {
+            "recent_publications_list": [
+                {"title": "Publicación de prueba", "year": "2024"},
+                {"title": "Otra publicación de prueba", "year": "2023"},
+            ],
+            "role_and_institution": "Profesor Asociado, Universidad de Prueba",
+            "author_comment": "Perfil generado por el servidor de prueba.",
+        }
+        if "MODO LOTE" in prompt:
+            return {"profiles": [dict(profile, id=item_id) for item_id in BATCH_ID_RE.findall(prompt)]}
+        return profile
+    if "integridad" in prompt:
+        check = {
+            "is_previously_published": False,
+            "reason_publication": "Sin coincidencias (stub).",
+            "article_methodology": "Cuantitativo (stub)",
+        }
+        if "MODO LOTE" in prompt:
+            return {"results": [dict(check, id=item_id) for item_id in BATCH_ID_RE.findall(prompt)]}
+        return check
+
+    internal = []
+    for line in prompt.splitlines():
+        fields = line.strip().split("|")
+        if len(fields) >= 3 and fields[0].startswith("R") and fields[0][1:].isdigit():
+            internal.append({
+                "ID": fields[0], "Nombre": fields[1], "Apellidos": fields[2],
+                "Institucion": fields[3] if len(fields) > 3 else "",
+                "Temas": fields[5] if len(fields) > 5 else "",
+                "Methodology": "Mixto", "Reason": "Coincidencia temática (stub).",
+            })
+        if len(internal) == 3:
+            break
+    external = [
+        {
+            "Nombre": f"Externo{i}", "Apellidos": "Prueba", "Correo": f"externo{i}@uprueba.edu",
+            "Afiliación": "Universidad de Ejemplo", "País": "Chile", "Scholar": "", "OrcId": "",
+            "Temas": "Tema de prueba", "Methodology": "Cuantitativo", "Reason": "Sugerencia externa (stub).",
+        }
+        for i in range(1, 4)
+    ]
+    return {"internal_matches": internal, "external_suggestions": external}
+
+
+class StubState:
+    def __init__(self, min_cache_tokens=DEFAULT_MIN_CACHE_TOKENS, latency=0.0, jitter=0.0, rate_429=0.0, retry_after=1, truncate=0.0, model_latency=None, seed=None):
+        self.min_cache_tokens = min_cache_tokens
+        self.latency = latency # seconds added to every generate call
+        self.jitter = jitter # +/- uniform seconds around `latency`
+        self.model_latency = dict(model_latency or {}) # model -> seconds, instead of `latency`
+        self.rate_429 = rate_429 # fraction of generate calls rejected with 429
+        self.retry_after = retry_after
+        self.truncate = truncate # fraction of answers cut off with MAX_TOKENS
+        self.random = random.Random(seed)
+        self.generate_calls = 0
+        self.throttled_calls = 0
+        self.truncated_calls = 0
+        self.cached = {} # "cachedContents/N" -> entry
+        self.ids = itertools.count(1)
+        self.requests = [] # (method, path) log, handy for assertions
+        self.lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state = None # Set per server in make_server()
+
+    def log_message(self, *args):
+        pass # Keep benchmark/test output clean
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send_json(status, {"error": {"code": status, "message": message}})
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _authorized(self):
+        if not self.headers.get("x-goog-api-key"):
+            self._error(403, "Missing API key")
+            return False
+        return True
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        with self.state.lock:
+            self.state.requests.append(("GET", path))
+            entry = self.state.cached.get(path.split("/v1beta/", 1)[-1])
+        if entry is None:
+            return self._error(404, "Not found")
+        self._send_json(200, {k: v for k, v in entry.items() if k in ("name", "model", "expireTime", "usageMetadata")})
+
+    def do_DELETE(self):
+        path = urlparse(self.path).path
+        with self.state.lock:
+            self.state.requests.append(("DELETE", path))
+            removed = self.state.cached.pop(path.split("/v1beta/", 1)[-1], None)
+        if removed is None:
+            return self._error(404, "Not found")
+        self._send_json(200, {})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        with self.state.lock:
+            self.state.requests.append(("POST", path))
+        if not self._authorized():
+            return
+        body = self._read_body()
+
+        if path.endswith("/cachedContents"):
+            return self._create_cached_content(body)
+        if ":generateContent" in path:
+            return self._generate(body, path, stream=False)
+        if ":streamGenerateContent" in path:
+            return self._generate(body, path, stream=True)
+        self._error(404, f"Unknown endpoint {path}")
+
+    def _create_cached_content(self, body):
+        tokens = estimate_tokens(_prompt_text({}, body))
+        if tokens < self.state.min_cache_tokens:
+            return self._error(400, f"Cached content is too small. total_token_count={tokens}, min_total_token_count={self.state.min_cache_tokens}")
+        ttl = float(str(body.get("ttl", "3600s")).rstrip("s"))
+        with self.state.lock:
+            name = f"cachedContents/stub{next(self.state.ids)}"
+            entry = dict(body, name=name, usageMetadata={"totalTokenCount": tokens},
+                         expires_at=time.time() + ttl,
+                         expireTime=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + ttl)))
+            self.state.cached[name] = entry
+        self._send_json(200, {k: v for k, v in entry.items() if k in ("name", "model", "expireTime", "usageMetadata")})
+
+    def _generate(self, body, path, stream):
+        model = path.rsplit("/models/", 1)[-1].split(":")[0]
+        with self.state.lock:
+            self.state.generate_calls += 1
+            reject = self.state.random.random() < self.state.rate_429
+            cut = self.state.random.random() < self.state.truncate
+            delay = max(0.0, self.state.model_latency.get(model, self.state.latency) + self.state.random.uniform(-self.state.jitter, self.state.jitter))
+            if reject:
+                self.state.throttled_calls += 1
+        if reject:
+            body_429 = json.dumps({"error": {"code": 429, "status": "RESOURCE_EXHAUSTED", "message": "Quota exceeded (stub)"}}).encode("utf-8")
+            self.send_response(429)
+            self.send_header("Retry-After", str(self.state.retry_after))
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body_429)))
+            self.end_headers()
+            self.wfile.write(body_429)
+            return
+        if delay:
+            time.sleep(delay)
+
+        cached = None
+        if body.get("cachedContent"):
+            with self.state.lock:
+                cached = self.state.cached.get(body["cachedContent"])
+            if cached is None or cached["expires_at"] < time.time():
+                return self._error(404, f"CachedContent not found: {body['cachedContent']}")
+
+        turns = body.get("contents", [])
+        partial = next((p.get("text", "") for c in turns if c.get("role") == "model" for p in c.get("parts", [])), None)
+        if partial is not None: # Continuation: answer the original prompt, minus what was already sent
+            body = dict(body, contents=turns[:1])
+        prompt = _prompt_text(body, cached)
+        text = json.dumps(canned_response(prompt), ensure_ascii=False)
+        finish_reason = "STOP"
+        if partial is not None:
+            text = text[len(partial):]
+        elif cut:
+            text, finish_reason = text[:len(text) // 2], "MAX_TOKENS"
+            with self.state.lock:
+                self.state.truncated_calls += 1
+        usage = {
+            "promptTokenCount": estimate_tokens(prompt),
+            "candidatesTokenCount": estimate_tokens(text),
+            "totalTokenCount": estimate_tokens(prompt) + estimate_tokens(text),
+        }
+        if cached:
+            usage["cachedContentTokenCount"] = cached["usageMetadata"]["totalTokenCount"]
+
+        if not stream:
+            return self._send_json(200, {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": finish_reason}],
+                "usageMetadata": usage,
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.end_headers()
+        chunks = [text[i:i + 64] for i in range(0, len(text), 64)] or [""]
+        for n, chunk in enumerate(chunks, start=1):
+            event = {"candidates": [{"content": {"role": "model", "parts": [{"text": chunk}]}}]}
+            if n == len(chunks):
+                event["candidates"][0]["finishReason"] = finish_reason
+                event["usageMetadata"] = usage
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+            self.wfile.flush()
+
+
+def make_server(host="127.0.0.1", port=0, **options):
+    state = StubState(**options)
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+def start_stub_server(host="127.0.0.1", port=0, **options):
+    """Starts the stub on a background thread. Returns (server, base_url); call server.shutdown() when done."""
+    server = make_server(host, port, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1beta"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de Gemini.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--min-cache-tokens", type=int, default=DEFAULT_MIN_CACHE_TOKENS)
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos de espera por llamada")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Variación (+/- s) de la latencia")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fracción de llamadas respondidas con 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After (s) de las respuestas 429")
+    parser.add_argument("--truncate", type=float, default=0.0, help="Fracción de respuestas cortadas (MAX_TOKENS)")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODELO=SEGUNDOS",
+                        help="Latencia propia de un modelo (repetible), p.ej. gemini-3-pro-preview=40")
+    args = parser.parse_args(argv)
+    model_latency = {name: float(seconds) for name, seconds in (item.split("=", 1) for item in args.model_latency)}
+    server = make_server(
+        args.host, args.port, min_cache_tokens=args.min_cache_tokens, latency=args.latency,
+        jitter=args.jitter, rate_429=args.rate_429, retry_after=args.retry_after, truncate=args.truncate,
+        model_latency=model_latency,
+    )
+    print(f"Gemini stub listening on http://{args.host}:{args.port}/v1beta")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Hedged Gemini requests: a per-model deadline, then the same request on a fallback model.
+
+A stalled or throttled model (typically a preview Pro) used to hold the editor
+through retries and backoff sleeps. `HedgePolicy.run` starts the call on the
+selected model and, if no usable answer has arrived by that model's hedge
+delay (or the call already failed), starts the same call on the fallback
+model. The first usable answer wins and the other call is cancelled: it stops
+before its next attempt, retry sleep or stream chunk (an HTTP request already
+in flight is abandoned, not killed).
+
+The hedge delay adapts to each model: the p95 of its recent successful
+latencies, clamped between `min_delay` and the model's configured deadline, so
+a healthy model is rarely hedged and one that has started to stall is hedged
+early. Per-model hedge and win counts are kept for the admin panel, and
+`extra_calls` (fallback calls started) is shown next to the response cache
+stats, since each one is billed.
+"""
+import contextvars
+import queue
+import threading
+import time
+from collections import deque
+
+from tracing import percentile
+
+DEFAULT_DEADLINE = 30 # seconds before hedging a model with no latency history
+DEFAULT_MIN_DELAY = 5
+DEFAULT_WINDOW = 50 # Recent latencies kept per model
+MIN_SAMPLES = 5 # Below this, the configured deadline is used as is
+
+
+class Cancelled(Exception):
+    """The other leg of a hedged request already won."""
+
+
+def check(cancel):
+    """Raises Cancelled once `cancel` (a threading.Event or None) is set."""
+    if cancel is not None and cancel.is_set():
+        raise Cancelled("Superseded by the hedged request")
+
+
+class HedgePolicy:
+    """Fallback model, hedge delays and hedge/win counters, shared by every session in the process."""
+
+    def __init__(self, fallback, deadlines=None, default_deadline=DEFAULT_DEADLINE, min_delay=DEFAULT_MIN_DELAY, window=DEFAULT_WINDOW):
+        self.fallback = fallback
+        self.deadlines = dict(deadlines or {}) # model -> seconds
+        self.default_deadline = default_deadline
+        self.min_delay = min_delay
+        self.window = window
+        self._latencies = {} # model -> deque of seconds of usable answers
+        self._counts = {} # model -> counters
+        self._lock = threading.Lock()
+
+    def fallback_for(self, model_name):
+        return self.fallback if self.fallback and self.fallback != model_name else None
+
+    def delay(self, model_name):
+        """Seconds to wait for `model_name` before hedging."""
+        deadline = float(self.deadlines.get(model_name, self.default_deadline))
+        with self._lock:
+            samples = list(self._latencies.get(model_name, ()))
+        if len(samples) < MIN_SAMPLES:
+            return deadline
+        return min(deadline, max(self.min_delay, percentile(samples, 95)))
+
+    def observe(self, model_name, seconds):
+        with self._lock:
+            self._latencies.setdefault(model_name, deque(maxlen=self.window)).append(seconds)
+
+    def _count(self, model_name, key):
+        with self._lock:
+            counts = self._counts.setdefault(model_name, {"calls": 0, "hedged": 0, "legs": 0, "wins": 0})
+            counts[key] += 1
+
+    def run(self, model_name, call):
+        """
+        Runs `call(model, cancel_event)` on `model_name`, hedged with the
+        fallback model. `call` returns the answer, or None / raises when it has
+        none. Returns (answer, winning model or None, hedged). When every leg
+        fails, the last exception is raised (None is returned if none raised).
+        """
+        self._count(model_name, "calls")
+        fallback = self.fallback_for(model_name)
+        results = queue.Queue()
+        cancels = []
+
+        def start(leg_model):
+            cancel = threading.Event()
+            cancels.append(cancel)
+            self._count(leg_model, "legs")
+            def leg():
+                started = time.monotonic()
+                try:
+                    answer, error = call(leg_model, cancel), None
+                except Exception as e:
+                    answer, error = None, e
+                if answer is not None and not cancel.is_set():
+                    self.observe(leg_model, time.monotonic() - started)
+                results.put((leg_model, answer, error))
+            # Each leg gets its own copy of the caller's context (trace id)
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(leg,), name=f"hedge-{leg_model}", daemon=True).start()
+
+        start(model_name)
+        pending, hedged, error = 1, False, None
+        hedge_at = time.monotonic() + self.delay(model_name)
+        while pending:
+            try:
+                timeout = None if hedged or not fallback else max(0.0, hedge_at - time.monotonic())
+                leg_model, answer, leg_error = results.get(timeout=timeout)
+            except queue.Empty:
+                leg_model = None # Deadline passed with the primary still running
+            else:
+                pending -= 1
+                if answer is not None:
+                    for cancel in cancels:
+                        cancel.set()
+                    self._count(leg_model, "wins")
+                    return answer, leg_model, hedged
+                if not isinstance(leg_error, Cancelled):
+                    error = leg_error or error
+            if fallback and not hedged:
+                hedged = True
+                self._count(model_name, "hedged")
+                start(fallback)
+                pending += 1
+        if error is not None:
+            raise error
+        return None, None, hedged
+
+    def extra_calls(self):
+        """Fallback calls started so far: the cost of hedging, on top of the calls the editor asked for."""
+        with self._lock:
+            return sum(c["hedged"] for c in self._counts.values())
+
+    def stats(self):
+        """{model: {'calls', 'hedged', 'hedge_rate', 'legs', 'wins', 'win_rate'}}"""
+        with self._lock:
+            counts = {model: dict(c) for model, c in self._counts.items()}
+        return {
+            model: {
+                "calls": c["calls"],
+                "hedged": c["hedged"],
+                "hedge_rate": c["hedged"] / c["calls"] if c["calls"] else None,
+                "legs": c["legs"],
+                "wins": c["wins"],
+                "win_rate": c["wins"] / c["legs"] if c["legs"] else None,
+            }
+            for model, c in sorted(counts.items())
+        }
@@ -0,0 +1,198 @@
+"""
+Tolerant parsing of Gemini JSON answers, checked against the response schema.
+
+The answers are meant to be one JSON document, but now and then they come
+wrapped in ``` fences, followed by a comment, with single-quoted strings or
+trailing commas, or cut off mid-record when the output limit is hit. `parse`
+tries a strict parse first and only then repairs the text: a truncated
+document is cut back to its last complete member and closed, and a record
+that was still being written inside a list is dropped rather than closed
+half-empty. `conform` then checks the value against the Gemini-style schema
+sent with the request and drops array items that don't fit it, so one bad
+record doesn't cost the whole call.
+"""
+import json
+import re
+from dataclasses import dataclass
+
+_FENCE_RE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_WORD_RE = re.compile(r"[A-Za-z_]+")
+_LITERALS = {"True": "true", "False": "false", "None": "null"} # Python-style literals
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+@dataclass
+class ParseResult:
+    value: object
+    repaired: bool = False # The text needed fixing to parse
+    truncated: bool = False # The document was cut off and had to be closed
+    dropped: int = 0 # Unfinished list items removed from a truncated document
+
+
+def strip_fences(text):
+    return _FENCE_RE.sub("", text or "").strip()
+
+
+def _trim(out):
+    """Drops trailing whitespace and a dangling comma from the output tokens."""
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def _ends_string(text, pos):
+    """A quote only closes the string if structure follows; otherwise it is an unescaped quote inside it."""
+    rest = text[pos:].lstrip()
+    return not rest or rest[0] in ",:}]"
+
+
+def repair(text):
+    """
+    Rewrites `text` (starting at its first '{' or '[') into parseable JSON.
+    Returns (fixed_text, truncated, dropped). Text after the document is
+    dropped; in a truncated document, the unfinished object or list inside
+    a list (the record being written when the output stopped) is removed
+    and counted in `dropped`.
+    """
+    out, stack = [], []
+    starts = [] # Output position where each open container began
+    checkpoint = None # (output length, open containers, their starts) at the last complete member
+    quote = None # Quote character of the string being read, if any
+    escape = False
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if quote:
+            if escape:
+                escape = False
+                if c == "'" and quote == "'":
+                    out[-1] = "'" # \' is not a JSON escape
+                else:
+                    out.append(c)
+            elif c == "\\":
+                escape = True
+                out.append(c)
+            elif c == quote and _ends_string(text, i + 1):
+                quote = None
+                out.append('"')
+            elif c == '"':
+                out.append('\\"')
+            elif c == "\n":
+                out.append("\\n")
+            else:
+                out.append(c)
+        elif c in "\"'":
+            quote = c
+            out.append('"')
+        elif c in _CLOSERS:
+            stack.append(_CLOSERS[c])
+            starts.append(len(out))
+            out.append(c)
+        elif c in "}]":
+            if c in stack:
+                while stack[-1] != c: # Close whatever the model left open inside
+                    _trim(out)
+                    out.append(stack.pop())
+                    starts.pop()
+                _trim(out)
+                out.append(stack.pop())
+                starts.pop()
+                if not stack:
+                    return "".join(out), False, 0
+                checkpoint = (len(out), list(stack), list(starts))
+        elif c == ",":
+            checkpoint = (len(out), list(stack), list(starts))
+            out.append(c)
+        elif c.isalpha() or c == "_":
+            word = _WORD_RE.match(text, i).group()
+            out.append(_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        else:
+            out.append(c)
+        i += 1
+
+    # Input ended inside the document: keep what was complete and close it
+    dropped = 0
+    if checkpoint:
+        length, stack, starts = checkpoint
+        out = out[:length]
+    elif quote:
+        out.append('"')
+    for depth in range(len(stack) - 1):
+        if stack[depth] == "]": # A list item that was still open: drop it instead of closing it
+            out = out[:starts[depth + 1]]
+            stack, starts = stack[:depth + 1], starts[:depth + 1]
+            dropped = 1
+            break
+    _trim(out)
+    if out and out[-1] == ":":
+        out.append("null")
+    out.extend(reversed(stack))
+    return "".join(out), True, dropped
+
+
+def parse(text):
+    """ParseResult for the first JSON document in `text`; ValueError when nothing usable is left."""
+    text = strip_fences(text)
+    start = min((p for p in (text.find("{"), text.find("[")) if p >= 0), default=-1)
+    if start < 0:
+        raise ValueError("No JSON document in the response")
+    try:
+        value, end = json.JSONDecoder().raw_decode(text, start)
+        return ParseResult(value, repaired=start > 0 or bool(text[end:].strip()))
+    except ValueError:
+        pass
+    fixed, truncated, dropped = repair(text[start:])
+    return ParseResult(json.loads(fixed), repaired=True, truncated=truncated, dropped=dropped)
+
+
+def _conform(value, schema, path):
+    kind = str(schema.get("type", "")).upper()
+    if kind == "OBJECT":
+        if not isinstance(value, dict):
+            raise ValueError(f"{path}: expected an object")
+        dropped = 0
+        required = schema.get("required", ())
+        for key, subschema in schema.get("properties", {}).items():
+            if key in value and value[key] is not None:
+                value[key], n = _conform(value[key], subschema, f"{path}.{key}")
+                dropped += n
+            elif key in required:
+                if str(subschema.get("type", "")).upper() != "ARRAY":
+                    raise ValueError(f"{path}.{key}: missing")
+                value[key] = [] # A list cut off before it started is just empty
+        return value, dropped
+    if kind == "ARRAY":
+        if not isinstance(value, list):
+            raise ValueError(f"{path}: expected a list")
+        kept, dropped = [], 0
+        for item in value:
+            try:
+                item, n = _conform(item, schema.get("items", {}), f"{path}[]")
+            except ValueError:
+                dropped += 1
+                continue
+            kept.append(item)
+            dropped += n
+        return kept, dropped
+    if kind == "STRING":
+        if isinstance(value, (dict, list)):
+            raise ValueError(f"{path}: expected text")
+        return str(value), 0
+    if kind == "BOOLEAN":
+        if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+            return value.strip().lower() == "true", 0
+        if not isinstance(value, bool):
+            raise ValueError(f"{path}: expected true/false")
+    return value, 0
+
+
+def conform(value, schema):
+    """
+    Checks `value` against a Gemini response schema (type/properties/required/items).
+    Array items that don't fit are dropped and a missing required list becomes [];
+    anything else that doesn't fit raises ValueError. Returns (value, dropped_items).
+    """
+    return _conform(value, schema, "response")
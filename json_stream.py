@@ -0,0 +1,70 @@
+"""
+Incremental extraction of array items from a JSON document that arrives in chunks.
+
+Used to render reviewer candidates while Gemini is still streaming the
+`{"internal_matches": [...], "external_suggestions": [...]}` response: every
+object inside a top-level array is emitted as soon as its closing brace arrives.
+"""
+import json
+
+
+class ArrayItemStream:
+    """
+    Feed text chunks with `feed()`; it returns the `(array_key, item)` pairs
+    completed by that chunk. Anything before the first '{' (e.g. a ```json
+    fence) is ignored. Items that fail to parse are skipped; the final full
+    response is still parsed normally by the caller.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_string = None # Most recent string at depth 1, i.e. the current key
+        self.array_key = None
+        self.item_start = None
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        completed = []
+        buf = self.buffer
+        for i in range(self.pos, len(buf)):
+            c = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self.last_string = buf[self.string_start + 1:i]
+                continue
+
+            if c == '"':
+                if self.depth > 0:
+                    self.in_string = True
+                    self.string_start = i
+            elif c in "{[":
+                if self.depth == 0 and c != "{":
+                    continue # Only a top-level object is expected
+                self.depth += 1
+                if self.depth == 2 and c == "[":
+                    self.array_key = self.last_string
+                elif self.depth == 3 and c == "{" and self.array_key is not None:
+                    self.item_start = i
+            elif c in "}]" and self.depth > 0:
+                if self.depth == 3 and c == "}" and self.item_start is not None:
+                    try:
+                        completed.append((self.array_key, json.loads(buf[self.item_start:i + 1])))
+                    except ValueError:
+                        pass
+                    self.item_start = None
+                elif self.depth == 2 and c == "]":
+                    self.array_key = None
+                self.depth -= 1
+        self.pos = len(buf)
+        return completed
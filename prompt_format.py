@@ -0,0 +1,113 @@
+"""
+Compact, token-budgeted serialization of reviewer rows for Gemini prompts.
+
+Instead of `DataFrame.to_string()` (fixed-width padding, every column
+including URLs and emails), only the columns the model needs for matching
+are emitted as pipe-delimited lines with short row IDs (R1, R2, ...). The IDs
+map back to the full records, so fields left out of the prompt (email,
+Scholar/ORCID links) can be restored on the model's answer.
+"""
+import math
+from dataclasses import dataclass, field
+
+# (output header, accepted sheet headers) in prompt order
+PROMPT_COLUMNS = [
+    ("Nombre", ("Nombre",)),
+    ("Apellidos", ("Apellidos",)),
+    ("Institucion", ("Afiliación institucional", "Afiliación", "Institucion")),
+    ("Pais", ("País", "Pais")),
+    ("Temas", ("Temas",)),
+    ("Metodologia", ("Metodología", "Metodologia")), # Sheet column, or the tag inferred by `facets`
+]
+
+# Full-record fields copied back onto internal matches: (sheet header, result key)
+RESTORED_FIELDS = [
+    ("Correo electrónico", "Correo"),
+    ("País", "País"),
+    ("Google Scholar", "Scholar"),
+    ("OrcId", "OrcId"),
+]
+
+DEFAULT_TOKEN_BUDGET = 12000
+DEFAULT_MAX_FIELD_CHARS = 300
+CHARS_PER_TOKEN = 4 # Rough average for Spanish/English text; a heuristic, not a tokenizer
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _clean(value, max_chars):
+    text = " ".join(str(value).replace("|", "/").split())
+    if text.lower() in ("nan", "none"):
+        return ""
+    return text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+
+
+@dataclass
+class SerializedReviewers:
+    text: str
+    id_map: dict = field(default_factory=dict) # "R1" -> index label in the source frame
+    total_rows: int = 0
+    included_rows: int = 0
+    estimated_tokens: int = 0
+
+    @property
+    def truncated(self):
+        return self.included_rows < self.total_rows
+
+
+def serialize_reviewers(df, token_budget=DEFAULT_TOKEN_BUDGET, max_field_chars=DEFAULT_MAX_FIELD_CHARS):
+    """
+    Serializes `df` (best candidates first) as `ID|Nombre|...` lines.
+    Rows are added in order until the next one would exceed `token_budget`,
+    so the same input always yields the same prompt. A budget of 0/None
+    disables truncation.
+    """
+    sources = []
+    for header, candidates in PROMPT_COLUMNS:
+        column = next((c for c in candidates if c in df.columns), None)
+        if column is not None:
+            sources.append((header, column))
+
+    lines = ["ID|" + "|".join(header for header, _ in sources)]
+    used = estimate_tokens(lines[0]) + 1
+    id_map = {}
+    columns = [df[column].tolist() for _, column in sources]
+
+    for position, (label, values) in enumerate(zip(df.index, zip(*columns)), start=1):
+        row_id = f"R{position}"
+        line = row_id + "|" + "|".join(_clean(v, max_field_chars) for v in values)
+        cost = estimate_tokens(line) + 1
+        if token_budget and used + cost > token_budget:
+            break
+        lines.append(line)
+        id_map[row_id] = label
+        used += cost
+
+    text = "\n".join(lines)
+    return SerializedReviewers(
+        text=text,
+        id_map=id_map,
+        total_rows=len(df),
+        included_rows=len(id_map),
+        estimated_tokens=estimate_tokens(text),
+    )
+
+
+def restore_full_records(results, df, id_map):
+    """
+    Replaces the short row IDs on `internal_matches` with the fields that
+    were left out of the prompt (email, links), taken from the full rows.
+    """
+    for match in (results or {}).get("internal_matches", []) or []:
+        if not isinstance(match, dict):
+            continue
+        label = id_map.get(str(match.pop("ID", "")).strip())
+        if label is None:
+            continue
+        row = df.loc[label]
+        for column, key in RESTORED_FIELDS:
+            if column in row.index and str(row[column]).strip() and not match.get(key):
+                match[key] = row[column]
+    return results
@@ -0,0 +1,176 @@
+"""
+Process-wide adaptive rate limiting for Gemini calls.
+
+Each model gets a token bucket (requests per minute) plus a concurrency cap,
+shared by every Streamlit session and worker thread in the process. Callers
+wait for a permit in a bounded queue instead of firing requests and burning
+retries on 429s. When the API does answer 429, the whole model is paused for
+the server's `Retry-After`/`retryDelay` hint (or a jittered exponential
+backoff) and its rate is halved, then recovers gradually on success.
+"""
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+DEFAULT_RATE_PER_MIN = 30
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_QUEUE = 16
+BACKOFF_BASE = 4 # seconds
+BACKOFF_CAP = 60
+
+
+class QueueFullError(Exception):
+    """Too many callers are already waiting for this model."""
+
+
+class ModelLimiter:
+    """Token bucket + concurrency limit for one model, with AIMD rate adaptation."""
+
+    def __init__(self, rate_per_min=DEFAULT_RATE_PER_MIN, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 max_queue=DEFAULT_MAX_QUEUE):
+        self.max_rate = rate_per_min / 60.0
+        self.min_rate = self.max_rate / 8
+        self.rate = self.max_rate
+        self.capacity = max(1, max_concurrency)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiting = 0
+        self.blocked_until = 0.0
+        self.strikes = 0 # Consecutive 429s
+        self.cond = threading.Condition()
+
+    def _refill(self, now):
+        if now <= self.updated: # Paused by throttled(): nothing accrues until the pause ends
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def estimate_wait(self):
+        """Rough seconds until a new caller would get a permit."""
+        with self.cond:
+            now = time.monotonic()
+            self._refill(now)
+            backlog = max(0.0, self.waiting + 1 - self.tokens)
+            return max(0.0, self.blocked_until - now) + backlog / self.rate
+
+    def acquire(self, timeout):
+        """Blocks until a permit is available. Returns seconds waited."""
+        started = time.monotonic()
+        deadline = started + timeout
+        with self.cond:
+            if self.waiting >= self.max_queue:
+                raise QueueFullError(f"{self.waiting} requests already queued")
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if now >= self.blocked_until and self.tokens >= 1 and self.in_flight < self.max_concurrency:
+                        self.tokens -= 1
+                        self.in_flight += 1
+                        return now - started
+                    if now >= deadline:
+                        raise TimeoutError(f"No permit within {timeout:.0f}s")
+                    needed = max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.05)
+                    # Woken early by release()/throttled() when the situation changes
+                    self.cond.wait(min(needed, deadline - now))
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+    def succeeded(self):
+        """Additive increase back towards the configured rate."""
+        with self.cond:
+            self.strikes = 0
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+    def throttled(self, retry_after=None):
+        """
+        Records a 429: halves the rate and pauses the model for everyone.
+        A single probe request is allowed when the pause ends.
+        Returns the pause in seconds (server hint if given, else jittered backoff).
+        """
+        with self.cond:
+            self.strikes += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                delay = retry_after + random.uniform(0, 0.2 * retry_after + 0.5)
+            else:
+                ceiling = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (self.strikes - 1))
+                delay = ceiling / 2 + random.uniform(0, ceiling / 2) # "Equal jitter"
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self.tokens = 1.0
+            self.updated = self.blocked_until
+            self.cond.notify_all()
+            return delay
+
+    @contextmanager
+    def permit(self, timeout):
+        waited = self.acquire(timeout)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+
+_lock = threading.Lock()
+_limiters = {}
+_config = {
+    "rate_per_min": DEFAULT_RATE_PER_MIN,
+    "max_concurrency": DEFAULT_MAX_CONCURRENCY,
+    "max_queue": DEFAULT_MAX_QUEUE,
+}
+
+
+def configure(**settings):
+    """Sets defaults for limiters created from now on (rate_per_min, max_concurrency, max_queue)."""
+    with _lock:
+        _config.update({k: v for k, v in settings.items() if v is not None})
+
+
+def get_limiter(model_name):
+    with _lock:
+        limiter = _limiters.get(model_name)
+        if limiter is None:
+            limiter = _limiters[model_name] = ModelLimiter(**_config)
+        return limiter
+
+
+def parse_retry_after(response):
+    """
+    Server hint in seconds from a 429 response: the `Retry-After` header
+    (seconds or HTTP date) or Gemini's `RetryInfo.retryDelay` ("27s") in the body.
+    """
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    try:
+        for detail in response.json().get("error", {}).get("details", []):
+            match = re.match(r"([\d.]+)s$", str(detail.get("retryDelay", "")))
+            if match:
+                return float(match.group(1))
+    except (ValueError, AttributeError):
+        pass
+    return None
+
+
+def backoff_delay(attempt):
+    """Jittered exponential delay for non-429 errors (attempt starts at 1)."""
+    ceiling = min(BACKOFF_CAP, 2 ** attempt)
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
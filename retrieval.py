@@ -0,0 +1,177 @@
+"""
+Local lexical retrieval over the EVALUADORES sheet.
+
+A small BM25 index is built once per sheet load and used to shortlist the
+reviewers most related to an article, so only the top-K candidates are sent to
+Gemini instead of the whole database.
+"""
+import hashlib
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+# Columns indexed per reviewer, with the weight each field's terms receive.
+# Several header spellings are accepted because the sheet has changed over time.
+FIELD_WEIGHTS = {
+    "Temas": 3,
+    "Afiliación institucional": 1,
+    "Afiliación": 1,
+    "Institucion": 1,
+    "Nombre": 1,
+    "Apellidos": 1,
+}
+
+# Short Spanish/English function words that carry no topical signal
+STOPWORDS = set("""
+a al ante bajo con contra de del desde durante e el en entre hacia hasta la las lo los
+mediante o para por segun sin sobre su sus tras u un una unas unos y que se como mas
+es son ser este esta estos estas ese esa esos esas otro otra otros otras
+the of and or in on for to with from by an at as is are be this that these those
+its their into using use based study analysis case evidence
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_text(text):
+    """Lowercase and strip accents so 'Economía' and 'economia' match."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return text.lower()
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(normalize_text(text)) if len(t) > 1 and t not in STOPWORDS]
+
+
+def build_query(target_article_context):
+    """
+    Turns the TITLE/KEYWORDS/ABSTRACT context string into query terms.
+    Title and keywords are repeated so they weigh more than the abstract;
+    the LINK line is ignored.
+    """
+    sections = {}
+    current = None
+    for line in str(target_article_context).splitlines():
+        match = re.match(r"\s*(TITLE|KEYWORDS|ABSTRACT|LINK):\s*(.*)", line)
+        if match:
+            current = match.group(1)
+            sections[current] = match.group(2)
+        elif current:
+            sections[current] += " " + line
+
+    if not sections:
+        return tokenize(target_article_context)
+
+    title = tokenize(sections.get("TITLE", ""))
+    keywords = tokenize(sections.get("KEYWORDS", ""))
+    abstract = tokenize(sections.get("ABSTRACT", ""))
+    return title * 2 + keywords * 2 + abstract
+
+
+def dataset_fingerprint(df):
+    """'<rows>-<content hash>' of a reviewer frame: a short, stable cache key for anything derived from it."""
+    row_hashes = pd.util.hash_pandas_object(df, index=False).values
+    return f"{len(df)}-{hashlib.blake2b(row_hashes.tobytes(), digest_size=8).hexdigest()}"
+
+
+class ReviewerIndex:
+    """
+    BM25 index over the reviewer DataFrame returned by `load_evaluadores`.
+    The index keeps a reference to the frame it was built from so shortlisted
+    rows always line up with the scores, and that frame's `fingerprint`.
+    `facets` is left for the caller to attach (a `facets.ReviewerFacets` of
+    `df`, built alongside the index so both are cached together).
+    """
+
+    def __init__(self, df, k1=1.5, b=0.75):
+        self.df = df.reset_index(drop=True)
+        self.fingerprint = dataset_fingerprint(self.df)
+        self.facets = None
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)  # term -> [(doc_id, tf)]
+        self.doc_len = []
+
+        fields = [c for c in FIELD_WEIGHTS if c in self.df.columns]
+        columns = [self.df[c].astype(str).tolist() for c in fields]
+        weights = [FIELD_WEIGHTS[c] for c in fields]
+
+        for doc_id, values in enumerate(zip(*columns)):
+            tf = Counter()
+            for value, weight in zip(values, weights):
+                for term in tokenize(value):
+                    tf[term] += weight
+            for term, count in tf.items():
+                self.postings[term].append((doc_id, count))
+            self.doc_len.append(sum(tf.values()))
+
+        self.n_docs = len(self.doc_len)
+        self.avg_len = (sum(self.doc_len) / self.n_docs) if self.n_docs else 0.0
+        self.idf = {
+            term: math.log(1 + (self.n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def __len__(self):
+        return self.n_docs
+
+    def score(self, query_terms):
+        """Returns {doc_id: bm25 score} for documents sharing at least one term."""
+        scores = defaultdict(float)
+        avg_len = self.avg_len or 1.0
+        for term, qtf in Counter(query_terms).items():
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] += qtf * idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def top_k(self, target_article_context, k, allowed=None, boost=None):
+        """
+        Returns the `k` best-matching reviewer rows, best first.
+        If nothing matches lexically the first `k` rows are returned so Gemini
+        still receives some candidates to reason about.
+        `allowed` (boolean array per row) restricts the candidates and `boost`
+        (float array per row) multiplies their scores; see `_masked_top_k`.
+        """
+        if allowed is not None or boost is not None:
+            return self._masked_top_k(target_article_context, k, allowed, boost)
+        if k is None or k <= 0 or k >= self.n_docs:
+            return self.df
+
+        scores = self.score(build_query(target_article_context))
+        ranked = sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))[:k]
+        if not ranked:
+            ranked = list(range(k))
+        return self.df.iloc[ranked]
+
+    def _masked_top_k(self, target_article_context, k, allowed, boost):
+        """
+        `top_k` over the allowed rows with boosted scores, as array operations.
+        Without a lexical match the fallback rows are the most boosted first.
+        """
+        candidates = np.flatnonzero(allowed) if allowed is not None else np.arange(self.n_docs)
+        if k is None or k <= 0 or k >= len(candidates):
+            return self.df.iloc[candidates]
+
+        scores = self.score(build_query(target_article_context))
+        dense = np.zeros(self.n_docs)
+        if scores:
+            dense[np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))] = np.fromiter(scores.values(), dtype=float, count=len(scores))
+        if boost is not None:
+            dense *= boost
+        matched = candidates[dense[candidates] > 0]
+        if len(matched):
+            ranked = matched[np.lexsort((matched, -dense[matched]))][:k]
+        elif boost is not None:
+            ranked = candidates[np.argsort(-boost[candidates], kind="stable")][:k]
+        else:
+            ranked = candidates[:k]
+        return self.df.iloc[ranked]
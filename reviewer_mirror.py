@@ -0,0 +1,209 @@
+"""
+Local mirror of the EVALUADORES sheet.
+
+The sheet is downloaded once and kept as raw rows (plus a Parquet snapshot on
+disk, so a restarted app doesn't start from zero). Afterwards it is kept in
+sync cheaply:
+
+* Rows written by the app itself are patched into the mirror directly.
+* External changes are detected with the Drive `modifiedTime` of the
+  spreadsheet (one small request, at most every `probe_interval` seconds).
+  When it moved, only the rows past the last known one are fetched; if there
+  are none, an existing row was edited and the sheet is reloaded in full.
+"""
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+from gspread.utils import numericise_all, rowcol_to_a1
+
+SNAPSHOT_META_KEY = b"reviewer_mirror"
+
+
+def _column_letter(n_cols):
+    return rowcol_to_a1(1, max(n_cols, 1)).rstrip("0123456789")
+
+
+def _cell_text(value):
+    """How a value written with append_rows reads back as a formatted cell."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class ReviewerMirror:
+    """
+    Thread-safe mirror of a reviewer worksheet.
+
+    `frame()` returns the table as a DataFrame shaped like `get_all_records()`
+    (numeric-looking cells converted); `version` changes whenever the rows do,
+    so derived structures (the BM25 index) know when to rebuild.
+    """
+
+    def __init__(self, worksheet, snapshot_path=None, probe_interval=60, full_reload_after=6 * 3600):
+        self.worksheet = worksheet
+        self.snapshot_path = snapshot_path
+        self.probe_interval = probe_interval
+        self.full_reload_after = full_reload_after
+        self.headers = []
+        self.rows = []
+        self.modified_time = None
+        self.version = 0
+        self.loaded_at = 0.0
+        self.probed_at = 0.0
+        self._frame = None
+        self._lock = threading.RLock()
+
+    @property
+    def row_count(self):
+        return len(self.rows)
+
+    def _remote_modified_time(self):
+        try:
+            return self.worksheet.spreadsheet.get_lastUpdateTime()
+        except Exception as e:
+            print(f"Could not read modifiedTime of the reviewer sheet: {e}")
+            return None # Unknown: callers fall back to fetching the delta
+
+    def _changed(self):
+        self.version += 1
+        self._frame = None
+
+    def _pad(self, raw_rows):
+        width = len(self.headers)
+        return [(list(raw) + [""] * width)[:width] for raw in raw_rows]
+
+    # --- SYNC ---
+
+    def load(self):
+        """Downloads the whole sheet."""
+        with self._lock:
+            modified_time = self._remote_modified_time()
+            data = self.worksheet.get_all_values()
+            self.headers = list(data[0]) if data else []
+            self.rows = self._pad(data[1:])
+            self.modified_time = modified_time
+            self.loaded_at = self.probed_at = time.time()
+            self._changed()
+            self.save_snapshot()
+            return self.row_count
+
+    def fetch_delta(self):
+        """Fetches only the rows past the last known one. Returns how many were added."""
+        with self._lock:
+            first_row = self.row_count + 2 # Row 1 is the header
+            new_rows = self.worksheet.get_values(f"A{first_row}:{_column_letter(len(self.headers))}")
+            # Blank rows are kept, as load() does, so row_count stays the sheet's row cursor
+            new_rows = self._pad(new_rows)
+            if new_rows:
+                self.rows.extend(new_rows)
+                self._changed()
+            return len(new_rows)
+
+    def sync(self, force=False):
+        """
+        Brings the mirror up to date if the sheet may have changed.
+        Returns "loaded", "delta", "reloaded" or "unchanged".
+        """
+        with self._lock:
+            now = time.time()
+            if not self.loaded_at and self.load_snapshot():
+                self.probed_at = 0.0 # Snapshot may be stale: probe right away
+            if not self.loaded_at or now - self.loaded_at > self.full_reload_after:
+                self.load()
+                return "loaded"
+            if not force and now - self.probed_at < self.probe_interval:
+                return "unchanged"
+
+            self.probed_at = now
+            modified_time = self._remote_modified_time()
+            if modified_time is not None and modified_time == self.modified_time:
+                return "unchanged"
+            added = self.fetch_delta()
+            if added:
+                self.modified_time = modified_time
+                self.save_snapshot()
+                return "delta"
+            if modified_time is None:
+                return "unchanged"
+            self.load() # Timestamp moved but no new rows: an existing row was edited
+            return "reloaded"
+
+    def record_append(self, values, response=None):
+        """
+        Patches rows the app just appended with `append_rows` into the mirror.
+        `response` is the API reply; if its updated range doesn't start where
+        the mirror expects (someone else appended meanwhile), it reloads instead.
+        """
+        with self._lock:
+            if not self.loaded_at:
+                return
+            expected_row = self.row_count + 2
+            updated_range = ((response or {}).get("updates") or {}).get("updatedRange", "")
+            start = updated_range.split("!")[-1].split(":")[0].lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ$")
+            if start.isdigit() and int(start) != expected_row:
+                self.load()
+                return
+            self.rows.extend(self._pad([[_cell_text(v) for v in row] for row in values]))
+            self._changed()
+            # Our own write moved the timestamp; remember it so it doesn't trigger a reload
+            self.modified_time = self._remote_modified_time()
+            self.probed_at = time.time()
+            self.save_snapshot()
+
+    # --- DATA ---
+
+    def frame(self):
+        """The table as a DataFrame (shared, don't modify it in place)."""
+        with self._lock:
+            if self._frame is None:
+                records = [dict(zip(self.headers, numericise_all(row))) for row in self.rows]
+                self._frame = pd.DataFrame(records, columns=self.headers)
+            return self._frame
+
+    # --- SNAPSHOT ---
+
+    def save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            columns = [f"c{i}" for i in range(len(self.headers))] # Sheet headers may repeat or be blank
+            table = pa.Table.from_pydict(
+                {name: [row[i] for row in self.rows] for i, name in enumerate(columns)},
+                schema=pa.schema([(name, pa.string()) for name in columns]),
+            )
+            meta = {"headers": self.headers, "modified_time": self.modified_time, "loaded_at": self.loaded_at}
+            table = table.replace_schema_metadata({SNAPSHOT_META_KEY: json.dumps(meta).encode("utf-8")})
+            os.makedirs(os.path.dirname(os.path.abspath(self.snapshot_path)), exist_ok=True)
+            tmp_path = f"{self.snapshot_path}.tmp"
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            print(f"Could not write reviewer snapshot: {e}") # The mirror still works in memory
+
+    def load_snapshot(self):
+        """Restores rows from the Parquet snapshot. Returns True if one was loaded."""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            import pyarrow.parquet as pq
+
+            table = pq.read_table(self.snapshot_path)
+            meta = json.loads(table.schema.metadata[SNAPSHOT_META_KEY])
+            columns = table.to_pydict()
+            self.headers = meta["headers"]
+            self.rows = [list(row) for row in zip(*columns.values())] if columns else []
+            self.modified_time = meta.get("modified_time")
+            self.loaded_at = meta.get("loaded_at") or time.time()
+            self._changed()
+            return True
+        except Exception as e:
+            print(f"Ignoring unreadable reviewer snapshot: {e}")
+            return False
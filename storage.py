@@ -0,0 +1,393 @@
+"""
+Storage backends for articles and reviewers.
+
+`SheetsBackend` reads and writes the Google Sheets directly (through the local
+ReviewerMirror / ArticleStore caches). `SQLiteBackend` keeps both tables in a
+local SQLite file, indexed by article ID and by reviewer identity (e-mail,
+ORCID, folded name and the dedup blocking keys), so reads and duplicate
+checks never wait on the Sheets API or scan the table. Given a
+`source` (a SheetsBackend) it imports the reviewer table the first time a
+sheet is used and pulls articles it doesn't know yet; pushing new reviewers
+back to Sheets is left to the caller (the write queue).
+
+Once imported, the SQLite copy is the source of truth: edits made directly
+in the sheets (changed reviewer rows, corrected articles) are not picked up.
+Import again by hand after such edits with:
+    python storage.py import [--reviewers] [--articles]
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+from gspread.utils import numericise_all
+
+import clients
+from article_store import ArticleStore
+from dedup import EMAIL_COLUMNS, NAME_THRESHOLD, ORCID_COLUMNS, IdentityMatch, best_name_match, identity_keys
+from reviewer_mirror import ReviewerMirror
+
+
+class StorageBackend:
+    """
+    Interface shared by the backends. `sheet_id` identifies the dataset
+    (the Google Sheet ID, also used as the key in SQLite).
+    """
+
+    name = "base"
+
+    def load_reviewers(self, sheet_id):
+        """Reviewer table as a DataFrame shaped like `get_all_records()`; treat it as read-only."""
+        raise NotImplementedError
+
+    def reviewers_version(self, sheet_id):
+        """Changes whenever the reviewer rows do (for caches of derived indexes)."""
+        raise NotImplementedError
+
+    def append_reviewers(self, sheet_id, rows):
+        """Appends rows (cell values in sheet column order). Raises on failure."""
+        raise NotImplementedError
+
+    def get_article(self, sheet_id, article_id):
+        """Article row as a dict keyed by the normalized headers, or None. LookupError if the table has no ID column."""
+        raise NotImplementedError
+
+    def recent_article_ids(self, sheet_id, n):
+        """IDs of the `n` most recently added articles, newest first."""
+        raise NotImplementedError
+
+
+# --- GOOGLE SHEETS ---
+
+class SheetsBackend(StorageBackend):
+    name = "sheets"
+
+    def __init__(self, get_client, snapshot_dir=None, probe_interval=60):
+        self.get_client = get_client # Callable returning the gspread client or None
+        self.snapshot_dir = snapshot_dir
+        self.probe_interval = probe_interval
+        self.mirrors = {}
+        self.article_stores = {}
+        self._lock = threading.Lock()
+
+    def _client(self):
+        client = self.get_client()
+        if not client:
+            raise ConnectionError("Google Sheets client unavailable")
+        return client
+
+    def mirror(self, sheet_id):
+        """The process-wide EVALUADORES mirror for this sheet (Parquet snapshot between restarts)."""
+        with self._lock:
+            mirror = self.mirrors.get(sheet_id)
+            if mirror is None:
+                # Try explicit names: UPPERCASE (new), CamelCase (old), or the 2nd sheet.
+                worksheet = clients.get_worksheet(self._client(), sheet_id, *clients.EVALUADORES_SHEETS)
+                snapshot_path = os.path.join(self.snapshot_dir, f"evaluadores_{sheet_id}.parquet") if self.snapshot_dir else None
+                mirror = self.mirrors[sheet_id] = ReviewerMirror(worksheet, snapshot_path, probe_interval=self.probe_interval)
+            return mirror
+
+    def article_store(self, sheet_id):
+        with self._lock:
+            store = self.article_stores.get(sheet_id)
+            if store is None:
+                store = self.article_stores[sheet_id] = ArticleStore(
+                    clients.get_worksheet(self._client(), sheet_id, *clients.ARTICULOS_SHEETS)
+                )
+            return store
+
+    def reset(self, sheet_id):
+        """Forgets cached handles for a sheet after an error, so they are re-resolved."""
+        clients.reset_sheets(sheet_id)
+        with self._lock:
+            self.mirrors.pop(sheet_id, None)
+            self.article_stores.pop(sheet_id, None)
+
+    def load_reviewers(self, sheet_id):
+        mirror = self.mirror(sheet_id)
+        mirror.sync()
+        return mirror.frame()
+
+    def reviewers_version(self, sheet_id):
+        return self.mirror(sheet_id).version
+
+    def append_reviewers(self, sheet_id, rows):
+        try:
+            worksheet = clients.get_worksheet(self._client(), sheet_id, *clients.EVALUADORES_SHEETS)
+            response = worksheet.append_rows(rows)
+        except Exception:
+            self.reset(sheet_id)
+            raise
+        with self._lock:
+            mirror = self.mirrors.get(sheet_id)
+        if mirror is not None:
+            mirror.record_append(rows, response)
+
+    def get_article(self, sheet_id, article_id):
+        return self.article_store(sheet_id).get(article_id)
+
+    def recent_article_ids(self, sheet_id, n):
+        return self.article_store(sheet_id).recent_ids(n)
+
+
+# --- SQLITE ---
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviewer_headers (
+    sheet_id TEXT PRIMARY KEY,
+    headers_json TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reviewers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sheet_id TEXT NOT NULL,
+    values_json TEXT NOT NULL,
+    email_norm TEXT NOT NULL DEFAULT '',
+    orcid_norm TEXT NOT NULL DEFAULT '',
+    name_key TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reviewers_sheet ON reviewers (sheet_id, id);
+CREATE INDEX IF NOT EXISTS reviewers_email ON reviewers (sheet_id, email_norm) WHERE email_norm != '';
+CREATE INDEX IF NOT EXISTS reviewers_orcid ON reviewers (sheet_id, orcid_norm) WHERE orcid_norm != '';
+CREATE INDEX IF NOT EXISTS reviewers_name ON reviewers (sheet_id, name_key);
+CREATE TABLE IF NOT EXISTS reviewer_blocks (
+    sheet_id TEXT NOT NULL,
+    block TEXT NOT NULL,
+    reviewer_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reviewer_blocks_key ON reviewer_blocks (sheet_id, block);
+CREATE TABLE IF NOT EXISTS articles (
+    sheet_id TEXT NOT NULL,
+    article_id TEXT NOT NULL,
+    row_json TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (sheet_id, article_id)
+);
+"""
+
+
+class SQLiteBackend(StorageBackend):
+    name = "sqlite"
+
+    def __init__(self, path, source=None):
+        self.path = path
+        self.source = source # Optional SheetsBackend to import from
+        self._frames = {} # sheet_id -> (version, DataFrame)
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _headers(self, conn, sheet_id):
+        row = conn.execute("SELECT headers_json FROM reviewer_headers WHERE sheet_id = ?", (sheet_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _identity(self, headers, values):
+        """dedup.identity_keys of one stored row."""
+        cells = dict(zip(headers, values))
+        email = next((cells[h] for h in EMAIL_COLUMNS if cells.get(h)), "")
+        orcid = next((cells[h] for h in ORCID_COLUMNS if cells.get(h)), "")
+        return identity_keys(cells.get("Nombre", ""), cells.get("Apellidos", ""), email, orcid)
+
+    def _insert(self, conn, sheet_id, headers, rows):
+        now = time.time()
+        width = len(headers)
+        for values in ((["" if v is None else str(v) for v in row] + [""] * width)[:width] for row in rows):
+            email, orcid, name_key, blocks = self._identity(headers, values)
+            row_id = conn.execute(
+                "INSERT INTO reviewers (sheet_id, values_json, email_norm, orcid_norm, name_key, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (sheet_id, json.dumps(values, ensure_ascii=False), email, orcid, name_key, now),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO reviewer_blocks (sheet_id, block, reviewer_id) VALUES (?, ?, ?)",
+                [(sheet_id, block, row_id) for block in blocks],
+            )
+
+    # --- REVIEWERS ---
+
+    def import_reviewers(self, sheet_id):
+        """
+        Replaces this sheet's reviewers with the current contents of the source
+        sheet. Returns the row count. Rows added locally that are still waiting
+        in the write queue would be lost, so `main` refuses to import then.
+        """
+        mirror = self.source.mirror(sheet_id)
+        mirror.sync(force=True)
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM reviewers WHERE sheet_id = ?", (sheet_id,))
+            conn.execute("DELETE FROM reviewer_blocks WHERE sheet_id = ?", (sheet_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO reviewer_headers (sheet_id, headers_json) VALUES (?, ?)",
+                (sheet_id, json.dumps(mirror.headers, ensure_ascii=False)),
+            )
+            self._insert(conn, sheet_id, mirror.headers, mirror.rows)
+            return len(mirror.rows)
+
+    def reviewers_version(self, sheet_id):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM reviewers WHERE sheet_id = ?", (sheet_id,)
+            ).fetchone()
+
+    def load_reviewers(self, sheet_id):
+        with self._lock:
+            with self._connect() as conn:
+                headers = self._headers(conn, sheet_id)
+            if headers is None:
+                if self.source is None:
+                    raise LookupError(f"No reviewers stored for sheet {sheet_id}; run `python storage.py import`")
+                self.import_reviewers(sheet_id)
+            version = self.reviewers_version(sheet_id)
+            cached = self._frames.get(sheet_id)
+            if cached and cached[0] == version:
+                return cached[1]
+            last_id = cached[0][1] if cached else 0
+            with self._connect() as conn:
+                headers = self._headers(conn, sheet_id)
+                rows = conn.execute(
+                    "SELECT values_json FROM reviewers WHERE sheet_id = ? AND id > ? ORDER BY id", (sheet_id, last_id)
+                ).fetchall()
+                if cached and cached[0][0] + len(rows) != version[0]:
+                    # Not a pure append (rows were replaced by an import): rebuild from scratch
+                    rows = conn.execute("SELECT values_json FROM reviewers WHERE sheet_id = ? ORDER BY id", (sheet_id,)).fetchall()
+                    cached = None
+            records = [dict(zip(headers, numericise_all(json.loads(values)))) for (values,) in rows]
+            df = pd.DataFrame(records, columns=headers)
+            if cached:
+                df = pd.concat([cached[1], df], ignore_index=True)
+            self._frames[sheet_id] = (version, df)
+            return df
+
+    def append_reviewers(self, sheet_id, rows):
+        with self._lock:
+            with self._connect() as conn:
+                headers = self._headers(conn, sheet_id)
+            if headers is None:
+                self.load_reviewers(sheet_id) # Import first so the new rows land after the existing ones
+            with self._connect() as conn:
+                self._insert(conn, sheet_id, self._headers(conn, sheet_id), rows)
+
+    def match_reviewers(self, sheet_id, people, threshold=NAME_THRESHOLD):
+        """
+        dedup.IdentityIndex.match through the indexes, for (given, surnames,
+        e-mail, ORCID) tuples: an IdentityMatch (label = row id) or None each.
+        E-mail and ORCID are exact lookups; names are compared only with rows
+        sharing the folded full name or a blocking key.
+        """
+        matches = []
+        with self._connect() as conn:
+            headers = self._headers(conn, sheet_id) or []
+            for given, surnames, email, orcid in people:
+                email, orcid, name_key, blocks = identity_keys(given, surnames, email, orcid)
+                found = None
+                for column, value, reason in (("email_norm", email, "correo"), ("orcid_norm", orcid, "orcid")):
+                    row = conn.execute(
+                        f"SELECT id, values_json FROM reviewers WHERE sheet_id = ? AND {column} = ? ORDER BY id LIMIT 1",
+                        (sheet_id, value),
+                    ).fetchone() if value else None
+                    if row:
+                        cells = dict(zip(headers, json.loads(row[1])))
+                        found = IdentityMatch(row[0], reason, 1.0, f"{cells.get('Nombre', '')} {cells.get('Apellidos', '')}".strip())
+                        break
+                if found is None and (name_key or blocks):
+                    placeholders = ", ".join("?" * len(blocks))
+                    rows = conn.execute(
+                        "SELECT id, values_json FROM reviewers WHERE sheet_id = ? AND (name_key = ? OR id IN "
+                        f"(SELECT reviewer_id FROM reviewer_blocks WHERE sheet_id = ? AND block IN ({placeholders}))) ORDER BY id",
+                        (sheet_id, name_key, sheet_id, *blocks),
+                    ).fetchall()
+                    candidates = []
+                    for row_id, values in rows:
+                        cells = dict(zip(headers, json.loads(values)))
+                        candidates.append((row_id, str(cells.get("Nombre", "")), str(cells.get("Apellidos", ""))))
+                    found = best_name_match(given, surnames, candidates, threshold)
+                matches.append(found)
+        return matches
+
+    # --- ARTICLES ---
+
+    def import_articles(self, sheet_id):
+        """Copies every article of the source sheet (first occurrence of an ID wins). Returns how many."""
+        store = self.source.article_store(sheet_id)
+        store.load()
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO articles (sheet_id, article_id, row_json, updated_at) VALUES (?, ?, ?, ?)",
+                [(sheet_id, article_id, json.dumps(row, ensure_ascii=False), now) for article_id, row in store.index.items()],
+            )
+        return len(store.index)
+
+    def get_article(self, sheet_id, article_id):
+        key = str(article_id).strip()
+        with self._connect() as conn:
+            row = conn.execute("SELECT row_json FROM articles WHERE sheet_id = ? AND article_id = ?", (sheet_id, key)).fetchone()
+        if row:
+            return json.loads(row[0])
+        if self.source is None:
+            return None
+        # Unknown here (e.g. a new submission): ask the sheet and keep a copy
+        found = self.source.get_article(sheet_id, key)
+        if found is not None:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO articles (sheet_id, article_id, row_json, updated_at) VALUES (?, ?, ?, ?)",
+                    (sheet_id, key, json.dumps(found, ensure_ascii=False), time.time()),
+                )
+        return found
+
+    def recent_article_ids(self, sheet_id, n):
+        if self.source is not None: # The sheet's order is the submission order
+            return self.source.recent_article_ids(sheet_id, n)
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT article_id FROM articles WHERE sheet_id = ? ORDER BY rowid DESC LIMIT ?", (sheet_id, n)
+            )]
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Importa las hojas de Google a la base SQLite local.")
+    parser.add_argument("command", choices=["import"])
+    parser.add_argument("--reviewers", action="store_true", help="Solo EVALUADORES")
+    parser.add_argument("--articles", action="store_true", help="Solo APUNTES")
+    args = parser.parse_args(argv)
+    both = not (args.reviewers or args.articles)
+
+    from core import get_secret, get_storage, get_write_queue
+
+    storage = get_storage()
+    if not isinstance(storage, SQLiteBackend):
+        print("STORAGE_BACKEND is not 'sqlite'; nothing to import", file=sys.stderr)
+        return 1
+    if both or args.reviewers:
+        sheet_id = get_secret("SHEET_ID_EVALUADORES")
+        write_queue = get_write_queue()
+        unsent = write_queue.unsent(sheet_id) if write_queue else 0
+        if unsent:
+            print(f"{unsent} reviewer rows are still waiting to be written to Sheets; import again once the queue is empty "
+                  "(retry failed rows from the admin panel)", file=sys.stderr)
+            return 1
+        print(f"Imported {storage.import_reviewers(sheet_id)} reviewers")
+    if both or args.articles:
+        print(f"Imported {storage.import_articles(get_secret('SHEET_ID_ARTICULOS'))} articles")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Tests for the app's fragments: submitting the add-reviewers form (a fragment
+nested in the results fragment) reruns only that form, not the whole script.
+
+Streamlit's AppTest only does whole-script runs, so fragment reruns are
+requested the way the browser does it, by passing a fragment id in the
+rerun data.
+
+    python -m pytest -q
+"""
+import os
+
+import pytest
+from streamlit.runtime.scriptrunner_utils.script_requests import RerunData
+from streamlit.testing.v1 import AppTest
+import streamlit.testing.v1.local_script_runner as local_script_runner
+
+import clients
+import core
+import fake_sheets
+import tracing
+from gemini_stub import start_stub_server
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("WARMUP", "0")
+    # Absolute paths: the write queue's worker thread outlives the test's working directory
+    for name, file_name in (("GEMINI_CACHE_PATH", "responses.sqlite3"), ("SHEETS_WRITE_QUEUE_PATH", "write_queue.sqlite3"),
+                            ("AUTHOR_PROFILE_PATH", "author_profiles.sqlite3")):
+        monkeypatch.setenv(name, str(tmp_path / file_name))
+    monkeypatch.setenv("REVIEWER_SNAPSHOT_DIR", str(tmp_path))
+    server, base_url = start_stub_server()
+    monkeypatch.setattr(core, "GEMINI_API_BASE", base_url)
+    for name in ("_response_cache", "_context_cache", "_storage", "_sheets_backend", "_author_profiles", "_write_queue"):
+        monkeypatch.setattr(core, name, None) # Singletons built under tmp_path
+    client = fake_sheets.make_client([30], n_articles=5)
+    monkeypatch.setattr(clients, "_sheets_client", client)
+
+    fragment_ids = []
+    def rerun_data(**kwargs):
+        if fragment_ids:
+            kwargs.update(fragment_id=fragment_ids[0], fragment_id_queue=list(fragment_ids), is_fragment_scoped_rerun=True)
+        return RerunData(**kwargs)
+    monkeypatch.setattr(local_script_runner, "RerunData", rerun_data)
+
+    at = AppTest.from_file(os.path.join(os.path.dirname(core.__file__), "app.py"), default_timeout=60)
+    at.secrets["SHEET_ID_ARTICULOS"] = "articulos"
+    at.secrets["SHEET_ID_EVALUADORES"] = "eval-30"
+    at.secrets["GEMINI_API_KEY"] = "test"
+    at.session_state["authenticated"] = True
+    at.run()
+    at.sidebar.text_input[0].set_value(fake_sheets.generate_articles(1)[0][0]).run()
+    at.sidebar.button[0].click().run()
+    yield at, fragment_ids
+    server.shutdown()
+
+
+def ui_spans():
+    return {name: stats["count"] for name, stats in tracing.get_tracer().summary().items() if name.startswith("ui.")}
+
+
+def test_add_form_submit_reruns_only_its_fragment(app):
+    at, fragment_ids = app
+    assert not at.exception
+    boxes = [box for box in at.checkbox if box.key and box.key.startswith("select_") and not box.disabled]
+    assert boxes, "the search should suggest external reviewers"
+    storage = at._fragment_storage
+
+    # The add form is the fragment whose own rerun draws only ui.add_form
+    add_form_id = None
+    for fragment_id in list(storage._fragments):
+        tracing.get_tracer().spans.clear()
+        fragment_ids[:] = [fragment_id]
+        at.run()
+        fragment_ids[:] = []
+        if ui_spans() == {"ui.add_form": 1}:
+            add_form_id = fragment_id
+            break
+    assert add_form_id is not None
+    assert storage._parent_by_id.get(add_form_id) in storage._fragments # Nested in the results fragment
+
+    boxes = [box for box in at.checkbox if box.key and box.key.startswith("select_") and not box.disabled]
+    boxes[0].check()
+    next(button for button in at.button if button.label.startswith("➕")).click()
+    tracing.get_tracer().spans.clear()
+    fragment_ids[:] = [add_form_id]
+    at.run()
+    fragment_ids[:] = []
+    assert not at.exception
+    assert ui_spans() == {"ui.add_form": 1} # No ui.script: the rest of the page was not rerun
+    assert any("en cola" in message.value for message in at.success)
@@ -0,0 +1,46 @@
+"""
+Tests for `author_profiles`: splitting the Autores cell and the single-fetch profile store.
+
+    python -m pytest -q
+"""
+import threading
+import time
+
+from author_profiles import AuthorProfileStore, split_authors
+
+
+def test_split_authors_handles_separators_conjunctions_and_affiliations():
+    assert split_authors("Ana Pérez (UNAM); Luis Gómez y María Ruiz") == ["Ana Pérez", "Luis Gómez", "María Ruiz"]
+    assert split_authors("Pérez, Ana") == ["Pérez, Ana"]
+    assert split_authors("José Ortega y Gasset") == ["José Ortega y Gasset"]
+    assert split_authors("ANA PÉREZ; Ana Perez") == ["ANA PÉREZ"]
+
+
+def test_concurrent_callers_share_one_fetch(tmp_path):
+    store = AuthorProfileStore(str(tmp_path / "profiles.sqlite3"))
+    calls = []
+    def fetch(name):
+        calls.append(name)
+        time.sleep(0.1)
+        return {"role_and_institution": "Profesora, UNAM"}
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.get_or_fetch("Ana Pérez", "flash", fetch))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == ["Ana Pérez"]
+    assert results == [{"role_and_institution": "Profesora, UNAM"}] * 4
+
+
+def test_fetch_locks_are_released_once_done(tmp_path):
+    store = AuthorProfileStore(str(tmp_path / "profiles.sqlite3"))
+    names = [f"{given} {surname}" for given in ("Ana", "Luis", "Rosa", "Jorge") for surname in ("Pérez", "Gómez", "Díaz")]
+    for name in names:
+        store.get_or_fetch(name, "flash", lambda name: {"name": name})
+    try:
+        store.get_or_fetch("Elena Ruiz", "flash", lambda name: 1 / 0)
+    except ZeroDivisionError:
+        pass
+    assert store._fetching == {}
+    assert store.get_or_fetch("Rosa Díaz", "flash", lambda name: None) == {"name": "Rosa Díaz"}
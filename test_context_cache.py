@@ -0,0 +1,97 @@
+"""
+Tests for `ContextCacheRegistry`: prefix kinds, per-prefix uploads and invalidation.
+
+    python -m pytest -q
+"""
+import threading
+import time
+
+from context_cache import ContextCacheRegistry
+
+
+class FakeResponse:
+    def __init__(self, status, body):
+        self.status_code = status
+        self.body = body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    def __init__(self, delay=0.0, min_chars=0):
+        self.delay = delay
+        self.min_chars = min_chars
+        self.created = [] # request bodies
+        self.deleted = []
+        self._lock = threading.Lock()
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        time.sleep(self.delay)
+        size = len(str(json))
+        with self._lock:
+            self.created.append(json)
+            name = f"cachedContents/{len(self.created)}"
+        if size < self.min_chars:
+            return FakeResponse(400, {})
+        return FakeResponse(200, {"name": name})
+
+    def delete(self, url, headers=None, timeout=None):
+        self.deleted.append(url.rsplit("/", 2)[-2] + "/" + url.rsplit("/", 1)[-1])
+
+
+def test_instruction_only_prefix_is_cached_without_contents():
+    session, registry = FakeSession(), ContextCacheRegistry("http://api")
+    name = registry.get_or_create(session, "k", "flash", "INSTRUCTION", "")
+    assert name == "cachedContents/1"
+    assert "contents" not in session.created[0]
+    assert registry.get_or_create(session, "k", "flash", "INSTRUCTION", "") == name
+    assert len(session.created) == 1
+
+
+def test_shortlist_and_database_prefixes_do_not_evict_each_other():
+    session, registry = FakeSession(), ContextCacheRegistry("http://api")
+    instruction_only = registry.get_or_create(session, "k", "flash", "INSTRUCTION", "")
+    with_database = registry.get_or_create(session, "k", "flash", "INSTRUCTION", "DB v1")
+    assert registry.get_or_create(session, "k", "flash", "INSTRUCTION", "") == instruction_only
+    assert session.deleted == []
+    # New data replaces only the database entry
+    assert registry.get_or_create(session, "k", "flash", "INSTRUCTION", "DB v2") != with_database
+    assert session.deleted == [with_database]
+
+
+def test_invalidate_all_keeps_the_instruction_only_entry():
+    session, registry = FakeSession(), ContextCacheRegistry("http://api")
+    instruction_only = registry.get_or_create(session, "k", "flash", "INSTRUCTION", "")
+    with_database = registry.get_or_create(session, "k", "flash", "INSTRUCTION", "DB")
+    registry.invalidate_all(session)
+    assert session.deleted == [with_database]
+    assert registry.get_or_create(session, "k", "flash", "INSTRUCTION", "") == instruction_only
+
+
+def test_concurrent_requests_upload_a_prefix_once():
+    session, registry = FakeSession(delay=0.2), ContextCacheRegistry("http://api")
+    names = []
+    threads = [
+        threading.Thread(target=lambda model=model: names.append(registry.get_or_create(session, "k", model, "I", "")))
+        for model in ("flash", "flash", "flash", "pro")
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(body["model"] for body in session.created) == ["models/flash", "models/pro"]
+    assert time.monotonic() - started < 0.35 # The two uploads ran side by side
+    assert None not in names
+
+
+def test_rejected_prefix_is_not_retried_until_the_negative_ttl():
+    session, registry = FakeSession(min_chars=10_000), ContextCacheRegistry("http://api")
+    assert registry.get_or_create(session, "k", "flash", "I", "") is None
+    assert registry.get_or_create(session, "k", "flash", "I", "") is None
+    assert len(session.created) == 1
@@ -0,0 +1,62 @@
+"""
+Tests for the reviewer identity matching in `dedup`.
+
+    python -m pytest -q
+"""
+import pandas as pd
+
+from dedup import (IdentityIndex, blocking_keys, find_duplicate_groups, name_similarity, normalize_email,
+                   normalize_name, normalize_orcid)
+
+
+def registered():
+    return pd.DataFrame({
+        "Nombre": ["María José", "Luis", "Jorge"],
+        "Apellidos": ["Pérez Gómez", "Rodríguez", "Castillo"],
+        "Correo electrónico": ["mjperez@uni.edu", "", "jc@uni.edu"],
+        "OrcId": ["", "https://orcid.org/0000-0002-1825-0097", "https://orcid.org/orcid-search/search?searchQuery=Jorge"],
+    })
+
+
+def test_normalizers():
+    assert normalize_name("  José-Luis  Pérez ") == "jose luis perez"
+    assert normalize_email(" Ana@Uni.EDU ") == "ana@uni.edu"
+    assert normalize_email("sin correo") == ""
+    assert normalize_orcid("https://orcid.org/0000-0002-1825-009x") == "0000-0002-1825-009X"
+    assert normalize_orcid("https://orcid.org/orcid-search/search?searchQuery=Ana") == ""
+
+
+def test_blocking_keys_pair_the_initial_with_surname_prefixes():
+    assert blocking_keys("María José", "Pérez Gómez") == {"m|pere", "m|gome"}
+    assert blocking_keys("María Pérez", "") == {"m|pere"} # Whole name in one field
+    assert blocking_keys("", "Pérez") == set()
+
+
+def test_name_similarity():
+    assert name_similarity("María José", "Pérez", "Maria Jose", "Pérez Gómez") == 1.0 # Missing second surname
+    assert name_similarity("María", "Pérez", "Mario", "Pérez") == 0.0
+    assert name_similarity("Luis", "Rodríguez", "Luis", "Rodrigues") > 0.88
+
+
+def test_match_by_email_orcid_then_name():
+    index = IdentityIndex(registered())
+    assert index.match("Otra", "Persona", "MJPEREZ@uni.edu").reason == "correo"
+    found = index.match("", "", orcid="0000-0002-1825-0097")
+    assert (found.reason, found.label, found.name) == ("orcid", 1, "Luis Rodríguez")
+    assert index.match("Maria Jose", "Perez").reason == "nombre"
+    assert index.match("Jorge", "Castro") is None
+    # An ORCID search link is not an iD
+    assert index.match("", "", orcid="https://orcid.org/orcid-search/search?searchQuery=Jorge") is None
+
+
+def test_exclude_skips_the_row_itself():
+    index = IdentityIndex(registered())
+    assert index.match("Luis", "Rodríguez", exclude=1) is None
+
+
+def test_find_duplicate_groups():
+    df = pd.concat([registered(), pd.DataFrame({
+        "Nombre": ["Maria Jose", "Luis"], "Apellidos": ["Perez", "Rodrigues"],
+        "Correo electrónico": ["", ""], "OrcId": ["", ""],
+    })], ignore_index=True)
+    assert find_duplicate_groups(df) == [[0, 3], [1, 4]]
@@ -0,0 +1,55 @@
+"""
+Tests for the conflict-of-interest masks in `facets`.
+
+    python -m pytest -q
+"""
+import pandas as pd
+
+from facets import ReviewerFacets, acronym, institution_names, record_conflicts
+
+
+def test_record_conflicts_matches_authors_and_their_institutions():
+    records = [
+        {"Nombre": "Ana", "Apellidos": "Pérez", "Institucion": "UNAM"},
+        {"Nombre": "Rosa", "Apellidos": "Díaz", "Afiliación": "UBA"},
+        {"Nombre": "Luis", "Apellidos": "Gómez", "Institucion": "Universidad de Chile"},
+    ]
+    mask = record_conflicts(records, ("Ana Pérez",), ("Profesor, UBA",))
+    assert mask.tolist() == [True, True, False]
+
+
+def test_record_conflicts_of_no_records_is_empty():
+    assert record_conflicts([], ("Ana Pérez",), ("UBA",)).tolist() == []
+
+
+def facets_for(institutions):
+    return ReviewerFacets(pd.DataFrame({
+        "Nombre": [f"R{i}" for i in range(len(institutions))],
+        "Apellidos": ["X"] * len(institutions),
+        "Afiliación institucional": institutions,
+    }))
+
+
+def test_generic_institution_names_are_not_conflicts():
+    facets = facets_for(["Universidad", "Instituto", "Universidad de Chile", ""])
+    mask = facets.conflicts((), ("Profesor Asociado, Universidad de Chile",))
+    assert mask.tolist() == [False, False, True, False]
+
+
+def test_institution_must_match_as_a_whole_name():
+    facets = facets_for(["Chile", "Universidad Católica", "Pontificia Universidad Católica de Chile"])
+    mask = facets.conflicts((), ("Universidad de Chile",))
+    assert mask.tolist() == [False, False, False]
+
+
+def test_acronym_matches_the_spelled_out_name():
+    facets = facets_for(["UNAM", "Universidad Nacional Autónoma de México", "UBA", "Universidad Autónoma Metropolitana"])
+    assert facets.conflicts((), ("Universidad Nacional Autónoma de México",)).tolist() == [True, True, False, False]
+    assert facets.conflicts((), ("Investigadora (UNAM)",)).tolist() == [True, True, False, False]
+
+
+def test_institution_names_drop_roles_and_generic_parts():
+    assert institution_names("Profesor Asociado, Universidad de Chile; UNAM") == {"universidad de chile", "unam"}
+    assert institution_names("Universidad / Facultad de Economía") == {"facultad de economia"}
+    assert acronym("universidad nacional autonoma de mexico") == "unam"
+    assert acronym("universidad de chile") == ""
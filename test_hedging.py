@@ -0,0 +1,48 @@
+"""
+Tests for `HedgePolicy`: when the fallback model is called, and how that is counted.
+
+    python -m pytest -q
+"""
+import time
+
+from hedging import HedgePolicy
+
+
+def slow_primary(model, cancel):
+    if model == "pro":
+        cancel.wait(1.0)
+        return None
+    return f"answer from {model}"
+
+
+def test_fast_primary_is_not_hedged():
+    policy = HedgePolicy("flash", default_deadline=0.5, min_delay=0.1)
+    assert policy.run("pro", lambda model, cancel: f"answer from {model}") == ("answer from pro", "pro", False)
+    assert policy.extra_calls() == 0
+
+
+def test_slow_primary_is_hedged_and_the_extra_call_is_counted():
+    policy = HedgePolicy("flash", default_deadline=0.05, min_delay=0.01)
+    started = time.monotonic()
+    assert policy.run("pro", slow_primary) == ("answer from flash", "flash", True)
+    assert time.monotonic() - started < 0.5 # The primary was cancelled, not waited for
+    assert policy.extra_calls() == 1
+    assert policy.stats()["pro"]["hedged"] == 1 and policy.stats()["flash"]["wins"] == 1
+
+
+def test_the_fallback_model_itself_is_not_hedged():
+    policy = HedgePolicy("flash", default_deadline=0.01)
+    assert policy.fallback_for("flash") is None
+    assert policy.run("flash", lambda model, cancel: "ok") == ("ok", "flash", False)
+    assert policy.extra_calls() == 0
+
+
+def test_delay_follows_recent_latencies_within_its_bounds():
+    policy = HedgePolicy("flash", deadlines={"pro": 30}, min_delay=5)
+    assert policy.delay("pro") == 30 # No history yet
+    for seconds in (8, 9, 10, 11, 12):
+        policy.observe("pro", seconds)
+    assert 5 <= policy.delay("pro") <= 12
+    for _ in range(50):
+        policy.observe("pro", 1)
+    assert policy.delay("pro") == 5
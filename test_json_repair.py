@@ -0,0 +1,68 @@
+"""
+Tests for `json_repair`: tolerant parsing of model answers and schema conformance.
+
+    python -m pytest -q
+"""
+import pytest
+
+from json_repair import conform, parse
+
+SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "internal_matches": {
+            "type": "ARRAY",
+            "items": {"type": "OBJECT", "properties": {"Nombre": {"type": "STRING"}}, "required": ["Nombre"]},
+        },
+        "ok": {"type": "BOOLEAN"},
+    },
+    "required": ["internal_matches"],
+}
+
+
+def test_valid_json_is_not_marked_repaired():
+    result = parse('{"a": 1}')
+    assert result.value == {"a": 1} and not result.repaired and not result.truncated
+
+
+def test_fences_and_trailing_comments_are_dropped():
+    result = parse('```json\n{"a": [1, 2]}\n```\nEspero que sirva.')
+    assert result.value == {"a": [1, 2]} and result.repaired
+
+
+def test_python_style_quotes_literals_and_trailing_commas():
+    result = parse("{'a': True, 'b': None, 'c': [1, 2,],}")
+    assert result.value == {"a": True, "b": None, "c": [1, 2]}
+
+
+def test_unescaped_quotes_and_newlines_inside_strings():
+    assert parse('{"a": "dijo "hola" ayer", "b": "x\ny"}').value == {"a": 'dijo "hola" ayer', "b": "x\ny"}
+
+
+def test_truncated_list_drops_the_unfinished_record():
+    result = parse('{"internal_matches": [{"Nombre": "Ana"}, {"Nombre": "Luis", "Apellidos": "Gó')
+    assert result.value == {"internal_matches": [{"Nombre": "Ana"}]}
+    assert result.truncated and result.dropped == 1
+    # Cut before the record's first member ended: back to the last comma, nothing half-built to drop
+    result = parse('{"internal_matches": [{"Nombre": "Ana"}, {"Nombre": "Lu')
+    assert result.value == {"internal_matches": [{"Nombre": "Ana"}]}
+
+
+def test_truncated_after_a_key_closes_with_null():
+    result = parse('{"a": 1, "b": {"c": 2, "d":')
+    assert result.value == {"a": 1, "b": {"c": 2}}
+    assert result.truncated
+
+
+def test_no_json_raises():
+    with pytest.raises(ValueError):
+        parse("Lo siento, no puedo ayudar.")
+
+
+def test_conform_drops_bad_items_and_fills_missing_lists():
+    value, dropped = conform({"internal_matches": [{"Nombre": "Ana"}, {"Apellidos": "X"}, "texto"], "ok": "true"}, SCHEMA)
+    assert value == {"internal_matches": [{"Nombre": "Ana"}], "ok": True}
+    assert dropped == 2
+    assert conform({}, SCHEMA) == ({"internal_matches": []}, 0)
+    with pytest.raises(ValueError):
+        conform({"internal_matches": [], "ok": "quizás"}, SCHEMA)
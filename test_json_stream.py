@@ -0,0 +1,39 @@
+"""
+Tests for `ArrayItemStream`: reviewer records emitted while the answer streams in.
+
+    python -m pytest -q
+"""
+import json
+
+from json_stream import ArrayItemStream
+
+ANSWER = {
+    "internal_matches": [{"Nombre": "Ana", "Reason": "usa {llaves} y \"comillas\""}, {"Nombre": "Luis", "Temas": ["a", "b"]}],
+    "external_suggestions": [{"Nombre": "Rosa", "Extra": {"nivel": 2}}],
+}
+
+
+def feed_in_chunks(text, size):
+    stream = ArrayItemStream()
+    items = []
+    for start in range(0, len(text), size):
+        items += stream.feed(text[start:start + size])
+    return items
+
+
+def test_items_are_the_same_whatever_the_chunk_size():
+    text = "```json\n" + json.dumps(ANSWER, ensure_ascii=False) + "\n```"
+    expected = [(key, item) for key, items in ANSWER.items() for item in items]
+    for size in (1, 7, 40, len(text)):
+        assert feed_in_chunks(text, size) == expected
+
+
+def test_an_item_is_emitted_as_soon_as_it_closes():
+    stream = ArrayItemStream()
+    assert stream.feed('{"internal_matches": [{"Nombre": "Ana"') == []
+    assert stream.feed('}, {"Nombre"') == [("internal_matches", {"Nombre": "Ana"})]
+
+
+def test_malformed_items_are_skipped():
+    text = '{"internal_matches": [{"Nombre": Ana}, {"Nombre": "Luis"}]}'
+    assert feed_in_chunks(text, 5) == [("internal_matches", {"Nombre": "Luis"})]
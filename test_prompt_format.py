@@ -0,0 +1,55 @@
+"""
+Tests for the compact reviewer serialization in `prompt_format`.
+
+    python -m pytest -q
+"""
+import pandas as pd
+
+from prompt_format import estimate_tokens, restore_full_records, serialize_reviewers
+
+
+def reviewers():
+    return pd.DataFrame({
+        "Nombre": ["Ana", "Luis", "Rosa"],
+        "Apellidos": ["Pérez", "Gómez", "Díaz"],
+        "Correo electrónico": ["ana@uni.edu", "luis@uni.edu", ""],
+        "Afiliación institucional": ["UNAM", "PUCP | Lima", None],
+        "País": ["México", "Perú", "Argentina"],
+        "Temas": ["pobreza", "finanzas\n corporativas", "x" * 50],
+        "Google Scholar": ["https://scholar/ana", "", ""],
+    }, index=[10, 20, 30])
+
+
+def test_only_prompt_columns_with_short_ids_and_clean_cells():
+    serialized = serialize_reviewers(reviewers(), max_field_chars=25)
+    lines = serialized.text.splitlines()
+    assert lines[0] == "ID|Nombre|Apellidos|Institucion|Pais|Temas"
+    assert lines[1] == "R1|Ana|Pérez|UNAM|México|pobreza"
+    assert lines[2] == "R2|Luis|Gómez|PUCP / Lima|Perú|finanzas corporativas"
+    assert lines[3] == "R3|Rosa|Díaz||Argentina|" + "x" * 24 + "…"
+    assert serialized.id_map == {"R1": 10, "R2": 20, "R3": 30}
+    assert not serialized.truncated
+
+
+def test_token_budget_keeps_whole_rows_in_order():
+    full = serialize_reviewers(reviewers())
+    header_and_two = "\n".join(full.text.splitlines()[:3])
+    serialized = serialize_reviewers(reviewers(), token_budget=estimate_tokens(header_and_two) + 3)
+    assert serialized.text == header_and_two
+    assert serialized.truncated and serialized.included_rows == 2 and serialized.total_rows == 3
+    assert serialize_reviewers(reviewers(), token_budget=0).included_rows == 3
+
+
+def test_restore_full_records_fills_fields_left_out_of_the_prompt():
+    df = reviewers()
+    serialized = serialize_reviewers(df)
+    results = {"internal_matches": [
+        {"ID": "R1", "Nombre": "Ana"},
+        {"ID": " R2 ", "Nombre": "Luis", "Correo": "dado@modelo.org"},
+        {"ID": "R99", "Nombre": "Inventado"},
+        "texto",
+    ]}
+    restored = restore_full_records(results, df, serialized.id_map)["internal_matches"]
+    assert restored[0] == {"Nombre": "Ana", "Correo": "ana@uni.edu", "País": "México", "Scholar": "https://scholar/ana"}
+    assert restored[1]["Correo"] == "dado@modelo.org" # The model's value is kept
+    assert restored[2] == {"Nombre": "Inventado"}
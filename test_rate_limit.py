@@ -0,0 +1,81 @@
+"""
+Tests for `rate_limit`: AIMD rate adaptation, 429 pauses and Retry-After parsing.
+
+    python -m pytest -q
+"""
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+
+from rate_limit import BACKOFF_CAP, ModelLimiter, QueueFullError, backoff_delay, parse_retry_after
+
+
+class Response:
+    def __init__(self, headers=None, body=None):
+        self.headers = headers or {}
+        self.body = body
+
+    def json(self):
+        if self.body is None:
+            raise ValueError("no body")
+        return self.body
+
+
+def test_throttle_halves_the_rate_down_to_a_floor_and_success_recovers_it():
+    limiter = ModelLimiter(rate_per_min=60)
+    for _ in range(10):
+        limiter.throttled(retry_after=0.01)
+    assert limiter.rate == pytest.approx(limiter.max_rate / 8)
+    assert limiter.strikes == 10
+    limiter.succeeded()
+    assert limiter.strikes == 0
+    assert limiter.rate == pytest.approx(limiter.max_rate / 8 + limiter.max_rate / 10)
+    for _ in range(20):
+        limiter.succeeded()
+    assert limiter.rate == pytest.approx(limiter.max_rate)
+
+
+def test_throttle_pauses_every_caller_for_the_server_hint():
+    limiter = ModelLimiter(rate_per_min=6000)
+    delay = limiter.throttled(retry_after=0.2)
+    assert 0.2 <= delay <= 0.2 + 0.04 + 0.5
+    assert limiter.estimate_wait() >= 0.19
+    started = time.monotonic()
+    with limiter.permit(timeout=5) as waited:
+        assert waited >= 0.19
+    assert time.monotonic() - started >= 0.19
+
+
+def test_concurrency_cap_and_bounded_queue():
+    limiter = ModelLimiter(rate_per_min=6000, max_concurrency=1, max_queue=1)
+    limiter.acquire(timeout=1)
+    with pytest.raises(TimeoutError):
+        limiter.acquire(timeout=0.05)
+    waiter = threading.Thread(target=limiter.acquire, args=(5,))
+    waiter.start()
+    deadline = time.monotonic() + 1
+    while not limiter.waiting and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(QueueFullError):
+        limiter.acquire(timeout=1)
+    limiter.release()
+    waiter.join(timeout=5)
+    assert not waiter.is_alive() and limiter.in_flight == 1
+
+
+def test_parse_retry_after_from_header_date_and_body():
+    assert parse_retry_after(Response({"Retry-After": "12"})) == 12
+    date_hint = parse_retry_after(Response({"Retry-After": formatdate(time.time() + 30, usegmt=True)}))
+    assert 25 <= date_hint <= 31
+    body = {"error": {"details": [{"@type": "type.googleapis.com/google.rpc.Help"}, {"retryDelay": "27s"}]}}
+    assert parse_retry_after(Response(body=body)) == 27
+    assert parse_retry_after(Response({"Retry-After": "soon"}, body={})) is None
+    assert parse_retry_after(Response()) is None
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    for attempt in (1, 3, 10):
+        ceiling = min(BACKOFF_CAP, 2 ** attempt)
+        assert ceiling / 2 <= backoff_delay(attempt) <= ceiling
@@ -0,0 +1,58 @@
+"""
+Tests for the BM25 shortlist in `retrieval`: query building, ranking and masks.
+
+    python -m pytest -q
+"""
+import numpy as np
+import pandas as pd
+
+from retrieval import ReviewerIndex, build_query, dataset_fingerprint, tokenize
+
+
+def reviewers():
+    return pd.DataFrame({
+        "Nombre": ["Ana", "Luis", "Rosa", "Jorge"],
+        "Apellidos": ["Pérez", "Gómez", "Díaz", "Ruiz"],
+        "Afiliación institucional": ["UNAM", "PUCP", "UBA", "Universidad de Chile"],
+        "Temas": ["Economía laboral; pobreza", "Finanzas corporativas", "Pobreza y desigualdad", "Marketing digital"],
+    })
+
+
+def test_tokenize_folds_accents_and_drops_stopwords():
+    assert tokenize("La Economía de la Pobreza") == ["economia", "pobreza"]
+
+
+def test_build_query_weights_title_and_keywords_and_ignores_the_link():
+    query = build_query("TITLE: Pobreza\nKEYWORDS: empleo\nABSTRACT: mercado\nlaboral\nLINK: http://x")
+    assert query == ["pobreza", "pobreza", "empleo", "empleo", "mercado", "laboral"]
+    assert build_query("pobreza laboral") == ["pobreza", "laboral"]
+
+
+def test_top_k_ranks_topic_matches_first():
+    index = ReviewerIndex(reviewers())
+    shortlist = index.top_k("TITLE: Pobreza laboral\nKEYWORDS: economía", 2)
+    assert shortlist["Nombre"].tolist() == ["Ana", "Rosa"]
+
+
+def test_top_k_without_a_match_or_with_a_large_k():
+    index = ReviewerIndex(reviewers())
+    assert index.top_k("TITLE: Astrofísica", 2)["Nombre"].tolist() == ["Ana", "Luis"]
+    assert len(index.top_k("TITLE: Pobreza", 0)) == 4
+    assert len(index.top_k("TITLE: Pobreza", 10)) == 4
+
+
+def test_masked_top_k_excludes_rows_and_applies_the_boost():
+    index = ReviewerIndex(reviewers())
+    allowed = np.array([False, True, True, True])
+    assert index.top_k("TITLE: Pobreza", 1, allowed=allowed)["Nombre"].tolist() == ["Rosa"]
+    boost = np.array([1.0, 1.0, 1.0, 5.0])
+    # No lexical match: the most boosted allowed rows come first
+    assert index.top_k("TITLE: Astrofísica", 2, allowed=allowed, boost=boost)["Nombre"].tolist() == ["Jorge", "Luis"]
+
+
+def test_fingerprint_changes_with_the_data():
+    df = reviewers()
+    changed = df.copy()
+    changed.loc[0, "Temas"] = "Otro tema"
+    assert dataset_fingerprint(df) == dataset_fingerprint(df.copy())
+    assert dataset_fingerprint(df) != dataset_fingerprint(changed)
@@ -0,0 +1,48 @@
+"""
+Regression tests for the delta sync of `ReviewerMirror`.
+
+    python -m pytest -q
+"""
+import fake_sheets
+from reviewer_mirror import ReviewerMirror
+
+
+def make_mirror():
+    client = fake_sheets.FakeClient()
+    worksheet = client.add_spreadsheet("eval").add_worksheet_values(
+        "EVALUADORES", [fake_sheets.REVIEWER_HEADERS] + fake_sheets.generate_reviewers(3)
+    )
+    mirror = ReviewerMirror(worksheet, probe_interval=0)
+    mirror.sync()
+    return worksheet, mirror
+
+
+def external_append(worksheet, rows):
+    width = len(fake_sheets.REVIEWER_HEADERS)
+    worksheet.values.extend((list(row) + [""] * width)[:width] for row in rows)
+    worksheet.spreadsheet.modified_time += 1
+
+
+def names(mirror):
+    return [name for name in mirror.frame()["Nombre"].tolist() if name != ""]
+
+
+def test_interior_blank_row_is_not_fetched_twice():
+    worksheet, mirror = make_mirror()
+    before = names(mirror)
+    external_append(worksheet, [["", "A"], [], ["", "B"]])
+    assert mirror.sync(force=True) == "delta"
+    external_append(worksheet, [["", "C"]])
+    mirror.sync(force=True)
+    mirror.sync(force=True)
+    assert names(mirror) == before + ["A", "B", "C"]
+    assert mirror.row_count == len(worksheet.values) - 1
+
+
+def test_delta_matches_full_load():
+    worksheet, mirror = make_mirror()
+    external_append(worksheet, [["", "A"], [], ["", "B"]])
+    mirror.sync(force=True)
+    reloaded = ReviewerMirror(worksheet)
+    reloaded.load()
+    assert mirror.rows == reloaded.rows
@@ -0,0 +1,60 @@
+"""
+Tests for the SQLite backend: round trip and identity lookups through its indexes.
+
+    python -m pytest -q
+"""
+import json
+
+import fake_sheets
+from dedup import IdentityIndex
+from storage import SQLiteBackend
+
+
+def make_backend(tmp_path, n=40):
+    backend = SQLiteBackend(str(tmp_path / "storage.sqlite3"))
+    with backend._connect() as conn:
+        conn.execute(
+            "INSERT INTO reviewer_headers (sheet_id, headers_json) VALUES (?, ?)",
+            ("eval", json.dumps(fake_sheets.REVIEWER_HEADERS)),
+        )
+        backend._insert(conn, "eval", fake_sheets.REVIEWER_HEADERS, fake_sheets.generate_reviewers(n))
+    return backend
+
+
+def cells(df, position):
+    row = df.iloc[position]
+    return row["Nombre"], row["Apellidos"], row["Correo electrónico"], row["OrcId"]
+
+
+def test_load_returns_the_inserted_rows(tmp_path):
+    backend = make_backend(tmp_path)
+    df = backend.load_reviewers("eval")
+    assert len(df) == 40
+    assert list(df.columns) == fake_sheets.REVIEWER_HEADERS
+
+
+def test_identity_lookups_agree_with_the_in_memory_index(tmp_path):
+    backend = make_backend(tmp_path)
+    df = backend.load_reviewers("eval")
+    index = IdentityIndex(df)
+    given, surnames, email, orcid = cells(df, 7)
+    people = [
+        ("", "", email.upper(), ""), # E-mail, case-insensitive
+        (given, surnames, "", ""), # Exact name
+        (given.upper(), surnames, "otra@persona.org", ""), # Name, different e-mail
+        ("Zacarías", "Inexistente", "nadie@ejemplo.org", ""),
+    ]
+    found = backend.match_reviewers("eval", people)
+    expected = [index.match(*person) for person in people]
+    assert [m and m.reason for m in found] == [m and m.reason for m in expected]
+    assert [m and m.name for m in found] == [m and m.name for m in expected]
+    assert found[0].reason == "correo" and found[-1] is None
+
+
+def test_appended_rows_are_indexed(tmp_path):
+    backend = make_backend(tmp_path, n=5)
+    row = dict.fromkeys(fake_sheets.REVIEWER_HEADERS, "")
+    row.update({"Nombre": "Ana María", "Apellidos": "Pérez Gómez", "Correo electrónico": "ana@uni.edu"})
+    backend.append_reviewers("eval", [[row[h] for h in fake_sheets.REVIEWER_HEADERS]])
+    match, = backend.match_reviewers("eval", [("Ana María", "Pérez", "", "")])
+    assert match is not None and match.reason == "nombre" and match.name == "Ana María Pérez Gómez"
@@ -0,0 +1,76 @@
+"""
+Tests for `WriteQueue`: identity de-duplication, unsent rows, batching and retries.
+
+    python -m pytest -q
+"""
+import threading
+import time
+
+from write_queue import WriteQueue
+
+
+class Writer:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+        self.done = threading.Event()
+
+    def __call__(self, sheet_id, rows):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("quota")
+        self.calls.append((sheet_id, rows))
+        self.done.set()
+
+
+def make_queue(tmp_path, writer, **options):
+    queue = WriteQueue(str(tmp_path / "queue.sqlite3"), writer, batch_window=0.05, **options)
+    queue.start = lambda: None # Keep rows queued until the test starts the worker
+    return queue
+
+
+def test_same_identity_is_queued_once(tmp_path):
+    queue = make_queue(tmp_path, Writer())
+    ana = ["1", "Ana", "Pérez", "ana@uni.edu"]
+    assert queue.enqueue("eval", [ana], [("correo:ana@uni.edu",)]) == 1
+    # Same person with other cells (new article ID): still skipped
+    assert queue.enqueue("eval", [["2", "Ana M.", "Pérez", "ANA@uni.edu"]], [("correo:ana@uni.edu",)]) == 0
+    assert queue.enqueue("eval", [["2", "Luis", "Gómez", ""], ["3", "Luis", "Gómez", ""]], [("orcid:1",), ("orcid:1",)]) == 1
+    assert queue.enqueue("otra", [ana], [("correo:ana@uni.edu",)]) == 1 # Other sheet
+    assert queue.unsent_rows("eval") == [ana, ["2", "Luis", "Gómez", ""]]
+    assert queue.unsent("eval") == 2
+
+
+def test_rows_without_keys_are_compared_whole(tmp_path):
+    queue = make_queue(tmp_path, Writer())
+    assert queue.enqueue("eval", [["1", "Ana"], ["1", "Ana"], ["2", "Ana"]]) == 2
+
+
+def test_worker_writes_one_batch_and_forgets_the_keys(tmp_path):
+    writer = Writer()
+    queue = make_queue(tmp_path, writer)
+    queue.enqueue("eval", [["1", "Ana"], ["2", "Luis"]], [("correo:a",), ("correo:l",)])
+    WriteQueue.start(queue)
+    assert writer.done.wait(5)
+    assert writer.calls == [("eval", [["1", "Ana"], ["2", "Luis"]])]
+    deadline = time.monotonic() + 5
+    while queue.unsent("eval") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert queue.unsent_rows("eval") == []
+    # Written, so the same person can be queued again (the known-reviewer check sees the sheet now)
+    assert queue.enqueue("eval", [["3", "Ana"]], [("correo:a",)]) == 1
+
+
+def test_failed_rows_stay_unsent_until_retried(tmp_path):
+    writer = Writer(failures=1)
+    queue = make_queue(tmp_path, writer, max_attempts=1)
+    queue.enqueue("eval", [["1", "Ana"]], [("correo:a",)])
+    WriteQueue.start(queue)
+    deadline = time.monotonic() + 5
+    while not queue.stats()["failed"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert queue.stats()["failed"] == 1 and queue.stats()["last_error"] == "quota"
+    assert queue.unsent_rows("eval") == [["1", "Ana"]]
+    assert queue.enqueue("eval", [["1", "Ana"]], [("correo:a",)]) == 0
+    assert queue.retry_failed() == 1
+    assert writer.done.wait(5)
@@ -0,0 +1,164 @@
+"""
+Lightweight per-stage tracing: durations, sizes, token usage, cache hits, retries.
+
+Wrap a stage in `with span("stage", **attrs) as sp:` and add figures to `sp`
+as they become known (`sp["retries"] = 2`). Each finished span is appended as
+one JSON line to the trace log and kept in a bounded in-memory buffer, from
+which `summary()` computes p50/p95 per stage for the admin panel. Nested spans
+share the `trace` id of the outermost one, so a search can be followed end to
+end in the log.
+
+Summarize an existing log with:
+    python tracing.py .cache/traces.jsonl
+"""
+import contextvars
+import json
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_BUFFER = 2000 # Spans kept in memory per stage
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024 # Log is rotated to <path>.1 past this size
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of an unsorted list (q in 0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class Tracer:
+    def __init__(self, path=None, buffer_size=DEFAULT_BUFFER, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.max_bytes = max_bytes
+        self.spans = {} # stage -> deque of span dicts
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        with self._lock:
+            self.spans.setdefault(record["stage"], deque(maxlen=self.buffer_size)).append(record)
+            if not self.path:
+                return
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, f"{self.path}.1")
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            except OSError as e:
+                print(f"Trace log write failed: {e}") # Tracing must never break the app
+
+    def recent(self, limit=50):
+        with self._lock:
+            records = [r for spans in self.spans.values() for r in spans]
+        return sorted(records, key=lambda r: r["ts"], reverse=True)[:limit]
+
+    def summary(self):
+        with self._lock:
+            snapshot = {stage: list(spans) for stage, spans in self.spans.items()}
+        return summarize(snapshot)
+
+
+def summarize(spans_by_stage):
+    """Per-stage {count, errors, p50_ms, p95_ms} plus averages of numeric attributes present."""
+    summary = {}
+    for stage, records in sorted(spans_by_stage.items()):
+        durations = [r["duration_ms"] for r in records]
+        row = {
+            "count": len(records),
+            "errors": sum(1 for r in records if not r.get("ok", True)),
+            "p50_ms": percentile(durations, 50),
+            "p95_ms": percentile(durations, 95),
+        }
+        for key in ("prompt_tokens", "output_tokens", "cached_tokens", "retries", "throttles", "wait_s", "rows", "dropped_items", "hedged"):
+            values = [r[key] for r in records if isinstance(r.get(key), (int, float))]
+            if values:
+                row[f"avg_{key}"] = sum(values) / len(values)
+        paid = [r["paid_calls"] for r in records if isinstance(r.get("paid_calls"), int)]
+        if paid:
+            # Calls billed per usable answer; failed or unparseable answers still cost their calls
+            successes = sum(1 for r in records if "paid_calls" in r and r.get("ok", True))
+            row["paid_calls_per_success"] = sum(paid) / successes if successes else float(sum(paid))
+        cache_flags = [r["cache"] for r in records if "cache" in r]
+        if cache_flags:
+            row["cache_hit_rate"] = sum(1 for c in cache_flags if c == "hit") / len(cache_flags)
+        summary[stage] = row
+    return summary
+
+
+_tracer = Tracer()
+
+
+def configure(path=None, buffer_size=DEFAULT_BUFFER, max_bytes=DEFAULT_MAX_BYTES):
+    """Sets where spans are logged (None/empty: memory only)."""
+    global _tracer
+    _tracer = Tracer(path or None, buffer_size, max_bytes)
+
+
+def get_tracer():
+    return _tracer
+
+
+@contextmanager
+def span(stage, **attrs):
+    """Times the block; the yielded dict is recorded with the span (set 'ok' to False to flag a soft failure)."""
+    parent = _current_trace.get()
+    trace_id = parent or uuid.uuid4().hex[:12]
+    token = _current_trace.set(trace_id)
+    record = dict(attrs)
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["ok"] = False
+        record["error"] = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        _current_trace.reset(token)
+        record.setdefault("ok", True)
+        record.update(
+            stage=stage,
+            trace=trace_id,
+            ts=time.time(),
+            duration_ms=round((time.perf_counter() - started) * 1000, 2),
+        )
+        _tracer.record(record)
+
+
+def record_span(stage, seconds, **attrs):
+    """Records a span timed by the caller, for code that can't sit inside a `with span(...)` block."""
+    record = dict(attrs)
+    record.setdefault("ok", True)
+    record.update(stage=stage, trace=_current_trace.get() or uuid.uuid4().hex[:12], ts=time.time(), duration_ms=round(seconds * 1000, 2))
+    _tracer.record(record)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    path = argv[0] if argv else ".cache/traces.jsonl"
+    spans = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            spans.setdefault(record.get("stage", "?"), []).append(record)
+    for stage, row in summarize(spans).items():
+        extras = " ".join(f"{k}={v:.1f}" for k, v in row.items() if k.startswith(("avg_", "cache_", "paid_")))
+        print(f"{stage:24} n={row['count']:<6} err={row['errors']:<4} p50={row['p50_ms']:.0f}ms p95={row['p95_ms']:.0f}ms {extras}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Durable write-behind queue for rows appended to Google Sheets.
+
+`enqueue()` stores the rows in SQLite and returns right away; a single
+background thread writes them. Rows queued for the same sheet within a short
+window (or while a previous write was in flight) are sent together in one
+`append_rows` call, so concurrent sessions don't each pay an API round trip.
+Failed writes are retried with jittered backoff and, after `max_attempts`,
+kept as "failed" for a manual retry instead of being lost. The queue survives
+restarts: anything still pending is written when the worker starts again.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from rate_limit import backoff_delay
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_rows (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sheet_id TEXT NOT NULL,
+    row_json TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS pending_rows_due ON pending_rows (status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS pending_keys (
+    row_id INTEGER NOT NULL,
+    sheet_id TEXT NOT NULL,
+    key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pending_keys_lookup ON pending_keys (sheet_id, key);
+"""
+
+
+class WriteQueue:
+    """
+    `writer(sheet_id, rows)` does the actual append and raises on failure;
+    it is only ever called from the worker thread.
+    """
+
+    def __init__(self, path, writer, batch_window=1.0, max_attempts=8, max_batch_rows=500):
+        self.path = path
+        self.writer = writer
+        self.batch_window = batch_window
+        self.max_attempts = max_attempts
+        self.max_batch_rows = max_batch_rows
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def start(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="sheets-write-queue", daemon=True)
+                self._worker.start()
+        self._wake.set() # Drain whatever a previous process left behind
+
+    # --- PRODUCER SIDE ---
+
+    def enqueue(self, sheet_id, rows, identities=None):
+        """
+        Queues rows (lists of cell values) for `sheet_id`. `identities` gives,
+        per row, the keys that identify it (e.g. normalized e-mail and ORCID): a
+        row sharing a key with one not yet written to the same sheet is skipped,
+        so a double submit, or the same person sent with other cells, doesn't
+        create duplicates. Rows without keys are compared whole. Returns the
+        number of rows queued.
+        """
+        now = time.time()
+        queued = 0
+        with self._lock, self._connect() as conn:
+            for row, keys in zip(rows, identities or [()] * len(rows)):
+                row_json = json.dumps(list(row), ensure_ascii=False, default=str)
+                keys = sorted({key for key in keys if key})
+                if keys:
+                    exists = conn.execute(
+                        "SELECT 1 FROM pending_keys k JOIN pending_rows r ON r.id = k.row_id "
+                        f"WHERE k.sheet_id = ? AND k.key IN ({','.join('?' * len(keys))}) AND r.status IN ('pending', 'failed')",
+                        (sheet_id, *keys),
+                    ).fetchone()
+                else:
+                    exists = conn.execute(
+                        "SELECT 1 FROM pending_rows WHERE sheet_id = ? AND row_json = ? AND status IN ('pending', 'failed')",
+                        (sheet_id, row_json),
+                    ).fetchone()
+                if exists:
+                    continue
+                row_id = conn.execute(
+                    "INSERT INTO pending_rows (sheet_id, row_json, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+                    (sheet_id, row_json, now, now),
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO pending_keys (row_id, sheet_id, key) VALUES (?, ?, ?)",
+                    [(row_id, sheet_id, key) for key in keys],
+                )
+                queued += 1
+        self.start()
+        return queued
+
+    def retry_failed(self):
+        """Moves failed rows back to pending. Returns how many."""
+        with self._lock, self._connect() as conn:
+            count = conn.execute(
+                "UPDATE pending_rows SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'failed'",
+                (time.time(),),
+            ).rowcount
+        self._wake.set()
+        return count
+
+    def stats(self):
+        """{'pending', 'failed', 'last_error'}"""
+        with self._lock, self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM pending_rows GROUP BY status").fetchall())
+            last_error = conn.execute(
+                "SELECT last_error FROM pending_rows WHERE last_error IS NOT NULL ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        return {
+            "pending": counts.get("pending", 0),
+            "failed": counts.get("failed", 0),
+            "last_error": last_error[0] if last_error else None,
+        }
+
+    def unsent(self, sheet_id):
+        """Number of rows of `sheet_id` not yet written (pending or failed)."""
+        with self._lock, self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM pending_rows WHERE sheet_id = ? AND status IN ('pending', 'failed')", (sheet_id,)
+            ).fetchone()[0]
+
+    def unsent_rows(self, sheet_id):
+        """The rows of `sheet_id` not yet written (pending or failed), oldest first."""
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT row_json FROM pending_rows WHERE sheet_id = ? AND status IN ('pending', 'failed') ORDER BY id", (sheet_id,)
+            ).fetchall()
+        return [json.loads(row_json) for row_json, in rows]
+
+    # --- WORKER ---
+
+    def _next_batch(self):
+        """Oldest due sheet's pending rows: (sheet_id, [(id, row)]) or (None, seconds until the next due row)."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            due = conn.execute(
+                "SELECT sheet_id FROM pending_rows WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if due is None:
+                upcoming = conn.execute(
+                    "SELECT MIN(next_attempt_at) FROM pending_rows WHERE status = 'pending'"
+                ).fetchone()[0]
+                return None, (upcoming - now) if upcoming else None
+            # Everything pending for that sheet goes in one call, retried rows included
+            rows = conn.execute(
+                "SELECT id, row_json FROM pending_rows WHERE sheet_id = ? AND status = 'pending' ORDER BY id LIMIT ?",
+                (due[0], self.max_batch_rows),
+            ).fetchall()
+        return due[0], [(row_id, json.loads(row_json)) for row_id, row_json in rows]
+
+    def _run(self):
+        while True:
+            sheet_id, batch = self._next_batch()
+            if sheet_id is None:
+                self._wake.wait(timeout=batch) # Sleep until the next retry is due or new rows arrive
+                self._wake.clear()
+                # Give concurrent sessions a moment to add their rows to the same call
+                time.sleep(self.batch_window)
+                continue
+
+            ids = [row_id for row_id, _ in batch]
+            placeholders = ",".join("?" * len(ids))
+            try:
+                self.writer(sheet_id, [row for _, row in batch])
+            except Exception as e:
+                print(f"Sheets write of {len(ids)} rows failed: {e}")
+                with self._lock, self._connect() as conn:
+                    for row_id, attempts in conn.execute(
+                        f"SELECT id, attempts + 1 FROM pending_rows WHERE id IN ({placeholders})", ids
+                    ).fetchall():
+                        conn.execute(
+                            "UPDATE pending_rows SET attempts = ?, status = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                            (attempts, "failed" if attempts >= self.max_attempts else "pending",
+                             time.time() + backoff_delay(attempts), str(e)[:500], row_id),
+                        )
+                continue
+
+            with self._lock, self._connect() as conn:
+                conn.execute(f"DELETE FROM pending_rows WHERE id IN ({placeholders})", ids)
+                conn.execute(f"DELETE FROM pending_keys WHERE row_id IN ({placeholders})", ids)